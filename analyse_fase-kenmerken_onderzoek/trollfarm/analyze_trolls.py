@@ -52,6 +52,14 @@ def load_data(data_dir):
             
     return pd.DataFrame(all_posts)
 
+# 1b. Data Inladen uit Parquet (alleen de benodigde kolommen)
+def load_parquet(dataset_dir):
+    # Datasetmap zoals geschreven door shared/columnar.py (exports/<sub>/parquet/posts)
+    columns = ['post_id', 'author', 'title', 'text', 'subreddit', 'created_utc', 'num_comments']
+    df = pd.read_parquet(dataset_dir, columns=columns)
+    print(f"Parquet-dataset geladen: {len(df)} berichten uit {dataset_dir}")
+    return df.rename(columns={'post_id': 'id'})
+
 # 2. ICE Berichten Filteren
 def is_ice_post(row):
     text = (str(row['title']) + " " + str(row['text'])).lower()
@@ -87,11 +95,16 @@ def identify_trolls(df):
 def main():
     # Gebruik relatief pad of pas aan naar jouw map
     data_dir = os.path.join(os.getcwd(), 'data')
+    parquet_dir = os.path.join(data_dir, 'parquet')
     if not os.path.exists(data_dir):
         print(f"Let op: Map '{data_dir}' bestaat niet. Pas het pad aan in de code.")
         return
 
-    df = load_data(data_dir)
+    # Parquet heeft de voorkeur: geen JSON parsen, alleen de nodige kolommen
+    if os.path.exists(parquet_dir):
+        df = load_parquet(parquet_dir)
+    else:
+        df = load_data(data_dir)
     
     print(f"Totaal aantal berichten geladen: {len(df)}")
     
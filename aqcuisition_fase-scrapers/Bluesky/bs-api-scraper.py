@@ -7,6 +7,11 @@ import os
 import time
 import gzip
 import json
+import sys
+
+# optioneel: posts ook kolomgeoriënteerd wegschrijven (vereist pyarrow)
+WRITE_PARQUET = False
+PARQUET_WRITER = None
 
 # logt in met bluesky account, gegevens in .env
 def login(client):
@@ -122,9 +127,25 @@ def export_posts(posts):
         with gzip.open(post_file, "ab") as f:
             f.write(line.encode("utf-8")) 
 
+        if PARQUET_WRITER:
+            PARQUET_WRITER.add(post)
+
 # main
 if __name__ == '__main__':
+    if WRITE_PARQUET:
+        # gedeelde modules (../shared), ongeacht de map van waaruit het script gestart wordt
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        shared_parent = os.path.dirname(script_dir)
+        if shared_parent not in sys.path:
+            sys.path.append(shared_parent)
+        from shared.columnar import ColumnarWriter
+        PARQUET_WRITER = ColumnarWriter("bluesky", os.path.join(script_dir, "Data", "parquet"))
+
     client = Client()
     logged_in_client = login(client)
-    posts = gather_posts(logged_in_client)
-    sort_posts(posts)
+    try:
+        posts = gather_posts(logged_in_client)
+        sort_posts(posts)
+    finally:
+        if PARQUET_WRITER:
+            PARQUET_WRITER.close()
@@ -3,6 +3,7 @@ import csv
 import gzip
 import json
 import re
+import sys
 import time
 from datetime import datetime, timezone
 from pathlib import Path
@@ -10,6 +11,9 @@ from urllib.parse import urljoin
 
 import requests
 from bs4 import BeautifulSoup
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from shared.matcher import Matcher
 # scraper settings
 BASE = "https://debatepolitics.com/"
 HEADERS = {"User-Agent": "Mozilla/5.0"}
@@ -30,6 +34,11 @@ DONE_THREADS_FILE = DATA_DIR / "state_threads_done-keywords.txt"
 
 ICE_PREFIX = "ice"  # hardcoded string prefix
 
+# ---- optional columnar output (needs pyarrow) ----
+WRITE_PARQUET = False
+PARQUET_DIR = DATA_DIR / "parquet"
+PARQUET_WRITER = None
+
 
 def now_iso(): # function to get current time in ISO format with Z timezone.
     return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
@@ -212,24 +221,16 @@ def parse_posts_from_thread_page(soup: BeautifulSoup, page_url: str) -> list[dic
     return posts
 
 
-def compile_phrases_with_ice(keywords: list[str]) -> list[tuple[str, re.Pattern]]:
-    compiled = []
-    for kw in keywords:
-        phrase = f"{ICE_PREFIX} {kw}".strip()
-        pat = re.compile(re.escape(phrase), re.IGNORECASE)
-        compiled.append((phrase, pat))
-    return compiled
+def compile_phrases_with_ice(keywords: list[str]) -> Matcher:
+    # all phrases are searched in a single pass (shared/matcher.py)
+    return Matcher([f"{ICE_PREFIX} {kw}".strip() for kw in keywords])
 
 
-def match_phrases(text: str, compiled: list[tuple[str, re.Pattern]]) -> list[str]:
-    hits = []
-    for phrase, pat in compiled:
-        if pat.search(text):
-            hits.append(phrase)
-    return hits
+def match_phrases(text: str, compiled: Matcher) -> list[str]:
+    return compiled.find_all(text)
 
 
-def scrape_thread(thread_url: str, compiled_phrases: list[tuple[str, re.Pattern]], done_threads: set[str]):
+def scrape_thread(thread_url: str, compiled_phrases: Matcher, done_threads: set[str]):
     thread_url = normalize_thread_url(thread_url)
     if thread_url in done_threads:
         print(f"SKIP (done): {thread_url}")
@@ -295,6 +296,8 @@ def scrape_thread(thread_url: str, compiled_phrases: list[tuple[str, re.Pattern]
                 "keywords_hit": hits,
             }
             append_gz_jsonl(MATCHES_OUT, record)
+            if PARQUET_WRITER:
+                PARQUET_WRITER.add(record)
 
         next_url = find_next_page_url(soup, page_url)
         page_url = next_url if next_url and next_url != page_url else None
@@ -328,8 +331,18 @@ def main():
     print(f"Already done: {len(done_threads)}")
     print(f"Output (matches only): {MATCHES_OUT}")
 
-    for url in thread_urls:
-        scrape_thread(url, compiled_phrases, done_threads)
+    global PARQUET_WRITER
+    if WRITE_PARQUET:
+        sys.path.append(str(Path(__file__).resolve().parent.parent))
+        from shared.columnar import ColumnarWriter
+        PARQUET_WRITER = ColumnarWriter("debatepolitics", str(PARQUET_DIR))
+
+    try:
+        for url in thread_urls:
+            scrape_thread(url, compiled_phrases, done_threads)
+    finally:
+        if PARQUET_WRITER:
+            PARQUET_WRITER.close()
 
 
 if __name__ == "__main__":
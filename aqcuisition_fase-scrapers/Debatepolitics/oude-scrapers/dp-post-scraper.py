@@ -3,14 +3,19 @@ import csv
 import gzip
 import json
 import re
+import sys
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from typing import Dict, List, Optional
+from pathlib import Path
 from urllib.parse import urlparse
 
 import scrapy
 from scrapy.crawler import CrawlerProcess
 
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+from shared.matcher import Matcher
+
 # =========================
 # CONFIG (pas dit aan)
 # =========================
@@ -59,14 +64,11 @@ class TermMatcher:
     terms: List[str]
 
     def __post_init__(self):
-        self._compiled = [(t, re.compile(re.escape(t), re.IGNORECASE)) for t in self.terms]
+        # alle termen in één doorgang (shared/matcher.py)
+        self._matcher = Matcher(self.terms)
 
     def find_all(self, text: str) -> List[str]:
-        hits = []
-        for t, rx in self._compiled:
-            if rx.search(text):
-                hits.append(t)
-        return hits
+        return self._matcher.find_all(text)
 
 
 class JsonlGzPipeline:
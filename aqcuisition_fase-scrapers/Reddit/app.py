@@ -1,34 +1,39 @@
-from flask import Flask, render_template, request, redirect, url_for, session, send_from_directory, flash
+from flask import Flask, render_template, request, redirect, url_for, session, send_from_directory, flash, Response, stream_with_context
 from werkzeug.security import check_password_hash
 import os
 import subprocess
-import threading
 import logging
 import shutil
 import time
+import json
+import queue
 import data_cleaner
+import rate_limiter
+import identity_pool
+import master_store
+import media_queue
+import database
+import job_manager
+import zip_stream
+import post_index
 
 app = Flask(__name__)
 app.secret_key = 'super_geheime_sleutel_die_je_moet_veranderen'
 
 # Logboek voor serververzoeken
 SERVER_LOGS = []
+# Verzoeken naar deze paden (statusopvraag en live-stream) worden niet gelogd
+QUIET_PATHS = ('/status', '/events')
+# Commentaarregel om een open SSE-verbinding in leven te houden (seconden)
+SSE_KEEPALIVE = 15
 
 class ListHandler(logging.Handler):
     def emit(self, record):
+        # Vroeg filteren op het ruwe bericht, zodat statusverzoeken niet geformatteerd hoeven te worden
+        if record.args and any(f" {path}" in str(arg) for arg in record.args for path in QUIET_PATHS):
+            return
         log_entry = self.format(record)
         
-        # Filter de /status verzoeken, tenzij gedetailleerde informatie vereist is
-        if "/status" in log_entry:
-             # Voeg de status van de scraper toe aan het bericht
-             scraper_state = "Actief" if SCRAPER_STATUS['is_running'] else "In rust"
-             if SCRAPER_STATUS['is_running']:
-                 # Haal het laatste bericht van de scraper op
-                 last_msg = SCRAPER_STATUS['message']
-                 log_entry = f"{log_entry} | Scraper: {scraper_state} ({last_msg})"
-             else:
-                 log_entry = f"{log_entry} | Scraper: {scraper_state}"
-        
         # Voeg tijdstip toe indien dit ontbreekt
         if " - - [" not in log_entry:
             from datetime import datetime
@@ -37,6 +42,7 @@ class ListHandler(logging.Handler):
         SERVER_LOGS.append(log_entry)
         if len(SERVER_LOGS) > 20: # Bewaar de laatste 20 regels
             SERVER_LOGS.pop(0)
+        job_manager.publish({'type': 'log', 'line': log_entry})
 
 # Koppel de logger aan werkzeug (de webserver)
 werkzeug_logger = logging.getLogger('werkzeug')
@@ -49,46 +55,24 @@ USERNAME = 'admin'
 PASSWORD_HASH = 'scrypt:32768:8:1$OUXl551Sqnmc6Tsc$e859a517c3e6d644101b0e10dcfc317fc944b4387fa607795261e62c8876ded91cb298399364c5b26bd0d0a4b53aaf2a3957c305fc3b6152a50eb31f460e2466'
 EXPORTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exports')
 
-# Globale statusvariabele
-SCRAPER_STATUS = {
-    'is_running': False,
-    'message': 'Gereed voor start',
-    'history': [],
-    'start_time': None,
-    'end_time': None
-}
-
-# Functie om de scraper in de achtergrond uit te voeren
-def run_scraper_bg(subreddits, limit, filter_date, use_keywords, use_tor, reddit_cookie=None, use_parallel=False):
-    global SCRAPER_STATUS
-    SCRAPER_STATUS['is_running'] = True
-    SCRAPER_STATUS['message'] = 'Scraper wordt gestart...'
-    SCRAPER_STATUS['history'] = []
-    
-    from datetime import datetime
-    SCRAPER_STATUS['start_time'] = datetime.now().strftime('%d-%m-%Y %H:%M:%S')
-    SCRAPER_STATUS['end_time'] = None
-    
-    # Callback-functie om de status bij te werken
-    def update_status(msg):
-        SCRAPER_STATUS['message'] = msg
-        # Voeg toe aan geschiedenis (maximaal 10 regels)
-        SCRAPER_STATUS['history'].append(msg)
-        if len(SCRAPER_STATUS['history']) > 10:
-            SCRAPER_STATUS['history'].pop(0)
+# Functie om de scraper in de achtergrond uit te voeren (als taak van job_manager)
+def run_scraper_bg(job, subreddits, limit, filter_date, use_keywords, use_tor, reddit_cookie=None, use_parallel=False, incremental=False, resume_run_id=None):
+    # Callback-functie om de status van deze taak bij te werken
+    update_status = job.update
+    update_status('Scraper wordt gestart...')
 
     # Importeer de scraper-module hier om circulaire afhankelijkheden te voorkomen
     import scraper
     from datetime import datetime
     
     # 1. Start Tor-service (headless) - ALLEEN indien geselecteerd
+    # Een lopende Tor-dienst wordt hergebruikt; taken zonder Tor verbinden direct (zie scraper.get_current_proxy)
     if use_tor:
         update_status("Tor-anonimiseringsdienst wordt gestart...")
-        if not scraper.start_tor_service():
+        if not scraper.ensure_tor_service():
             update_status("WAARSCHUWING: Tor-dienst kon niet starten. Er wordt geprobeerd zonder Tor verder te gaan...")
     else:
         update_status("Standaard netwerkverbinding wordt gebruikt. Dit biedt hogere verwerkingssnelheid.")
-        scraper.stop_tor_service() # Zorg dat Tor is uitgeschakeld
     
     # Zoekwoorden laden
     keywords = []
@@ -116,9 +100,12 @@ def run_scraper_bg(subreddits, limit, filter_date, use_keywords, use_tor, reddit
             update_status(f"Fout in datumconfiguratie: {e}")
             filter_date = False
 
-    # Start de scraper in headless modus
-    try:
-        scraper.run_scraper_headless(
+    # Start de scraper in headless modus (of zet een eerdere run voort)
+    # Fouten worden door job_manager vastgelegd in de status van de taak
+    if resume_run_id:
+        run_id = scraper.resume_run(resume_run_id, status_callback=update_status, reddit_cookie=reddit_cookie)
+    else:
+        run_id = scraper.run_scraper_headless(
             subreddits_list=subreddits,
             limit=limit,
             filter_date=filter_date,
@@ -127,25 +114,88 @@ def run_scraper_bg(subreddits, limit, filter_date, use_keywords, use_tor, reddit
             keywords=keywords,
             status_callback=update_status,
             reddit_cookie=reddit_cookie,
-            use_parallel=use_parallel
+            use_parallel=use_parallel,
+            incremental=incremental
         )
-        update_status("Scrape voltooid! De pagina wordt ververst...")
-    except Exception as e:
-        update_status(f"Fout tijdens scrapen: {e}")
-    finally:
-        SCRAPER_STATUS['is_running'] = False
-        SCRAPER_STATUS['end_time'] = datetime.now().strftime('%d-%m-%Y %H:%M:%S')
+    update_status("Scrape gestopt." if job.cancelled else "Scrape voltooid! De pagina wordt ververst...")
+    return {'run_id': run_id}
+
+def start_scrape_job(params, *args, **kwargs):
+    """Plan een scrape in als taak; params komen in de status (zonder cookie)."""
+    return job_manager.manager.submit('scrape', lambda job: run_scraper_bg(job, *args, **kwargs), params)
 
 @app.route('/status')
 def get_status():
     if not is_logged_in():
         return {'error': 'Niet aangemeld'}, 401
     
+    # Alle taken; de velden van de meest recente taak staan ook bovenaan (oude dashboardvelden)
+    jobs = [job.snapshot() for job in job_manager.manager.list()]
+    latest = jobs[-1] if jobs else {'message': 'Gereed voor start', 'history': [], 'start_time': None, 'end_time': None, 'result': None}
+    status_copy = {
+        'is_running': any(job['is_running'] for job in jobs),
+        'message': latest['message'],
+        'history': latest['history'],
+        'start_time': latest['start_time'],
+        'end_time': latest['end_time'],
+        'run_id': (latest['result'] or {}).get('run_id'),
+        'jobs': jobs
+    }
     # Voeg de serverlogs toe aan het resultaat
-    status_copy = SCRAPER_STATUS.copy()
     status_copy['server_logs'] = SERVER_LOGS
+    # Verzoekbudget per identiteit (tokens, wachttijden, 429's)
+    status_copy['rate_limits'] = rate_limiter.get_stats()
+    # Identiteiten (Tor-circuits, cookies, directe verbinding) met quarantaine
+    status_copy['identities'] = identity_pool.get_stats()
+    # Mediadownloads per status (pending, running, done, failed)
+    status_copy['media_jobs'] = media_queue.get_status()
     return status_copy
 
+@app.route('/status/<job_id>')
+def get_job_status(job_id):
+    if not is_logged_in():
+        return {'error': 'Niet aangemeld'}, 401
+    job = job_manager.manager.get(job_id)
+    if job is None:
+        return {'error': 'Taak niet gevonden'}, 404
+    # Volledig logboek van deze taak
+    return job.snapshot(log_lines=0)
+
+def _sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+@app.route('/events')
+def events():
+    """
+    Live-status via Server-Sent Events: eerst een 'snapshot' van alle taken, daarna
+    alleen wijzigingen (message, counters, status, log). Met ?job=<id> alleen die taak.
+    Bij een 'resync' zijn gebeurtenissen gemist en moet /status opnieuw worden opgevraagd.
+    """
+    if not is_logged_in():
+        return {'error': 'Niet aangemeld'}, 401
+    job_id = request.args.get('job')
+    
+    def stream():
+        # Eerst abonneren, dan de momentopname: zo gaat er geen wijziging verloren
+        q = job_manager.subscribe()
+        try:
+            jobs = [job.snapshot() for job in job_manager.manager.list() if not job_id or job.id == job_id]
+            yield _sse({'type': 'snapshot', 'jobs': jobs, 'server_logs': list(SERVER_LOGS)})
+            while True:
+                try:
+                    event = q.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if job_id and event.get('job', job_id) != job_id:
+                    continue
+                yield _sse(event)
+        finally:
+            job_manager.unsubscribe(q)
+    
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/scrape', methods=['POST'])
 def scrape():
     if not is_logged_in():
@@ -156,7 +206,10 @@ def scrape():
     filter_date = request.form.get('filter_date') == 'yes'
     use_keywords = request.form.get('use_keywords') == 'yes'
     use_tor = request.form.get('use_tor') == 'yes'
+    # Meerdere cookies (komma of regeleinde) worden als afzonderlijke identiteiten ingezet
     reddit_cookie = request.form.get('reddit_cookie', '').strip()
+    # Alleen berichten nieuwer dan de vorige run (high-water mark per subreddit)
+    incremental = request.form.get('incremental') == 'yes'
     
     if not subreddits_str:
         flash('Voer minimaal één subreddit in.', 'danger')
@@ -171,15 +224,38 @@ def scrape():
         limit = -1
     
     # KEUZE: Parallel of Sequentieel?
-    # Bij meer dan 1 subreddit wordt parallelle verwerking toegepast (maximaal 3 gelijktijdig)
+    # Bij meer dan 1 subreddit wordt parallelle (asynchrone) verwerking toegepast
     use_parallel = len(subreddits) > 1
     
-    # Start de scraper in een aparte thread (achtergrond)
-    thread = threading.Thread(target=run_scraper_bg, args=(subreddits, limit, filter_date, use_keywords, use_tor, reddit_cookie, use_parallel))
-    thread.daemon = True
-    thread.start()
+    # Start de scraper als achtergrondtaak; meerdere taken kunnen naast elkaar lopen
+    params = {'subreddits': subreddits, 'limit': limit, 'use_tor': use_tor, 'incremental': incremental}
+    job = start_scrape_job(params, subreddits, limit, filter_date, use_keywords, use_tor, reddit_cookie, use_parallel, incremental)
+    
+    flash(f'Scraper gestart voor {len(subreddits)} subreddits (taak {job.id}). Dit kan enige tijd duren. Ververs de pagina over enkele minuten.', 'success')
+    return redirect(url_for('index'))
+
+@app.route('/runs')
+def list_runs():
+    if not is_logged_in():
+        return {'error': 'Niet aangemeld'}, 401
+    # Recente runs uit het runjournaal; onderbroken runs zijn te hervatten via /resume/<run_id>
+    return {'runs': database.list_runs()}
+
+@app.route('/resume/<run_id>', methods=['POST'])
+def resume(run_id):
+    if not is_logged_in():
+        return redirect(url_for('login'))
+    
+    if database.get_run(run_id) is None:
+        flash(f'Run {run_id} niet gevonden.', 'danger')
+        return redirect(url_for('index'))
+    
+    use_tor = request.form.get('use_tor') == 'yes'
+    reddit_cookie = request.form.get('reddit_cookie', '').strip()
+    
+    job = start_scrape_job({'resume_run_id': run_id, 'use_tor': use_tor}, [], 0, False, False, use_tor, reddit_cookie, resume_run_id=run_id)
     
-    flash(f'Scraper gestart voor {len(subreddits)} subreddits. Dit kan enige tijd duren. Ververs de pagina over enkele minuten.', 'success')
+    flash(f'Run {run_id} wordt hervat (taak {job.id}).', 'success')
     return redirect(url_for('index'))
 
 @app.route('/stop', methods=['POST'])
@@ -187,12 +263,21 @@ def stop_scraper():
     if not is_logged_in():
         return {'error': 'Niet aangemeld'}, 401
     
-    # Roep de stopfunctie in de module aan
-    # Opnieuw importeren voor zekerheid
-    import scraper
-    scraper.STOP_REQUESTED = True
+    # Zonder taak-ID: stop alle lopende taken
+    stopped = job_manager.manager.stop_all()
+    
+    return {'status': 'stopping', 'message': 'Stopsignaal verzonden...', 'jobs': [job.id for job in stopped]}
+
+@app.route('/stop/<job_id>', methods=['POST'])
+def stop_job(job_id):
+    if not is_logged_in():
+        return {'error': 'Niet aangemeld'}, 401
+    
+    job = job_manager.manager.stop(job_id)
+    if job is None:
+        return {'error': 'Taak niet gevonden'}, 404
     
-    return {'status': 'stopping', 'message': 'Stopsignaal verzonden...'}
+    return {'status': 'stopping', 'message': f'Stopsignaal verzonden naar taak {job_id}...', 'job': job_id}
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -224,7 +309,7 @@ def index():
     # Haal de lijst met subreddits op
     subreddits = []
     if os.path.exists(EXPORTS_DIR):
-        subreddits = [d for d in os.listdir(EXPORTS_DIR) if os.path.isdir(os.path.join(EXPORTS_DIR, d))]
+        subreddits = [d for d in os.listdir(EXPORTS_DIR) if os.path.isdir(os.path.join(EXPORTS_DIR, d)) and not d.startswith('.')]
         # Sorteer alfabetisch
         subreddits.sort()
     
@@ -246,25 +331,63 @@ def view_subreddit(name):
         flash('Subreddit niet gevonden', 'warning')
         return redirect(url_for('index'))
         
-    # Haal de berichten op (mappen in de subreddit-map)
-    # Sorteer op tijd (nieuwste eerst) voor direct overzicht
-    try:
-        posts = [d for d in os.listdir(subreddit_path) if os.path.isdir(os.path.join(subreddit_path, d))]
-        posts.sort(key=lambda x: os.path.getmtime(os.path.join(subreddit_path, x)), reverse=True)
-    except:
-        posts = []
+    # Berichten uit de index in de database (zie post_index.py) in plaats van alle mappen te sorteren
+    if not database.is_post_index_built(name):
+        # Exports van vóór de index: eenmalig opbouwen als achtergrondtaak
+        job = start_reindex_job(name)
+        flash(f'Berichtenoverzicht wordt opgebouwd (taak {job.id}). Ververs de pagina over enkele ogenblikken.', 'info')
+    
+    listing = post_index.page(
+        name,
+        page=request.args.get('page', 1, type=int),
+        per_page=request.args.get('per_page', post_index.PAGE_SIZE, type=int),
+        sort=request.args.get('sort', 'exported'),
+        order=request.args.get('order', 'desc'),
+        search=request.args.get('q', '').strip(),
+        media_type=request.args.get('media_type', '').strip()
+    )
+    if request.args.get('format') == 'json':
+        return listing
+    posts = [post['folder'] for post in listing['posts']]
     
     # Controleer op aanwezigheid CSV-bestand
     csv_file = None
     if os.path.exists(os.path.join(subreddit_path, 'all_data.csv')):
         csv_file = 'all_data.csv'
         
-    # Controleer op aanwezigheid JSON-bestand
-    json_file = None
-    if os.path.exists(os.path.join(subreddit_path, 'all_data.json')):
-        json_file = 'all_data.json'
+    # Controleer op aanwezigheid JSON-archief (all_data.jsonl of oud all_data.json)
+    json_file = master_store.archive_filename(subreddit_path)
         
-    return render_template('subreddit.html', subreddit=name, posts=posts, csv_file=csv_file, json_file=json_file)
+    return render_template('subreddit.html', subreddit=name, posts=posts, listing=listing, csv_file=csv_file, json_file=json_file)
+
+def start_reindex_job(name):
+    """Start het opnieuw opbouwen van de index van één subreddit, tenzij dit al loopt."""
+    for job in job_manager.manager.list():
+        if job.kind == 'reindex' and job.params.get('subreddit') == name and job.status in ('queued', 'running'):
+            return job
+    return job_manager.manager.submit('reindex', lambda job: post_index.rebuild(name, job.update), {'subreddit': name})
+
+@app.route('/subreddit/<name>/reindex', methods=['POST'])
+def reindex_subreddit(name):
+    if not is_logged_in():
+        return {'error': 'Niet aangemeld'}, 401
+    if not os.path.isdir(os.path.join(EXPORTS_DIR, name)):
+        return {'error': 'Subreddit niet gevonden'}, 404
+    job = start_reindex_job(name)
+    return {'status': 'started', 'job': job.id}
+
+def _zip_response(root, download_name):
+    """Stuur root als ZIP-archief dat tijdens het downloaden wordt opgebouwd (geen tijdelijk bestand)."""
+    file_filter = request.args.get('filter', 'all')
+    if file_filter not in zip_stream.FILTERS:
+        return {'error': f"Onbekend filter (kies uit {', '.join(zip_stream.FILTERS)})"}, 400
+    if file_filter != 'all':
+        download_name = f"{download_name}_{file_filter}"
+    return Response(
+        stream_with_context(zip_stream.stream_zip(root, file_filter)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{download_name}.zip"'}
+    )
 
 @app.route('/download_zip/<name>')
 def download_zip(name):
@@ -276,23 +399,14 @@ def download_zip(name):
         flash('Subreddit niet gevonden', 'warning')
         return redirect(url_for('index'))
     
-    # Maak een ZIP-archief van de map
-    # Tijdelijke opslag in de exports-map (buiten de subreddit-map)
-    zip_filename = f"{name}.zip"
-    zip_path = os.path.join(EXPORTS_DIR, zip_filename)
-    
     # Log deze actie
     list_handler.emit(logging.LogRecord(
         name="server", level=logging.INFO, pathname="", lineno=0,
         msg=f"Start ZIP-download voor: {name}", args=(), exc_info=None
     ))
     
-    try:
-        shutil.make_archive(os.path.join(EXPORTS_DIR, name), 'zip', subreddit_path)
-        return send_from_directory(EXPORTS_DIR, zip_filename, as_attachment=True)
-    except Exception as e:
-        flash(f'Fout bij genereren van ZIP: {e}', 'danger')
-        return redirect(url_for('view_subreddit', name=name))
+    # Optioneel: ?filter=json (alleen JSON) of ?filter=no_video
+    return _zip_response(subreddit_path, name)
 
 @app.route('/download_post_zip/<subreddit>/<post_folder>')
 def download_post_zip(subreddit, post_folder):
@@ -306,23 +420,7 @@ def download_post_zip(subreddit, post_folder):
         flash('Berichtmap niet gevonden', 'warning')
         return redirect(url_for('view_subreddit', name=subreddit))
     
-    # Maak een ZIP van deze specifieke berichtmap
-    zip_filename = f"{post_folder}.zip"
-    # Sla op in de tijdelijke exports-directory
-    zip_path = os.path.join(EXPORTS_DIR, zip_filename)
-    
-    try:
-        shutil.make_archive(os.path.join(EXPORTS_DIR, post_folder), 'zip', post_path)
-        # make_archive voegt zelf .zip toe, controle vereist
-        if os.path.exists(zip_path):
-             return send_from_directory(EXPORTS_DIR, zip_filename, as_attachment=True)
-        else:
-             # Fallback voor afwijkend gedrag van shutil
-             return send_from_directory(EXPORTS_DIR, post_folder + ".zip", as_attachment=True)
-             
-    except Exception as e:
-        flash(f'Fout bij genereren van ZIP: {e}', 'danger')
-        return redirect(url_for('view_subreddit', name=subreddit))
+    return _zip_response(post_path, post_folder)
 
 @app.route('/cleanup')
 def cleanup_page():
@@ -334,7 +432,7 @@ def cleanup_page():
     
     if os.path.exists(EXPORTS_DIR):
         for d in os.listdir(EXPORTS_DIR):
-            if os.path.isdir(os.path.join(EXPORTS_DIR, d)):
+            if os.path.isdir(os.path.join(EXPORTS_DIR, d)) and not d.startswith('.'):
                 if "_cleaned" in d:
                     cleaned_subreddits.append(d)
                 else:
@@ -389,7 +487,7 @@ def cleanup_analyze():
         subreddits = []
         if os.path.exists(EXPORTS_DIR):
             for d in os.listdir(EXPORTS_DIR):
-                if os.path.isdir(os.path.join(EXPORTS_DIR, d)) and "_cleaned" not in d:
+                if os.path.isdir(os.path.join(EXPORTS_DIR, d)) and "_cleaned" not in d and not d.startswith('.'):
                     subreddits.append(d)
         
         result = data_cleaner.calculate_batch_cleanup_stats(subreddits)
@@ -405,6 +503,15 @@ def cleanup_analyze():
         'deleted': result['deleted']
     }
 
+def start_cleanup_job(subreddits):
+    """Start de batch-opschoning als achtergrondtaak, tenzij er al een loopt."""
+    for job in job_manager.manager.list():
+        if job.kind == 'cleanup' and job.status in ('queued', 'running'):
+            return job
+    return job_manager.manager.submit(
+        'cleanup', lambda job: data_cleaner.perform_batch_cleanup(subreddits, job.update), {'subreddits': subreddits}
+    )
+
 @app.route('/api/cleanup/perform', methods=['POST'])
 def cleanup_perform():
     if not is_logged_in():
@@ -422,19 +529,66 @@ def cleanup_perform():
         subreddits = []
         if os.path.exists(EXPORTS_DIR):
             for d in os.listdir(EXPORTS_DIR):
-                if os.path.isdir(os.path.join(EXPORTS_DIR, d)) and "_cleaned" not in d:
+                if os.path.isdir(os.path.join(EXPORTS_DIR, d)) and "_cleaned" not in d and not d.startswith('.'):
                     subreddits.append(d)
                     
-        result = data_cleaner.perform_batch_cleanup(subreddits)
-        return result
+        # Loopt als taak: voortgang via /status/<job> of /events, resultaat in 'result'
+        job = start_cleanup_job(sorted(subreddits))
+        return {'success': True, 'status': 'started', 'job': job.id}
         
     result = data_cleaner.perform_cleanup(subreddit, force=force)
     return result
 
+def _parse_day(value, end_of_day=False):
+    """'JJJJ-MM-DD' als Unix-tijd in UTC (begin van de dag, of begin van de volgende dag), of None."""
+    if not value:
+        return None
+    from datetime import datetime, timedelta, timezone
+    # created_utc is in UTC: niet afhankelijk van de tijdzone van de server
+    day = datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    if end_of_day:
+        day += timedelta(days=1)
+    return day.timestamp()
+
+@app.route('/api/archive/<subreddit>')
+def archive_api(subreddit):
+    """
+    Berichten uit het archief van een subreddit, per pagina (zie master_store.page).
+    Parameters: page, per_page, order (asc|desc), author, q, from en to (JJJJ-MM-DD, tot en met).
+    """
+    if not is_logged_in():
+        return {'error': 'Niet aangemeld'}, 401
+    folder = os.path.join(EXPORTS_DIR, subreddit)
+    if not master_store.has_archive(folder):
+        return {'error': 'Geen archief gevonden'}, 404
+    if master_store.archive_filename(folder) == master_store.LEGACY_FILE:
+        return {'error': 'Archief is nog in het oude formaat (all_data.json); het wordt omgezet bij de volgende scrape of met: python master_store.py migrate ' + subreddit}, 409
+    try:
+        date_from = _parse_day(request.args.get('from', '').strip())
+        date_to = _parse_day(request.args.get('to', '').strip(), end_of_day=True)
+    except ValueError:
+        return {'error': 'Ongeldige datum (gebruik JJJJ-MM-DD)'}, 400
+    
+    return master_store.page(
+        folder,
+        page=request.args.get('page', 1, type=int),
+        per_page=request.args.get('per_page', master_store.PAGE_SIZE, type=int),
+        order=request.args.get('order', 'asc'),
+        author=request.args.get('author'),
+        keyword=request.args.get('q'),
+        date_from=date_from,
+        date_to=date_to
+    )
+
 @app.route('/files/<path:filename>')
 def serve_file(filename):
     if not is_logged_in():
         return redirect(url_for('login'))
+    # Het archief is te groot om in één keer te versturen: doorverwijzen naar de gepagineerde API
+    # (met ?raw=1 alsnog het volledige bestand)
+    subreddit, name = os.path.split(filename)
+    if name == master_store.ARCHIVE_FILE and subreddit and not request.args.get('raw'):
+        return redirect(url_for('archive_api', subreddit=subreddit))
     return send_from_directory(EXPORTS_DIR, filename)
 
 if __name__ == '__main__':
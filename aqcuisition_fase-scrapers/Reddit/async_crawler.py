@@ -0,0 +1,383 @@
+import asyncio
+import time
+
+import aiohttp
+
+import scraper
+import database
+import rate_limiter
+import identity_pool
+import job_manager
+
+try:
+    # Nodig voor Tor (SOCKS5); zonder dit pakket wordt alleen direct verbonden
+    from aiohttp_socks import ProxyConnector
+except ImportError:
+    ProxyConnector = None
+
+console = scraper.console
+
+# Maximaal aantal openstaande verzoeken tegelijk, per identiteit in identity_pool
+MAX_CONCURRENT_REQUESTS = 8
+# Maximaal aantal berichten per subreddit dat tegelijk wordt opgehaald, per identiteit
+MAX_POSTS_PER_SUBREDDIT = 4
+MAX_RETRIES = 8
+REQUEST_TIMEOUT = 30
+
+async def _sleep(seconds):
+    """Wacht in kleine stappen zodat een stopsignaal direct wordt opgepakt."""
+    end = time.monotonic() + seconds
+    while not scraper.stop_requested():
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            break
+        await asyncio.sleep(min(1.0, remaining))
+
+class AsyncCrawler:
+    """
+    Asynchrone crawler: lijstpagina's, berichten en exports van meerdere
+    subreddits lopen als gelijktijdige taken binnen één event loop.
+    Verzoeken worden verdeeld over de identiteiten in identity_pool; het tempo
+    wordt bepaald door het budget per identiteit in rate_limiter.
+    """
+    def __init__(self, limit, filter_date, start_ts, end_ts, keywords, status_callback=None, reddit_cookie=None, incremental=False, run_id=None):
+        self.limit = limit
+        self.incremental = incremental
+        self.run_id = run_id
+        self.filter_date = filter_date
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+        self.keywords = keywords or []
+        self.status_callback = status_callback
+        self.reddit_cookie = reddit_cookie
+
+        self.pool = None
+        # Eén aiohttp-sessie per identiteit: {sleutel: (proxy, sessie)}
+        self.sessions = {}
+        self._retired_sessions = []
+        self.request_slots = None
+
+    def _status(self, msg):
+        if self.status_callback:
+            self.status_callback(msg)
+
+    def _new_session(self, proxy):
+        timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        if proxy and ProxyConnector:
+            connector = ProxyConnector.from_url(proxy.replace('socks5h://', 'socks5://'), rdns=True, limit=MAX_CONCURRENT_REQUESTS)
+        else:
+            if proxy:
+                console.print("[yellow]aiohttp-socks niet geïnstalleerd: asynchrone verzoeken gaan niet via Tor.[/yellow]")
+            connector = aiohttp.TCPConnector(limit=MAX_CONCURRENT_REQUESTS)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    def _session_for(self, identity):
+        """Sessie van deze identiteit; na een nieuw Tor-circuit wordt een nieuwe sessie gebouwd."""
+        entry = self.sessions.get(identity.key)
+        if entry and entry[0] == identity.proxy:
+            return entry[1]
+        if entry:
+            self._retired_sessions.append(entry[1])
+        session = self._new_session(identity.proxy)
+        self.sessions[identity.key] = (identity.proxy, session)
+        return session
+
+    async def fetch_json(self, url):
+        """
+        Asynchrone tegenhanger van scraper.get_reddit_data.
+        Elk verzoek gaat naar de identiteit met het meeste resterende budget;
+        bij een 429 krijgt die identiteit een nieuw circuit of quarantaine.
+        """
+        url = scraper.ensure_json_url(url)
+
+        for attempt in range(MAX_RETRIES):
+            if scraper.stop_requested():
+                return None
+
+            # Wacht alleen wanneer het budget van alle identiteiten op is
+            identity, wait = self.pool.select()
+            await _sleep(wait)
+            if scraper.stop_requested():
+                rate_limiter.release(identity.key)
+                return None
+
+            headers = scraper.get_random_headers()
+            if identity.cookie:
+                headers['Cookie'] = f"reddit_session={identity.cookie}"
+
+            session = self._session_for(identity)
+            try:
+                async with self.request_slots:
+                    try:
+                        response = await session.get(url, headers=headers)
+                    except Exception:
+                        # Geen response: de reservering vervalt zonder nieuwe budgetgegevens
+                        rate_limiter.release(identity.key)
+                        raise
+                    async with response:
+                        rate_limiter.update_from_headers(identity.key, response.headers)
+                        if response.status == 429:
+                            quarantine = identity_pool.report_throttle(identity, response.headers)
+                            job_manager.count('throttled')
+                            if quarantine:
+                                msg = f"Toegang beperkt (429) via {identity.name}. Identiteit {int(quarantine)}s in quarantaine..."
+                            else:
+                                msg = f"Toegang beperkt (429) via {identity.name}. Nieuw Tor-circuit wordt gebruikt..."
+                            console.print(f"[yellow]{msg}[/yellow]")
+                            self._status(msg)
+                            continue
+
+                        response.raise_for_status()
+                        identity_pool.report_success(identity)
+                        job_manager.count('requests')
+                        return await response.json(content_type=None)
+
+            except Exception as e:
+                if attempt == MAX_RETRIES - 1:
+                    console.print(f"[bold red]Fout bij ophalen data (poging {attempt+1}):[/bold red] {e}")
+                    self._status(f"Fout: {e}")
+                    return None
+                wait_time = min(60, 5 * (2 ** attempt))
+                msg = f"Ophalen mislukt (poging {attempt+1}/{MAX_RETRIES})... wachten {wait_time}s."
+                console.print(f"[yellow]{msg} ({e})[/yellow]")
+                self._status(msg)
+                await _sleep(wait_time)
+
+        return None
+
+    async def process_post(self, sub_name, post_summary, progress_str, post_slots, export_lock):
+        """Haal één volledig bericht op en exporteer het. Retourneert True bij succes."""
+        title = post_summary.get('title', 'Onbekend')
+        post_id = post_summary.get('id')
+        full_url = f"https://www.reddit.com{post_summary['permalink']}"
+
+        async with post_slots:
+            if scraper.stop_requested():
+                return False
+
+            msg = f"Bericht {progress_str}: {title}"
+            console.print(f"\n[bold magenta]{msg}[/bold magenta]")
+            self._status(f"[{sub_name}] {msg}")
+
+            try:
+                full_post_data = await self.fetch_json(full_url)
+                if not full_post_data:
+                    return False
+
+                # Reactieboom uitvouwen (extra verzoeken) buiten de exportvergrendeling. Dit gebeurt
+                # met blokkerende verzoeken (scraper.get_reddit_data) in een thread, niet via aiohttp
+                loaded = await asyncio.to_thread(scraper.load_post, full_post_data)
+                if not loaded:
+                    return False
+
+                # Exports per subreddit na elkaar: all_data.json/csv zijn niet thread-safe
+                async with export_lock:
+                    await asyncio.to_thread(scraper.show_and_export_post, *loaded, True)
+                await asyncio.to_thread(database.mark_post_processed, post_id, sub_name, title)
+                return True
+            except Exception as e:
+                console.print(f"[red]Fout bij verwerken bericht '{title}': {e}[/red]")
+                self._status(f"Fout bij bericht: {e}")
+                return False
+
+    async def crawl_subreddit(self, base_url):
+        """Asynchrone tegenhanger van scraper.scrape_single_subreddit."""
+        sub_name = base_url.split('/')[-1]
+        after = None
+        processed_count = 0
+        keep_going = True
+        fully_seen_pages = 0
+        limit = self.limit
+
+        post_slots = asyncio.Semaphore(MAX_POSTS_PER_SUBREDDIT * self.pool.size())
+        export_lock = asyncio.Lock()
+
+        # Incrementele modus: alleen berichten nieuwer dan de high-water mark
+        mark = await asyncio.to_thread(database.get_high_water_mark, sub_name) if self.incremental else None
+        safe_mark = None
+        reached_mark = False
+        covered = False
+        fetch_failed = False
+
+        # Hervatten vanuit het runjournaal
+        progress = await asyncio.to_thread(database.get_run_progress, self.run_id, sub_name) if self.run_id else None
+        if progress:
+            if progress['phase'] == 'done':
+                console.print(f"[dim]{sub_name} is al afgerond in run {self.run_id}.[/dim]")
+                return 0
+            after = progress['after']
+            processed_count = progress['processed']
+            self._status(f"Hervatten van {sub_name} ({processed_count} berichten verwerkt)...")
+
+            if progress['phase'] == 'history' and progress['history_end_ts']:
+                target_start_ts = self.start_ts if self.start_ts > 0 else 0
+                processed_count += await asyncio.to_thread(
+                    scraper.scrape_remaining_history, base_url, limit - processed_count,
+                    target_start_ts, progress['history_end_ts'], self.keywords, self.status_callback, self.reddit_cookie
+                )
+                if not scraper.stop_requested():
+                    await asyncio.to_thread(database.save_run_progress, self.run_id, sub_name, 'done', None, processed_count)
+                return processed_count
+
+        self._status(f"Starten met {sub_name} (Limiet: {limit})...")
+
+        while keep_going and not scraper.stop_requested():
+            batch_limit = 100
+            if limit > 0 and (limit - processed_count) < 100:
+                batch_limit = limit - processed_count
+            if batch_limit <= 0:
+                batch_limit = 100
+
+            current_url = scraper.build_listing_url(base_url, after, batch_limit, self.keywords, self.filter_date, sort_new=self.incremental)
+            console.print(f"[dim]URL: {current_url}[/dim]")
+
+            data = await self.fetch_json(current_url)
+            if not data:
+                if not scraper.stop_requested():
+                    console.print(f"[red]Kon geen data ophalen voor {base_url}.[/red]")
+                    self._status(f"[{sub_name}] Fout: Geen data ontvangen.")
+                safe_mark = None
+                fetch_failed = True
+                break
+
+            if isinstance(data, dict) and data.get('kind') == 'Listing':
+                children = data['data']['children']
+                after = data['data'].get('after')
+
+                if not children:
+                    console.print("[dim]Geen berichten meer gevonden.[/dim]")
+                    covered = True
+                    break
+
+                if self.incremental:
+                    children, reached_mark = scraper.split_at_high_water_mark(children, mark)
+
+                # Controleer de hele pagina in één keer tegen de database
+                new_posts, seen_ratio = scraper.select_unprocessed_posts(children, sub_name, self.status_callback)
+                fully_seen_pages = fully_seen_pages + 1 if seen_ratio == 1.0 else 0
+                if scraper.MAX_FULLY_SEEN_PAGES and fully_seen_pages >= scraper.MAX_FULLY_SEEN_PAGES:
+                    console.print(f"[yellow]{fully_seen_pages} pagina's achter elkaar volledig bekend. Paginering gestopt.[/yellow]")
+                    break
+
+                # Selecteer berichten van deze pagina en haal ze gelijktijdig op; mislukken er
+                # enkele, dan worden volgende berichten van de pagina aangevuld tot de limiet
+                next_index = 0
+                failed_ids = set()
+                while next_index < len(new_posts) and keep_going and not scraper.stop_requested():
+                    candidates = []
+                    while next_index < len(new_posts):
+                        if limit > 0 and processed_count + len(candidates) >= limit:
+                            break
+                        post_summary = new_posts[next_index]['data']
+                        next_index += 1
+                        action = scraper.check_post_filters(post_summary, self.filter_date, self.start_ts, self.end_ts, self.keywords)
+                        if action == 'stop':
+                            # Dit bericht en de rest van de pagina vallen buiten de run
+                            next_index -= 1
+                            keep_going = False
+                            covered = True
+                            break
+                        if action == 'skip' or not post_summary.get('permalink'):
+                            continue
+                        candidates.append(post_summary)
+                    if not candidates:
+                        break
+
+                    tasks = []
+                    for i, post_summary in enumerate(candidates):
+                        n = processed_count + i + 1
+                        progress_str = f"{n}/{limit}" if limit > 0 else f"{n}"
+                        tasks.append(self.process_post(sub_name, post_summary, progress_str, post_slots, export_lock))
+                    results = await asyncio.gather(*tasks)
+                    processed_count += sum(1 for ok in results if ok)
+                    failed_ids.update(post['id'] for post, ok in zip(candidates, results) if not ok)
+                    if limit > 0 and processed_count >= limit:
+                        break
+
+                # Voor de high-water mark: berichten die niet meer aan bod kwamen (limiet of stop)
+                pending_ids = {post['data'].get('id') for post in new_posts[next_index:]}
+                if self.incremental:
+                    safe_mark = scraper.advance_safe_mark(children, failed_ids, pending_ids, safe_mark)
+
+                # Alleen een volledig bekeken pagina telt: anders is de oude mark niet zonder gaten bereikt
+                page_done = not pending_ids
+                if reached_mark:
+                    msg = "High-water mark bereikt: geen nieuwere berichten meer."
+                    console.print(f"[green]{msg}[/green]")
+                    self._status(f"[{sub_name}] {msg}")
+                    if page_done:
+                        covered = True
+                    keep_going = False
+
+                elif not after:
+                    console.print("[yellow]Einde van lijst bereikt.[/yellow]")
+                    if page_done:
+                        covered = True
+
+                    if self.filter_date and limit > 0 and processed_count < limit and not scraper.stop_requested():
+                        console.print(f"[bold cyan]Limiet nog niet bereikt ({processed_count}/{limit}). Starten Tijdreis-modus...[/bold cyan]")
+
+                        last_timestamp = 0
+                        last_child = children[-1]
+                        if last_child['kind'] == 't3':
+                            last_timestamp = last_child['data'].get('created_utc', 0)
+
+                        if last_timestamp > 0:
+                            target_start_ts = self.start_ts if self.start_ts > 0 else 0
+                            if self.run_id:
+                                await asyncio.to_thread(database.save_run_progress, self.run_id, sub_name, 'history', None, processed_count, last_timestamp)
+                            extra_count = await asyncio.to_thread(
+                                scraper.scrape_remaining_history, base_url, limit - processed_count,
+                                target_start_ts, last_timestamp, self.keywords, self.status_callback, self.reddit_cookie
+                            )
+                            processed_count += extra_count
+
+                    keep_going = False
+
+                if limit > 0 and processed_count >= limit:
+                    console.print(f"[green]Limiet bereikt ({processed_count}/{limit}). Proces gestopt.[/green]")
+                    keep_going = False
+
+                # Checkpoint: cursor van de volgende pagina, alleen als deze pagina volledig is afgehandeld
+                if self.run_id and keep_going and not scraper.stop_requested():
+                    await asyncio.to_thread(database.save_run_progress, self.run_id, sub_name, 'listing', after, processed_count)
+
+            elif isinstance(data, list):
+                await asyncio.to_thread(scraper.process_post_data, data, True)
+                keep_going = False
+            else:
+                console.print(f"[red]Onbekende datastructuur: {type(data)}[/red]")
+                keep_going = False
+
+        if self.incremental:
+            await asyncio.to_thread(scraper.finish_incremental, sub_name, mark, safe_mark, covered)
+        if self.run_id and not scraper.stop_requested() and not fetch_failed:
+            await asyncio.to_thread(database.save_run_progress, self.run_id, sub_name, 'done', None, processed_count)
+        return processed_count
+
+    async def run(self, target_urls):
+        """Verwerk alle subreddits gelijktijdig binnen het gedeelde budget."""
+        self.pool = identity_pool.get_pool(scraper.get_current_proxy(), self.reddit_cookie)
+        # Meer identiteiten = meer budget: de gelijktijdigheid schaalt mee
+        self.request_slots = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS * self.pool.size())
+
+        try:
+            results = await asyncio.gather(
+                *[self.crawl_subreddit(url) for url in target_urls],
+                return_exceptions=True
+            )
+            for url, result in zip(target_urls, results):
+                if isinstance(result, Exception):
+                    console.print(f"[red]Fout bij {url}: {result}[/red]")
+            return results
+        finally:
+            for session in [entry[1] for entry in self.sessions.values()] + self._retired_sessions:
+                await session.close()
+
+def run_async_crawl(target_urls, limit, filter_date, start_ts, end_ts, keywords, status_callback=None, reddit_cookie=None, incremental=False, run_id=None):
+    """
+    Synchrone ingang voor run_scraper_headless: start een eigen event loop.
+    Werkt ook vanuit de achtergrondthread van app.run_scraper_bg.
+    """
+    crawler = AsyncCrawler(limit, filter_date, start_ts, end_ts, keywords, status_callback, reddit_cookie, incremental, run_id)
+    return asyncio.run(crawler.run(target_urls))
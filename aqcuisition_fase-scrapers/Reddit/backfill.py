@@ -0,0 +1,276 @@
+import threading
+import urllib.parse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+import scraper
+import database
+import job_manager
+
+console = scraper.console
+
+# Aantal tijdvensters dat tegelijk wordt doorzocht (binnen het gedeelde verzoekbudget)
+BACKFILL_WORKERS = 3
+# Venstergrootte in seconden: start op 30 dagen, daarna aangepast aan de drukte
+INITIAL_WINDOW = 30 * 24 * 60 * 60
+MIN_WINDOW = 60 * 60
+MAX_WINDOW = 180 * 24 * 60 * 60
+# Een zoekopdracht levert maximaal ongeveer 1000 resultaten; vanaf CAP_THRESHOLD
+# wordt aangenomen dat het venster is afgekapt
+SEARCH_RESULT_CAP = 1000
+CAP_THRESHOLD = 900
+# Vensters met minder resultaten dan dit zijn 'dun': volgende vensters worden groter
+SPARSE_RESULTS = 100
+
+def query_clause(keywords):
+    """Zoekwoordendeel van de zoekopdracht (maximaal 10 termen), of ''."""
+    kws = (keywords or [])[:10]
+    return "(" + " OR ".join(kws) + ")" if kws else ""
+
+def build_search_url(sub_name, start_ts, end_ts, clause):
+    query_parts = [f"timestamp:{int(start_ts)}..{int(end_ts)}"]
+    if clause:
+        query_parts.append(clause)
+    encoded_query = urllib.parse.quote(" AND ".join(query_parts))
+    return f"https://www.reddit.com/r/{sub_name}/search.json?q={encoded_query}&restrict_sr=on&include_over_18=on&sort=new&limit=100&syntax=cloudsearch"
+
+def _window(start_ts, end_ts, status='running'):
+    return {'start_ts': int(start_ts), 'end_ts': int(end_ts), 'status': status, 'after': None, 'found': 0, 'processed': 0, 'failed': []}
+
+def _failed_entry(post_data):
+    # Genoeg om het bericht later opnieuw op te halen (zie Backfill._retry_failed)
+    return {'id': post_data.get('id'), 'permalink': post_data.get('permalink'), 'title': post_data.get('title', 'Onbekend')}
+
+class BackfillPlanner:
+    """
+    Verdeelt [start_ts, end_ts] in tijdvensters, van nieuw naar oud.
+    Vensters die al in de database staan worden overgeslagen (afgerond)
+    of eerst hervat (onderbroken), zodat een gecrashte run verdergaat.
+    Vensters met mislukte berichten ('partial') worden opnieuw ingepland voor die berichten.
+    """
+    def __init__(self, sub_name, query, start_ts, end_ts):
+        self.lock = threading.Lock()
+        self.sub_name = sub_name
+        self.query = query
+        self.start_ts = int(start_ts)
+        self.cursor = int(end_ts)
+        self.size = INITIAL_WINDOW
+
+        self.recorded = database.get_backfill_windows(sub_name, query, start_ts, end_ts)
+        self.queue = deque(w for w in self.recorded if w['status'] in ('pending', 'running', 'partial'))
+
+    def _skip_recorded(self):
+        moved = True
+        while moved:
+            moved = False
+            for w in self.recorded:
+                if w['start_ts'] < self.cursor <= w['end_ts']:
+                    self.cursor = w['start_ts']
+                    moved = True
+
+    def next_window(self):
+        """Volgende venster om te doorzoeken, of None als het bereik klaar is."""
+        with self.lock:
+            if self.queue:
+                return self.queue.popleft()
+            self._skip_recorded()
+            if self.cursor <= self.start_ts:
+                return None
+            lower = max(self.start_ts, self.cursor - self.size)
+            # Niet over een eerder vastgelegd venster heen plannen
+            for w in self.recorded:
+                if lower < w['end_ts'] < self.cursor:
+                    lower = w['end_ts']
+            window = _window(lower, self.cursor)
+            self.cursor = lower
+            self.recorded.append(window)
+            return window
+
+    def report(self, window, oldest_ts):
+        """Verwerk de uitkomst van een afgerond venster en pas de venstergrootte aan."""
+        with self.lock:
+            if window['found'] >= CAP_THRESHOLD:
+                # Afgekapt: het oudste deel ontbreekt nog en wordt als nieuw venster ingepland
+                self.size = max(MIN_WINDOW, self.size // 2)
+                if oldest_ts and oldest_ts - window['start_ts'] >= MIN_WINDOW:
+                    rest = _window(window['start_ts'], oldest_ts, status='pending')
+                    database.save_backfill_window(self.sub_name, self.query, rest['start_ts'], rest['end_ts'], 'pending')
+                    self.recorded.append(rest)
+                    self.queue.appendleft(rest)
+                else:
+                    console.print(f"[yellow]Venster {window['start_ts']}..{window['end_ts']} afgekapt op {SEARCH_RESULT_CAP} resultaten.[/yellow]")
+            elif window['found'] < SPARSE_RESULTS:
+                self.size = min(MAX_WINDOW, self.size * 2)
+
+class Backfill:
+    """Historische scrape van één subreddit: meerdere tijdvensters tegelijk."""
+    def __init__(self, base_url, posts_needed, start_ts, end_ts, keywords, status_callback, reddit_cookie):
+        self.sub_name = base_url.split('/')[-1]
+        self.posts_needed = posts_needed
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+        self.clause = query_clause(keywords)
+        self.status_callback = status_callback
+        self.reddit_cookie = reddit_cookie
+
+        self.lock = threading.Lock()
+        # Exports per subreddit na elkaar, net als in async_crawler
+        self.export_lock = threading.Lock()
+        self.total_processed = 0
+
+    def _status(self, msg):
+        if self.status_callback:
+            self.status_callback(f"[{self.sub_name}] {msg}")
+
+    def _finished(self):
+        with self.lock:
+            return scraper.stop_requested() or self.total_processed >= self.posts_needed
+
+    def _checkpoint(self, window):
+        database.save_backfill_window(
+            self.sub_name, self.clause, window['start_ts'], window['end_ts'], window['status'],
+            window['after'], window['found'], window['processed'], window['failed']
+        )
+
+    def _fetch(self, url):
+        return scraper.get_reddit_data(url, status_callback=self.status_callback, reddit_cookie=self.reddit_cookie)
+
+    def _process_post(self, post_data):
+        permalink = post_data.get('permalink')
+        if not permalink:
+            return False
+        title = post_data.get('title', 'Onbekend')
+
+        full_post_data = self._fetch(f"https://www.reddit.com{permalink}")
+        if not full_post_data:
+            return False
+        loaded = scraper.load_post(full_post_data)
+        if not loaded:
+            return False
+        with self.export_lock:
+            if not scraper.show_and_export_post(*loaded, auto_export=True):
+                return False
+        database.mark_post_processed(post_data.get('id'), self.sub_name, title)
+
+        with self.lock:
+            self.total_processed += 1
+            n = self.total_processed
+        console.print(f"[bold magenta]Historie Bericht +{n}:[/bold magenta] {title}")
+        return True
+
+    def _retry_failed(self, window):
+        """Probeer de mislukte berichten van een verder doorzocht venster opnieuw."""
+        pending = window['failed']
+        todo = set(database.filter_unprocessed([post['id'] for post in pending]))
+        remaining = []
+        for i, post_data in enumerate(pending):
+            if post_data['id'] not in todo:
+                # Inmiddels (bijv. via een andere run) verwerkt
+                continue
+            if self._finished():
+                remaining.extend(post for post in pending[i:] if post['id'] in todo)
+                break
+            if self._process_post(post_data):
+                window['processed'] += 1
+            else:
+                remaining.append(post_data)
+        window['failed'] = remaining
+        window['status'] = 'partial' if remaining else 'done'
+        self._checkpoint(window)
+        return not remaining
+
+    def run_window(self, planner, window):
+        """
+        Doorzoek één venster. Het checkpoint bevat de 'after'-cursor van de laatste volledige pagina
+        en de berichten die mislukten; een venster met mislukte berichten blijft 'partial'.
+        """
+        if window['status'] == 'partial':
+            return self._retry_failed(window)
+
+        d1 = datetime.fromtimestamp(window['start_ts']).strftime('%Y-%m-%d')
+        d2 = datetime.fromtimestamp(window['end_ts']).strftime('%Y-%m-%d')
+        msg = f"Historische analyse: {d1} tot {d2}"
+        console.print(f"[dim]{msg}[/dim]")
+        self._status(msg)
+
+        window['status'] = 'running'
+        self._checkpoint(window)
+        search_url = build_search_url(self.sub_name, window['start_ts'], window['end_ts'], self.clause)
+        oldest_ts = None
+
+        while not self._finished():
+            page_url = search_url
+            if window['after']:
+                page_url += f"&after={window['after']}"
+
+            data = self._fetch(page_url)
+            if not (isinstance(data, dict) and data.get('kind') == 'Listing'):
+                # Venster blijft 'running' en wordt bij een volgende run hervat
+                return False
+
+            children = data['data']['children']
+            block_after = data['data'].get('after')
+            for child in children:
+                created_utc = child['data'].get('created_utc')
+                if child['kind'] == 't3' and created_utc and (oldest_ts is None or created_utc < oldest_ts):
+                    oldest_ts = created_utc
+
+            new_posts, _ = scraper.select_unprocessed_posts(children, self.sub_name, self.status_callback)
+            page_complete = True
+            for child in new_posts:
+                if self._finished():
+                    page_complete = False
+                    break
+                post_data = child['data']
+                if child['kind'] != 't3' or not post_data.get('permalink'):
+                    continue
+                if self._process_post(post_data):
+                    window['processed'] += 1
+                elif not scraper.stop_requested() and all(post['id'] != post_data.get('id') for post in window['failed']):
+                    window['failed'].append(_failed_entry(post_data))
+
+            if not page_complete:
+                # Pagina niet afgemaakt: cursor niet verplaatsen, de rest volgt bij hervatten
+                self._checkpoint(window)
+                return False
+
+            # Pas tellen nu de cursor verder gaat: een hervatte pagina wordt opnieuw opgehaald
+            window['after'] = block_after
+            window['found'] += len(children)
+            if not children or not block_after:
+                window['status'] = 'partial' if window['failed'] else 'done'
+                self._checkpoint(window)
+                planner.report(window, oldest_ts)
+                if window['failed']:
+                    console.print(f"[yellow]{len(window['failed'])} bericht(en) in venster {window['start_ts']}..{window['end_ts']} mislukt; worden bij een volgende run opnieuw geprobeerd.[/yellow]")
+                return not window['failed']
+            self._checkpoint(window)
+
+        return False
+
+    def run(self):
+        planner = BackfillPlanner(self.sub_name, self.clause, self.start_ts, self.end_ts)
+        with ThreadPoolExecutor(max_workers=BACKFILL_WORKERS, thread_name_prefix='backfill') as pool:
+            running = set()
+            while True:
+                while len(running) < BACKFILL_WORKERS and not self._finished():
+                    window = planner.next_window()
+                    if window is None:
+                        break
+                    # run_in_job: het stopsignaal van de taak geldt ook in de vensterthreads
+                    running.add(pool.submit(job_manager.run_in_job(self.run_window), planner, window))
+                if not running:
+                    break
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        console.print(f"[red]Fout in historisch venster: {e}[/red]")
+                        self._status(f"Fout: {e}")
+        return self.total_processed
+
+def run_backfill(base_url, posts_needed, start_ts, end_ts, keywords, status_callback=None, reddit_cookie=None):
+    """Ingang voor scraper.scrape_remaining_history. Retourneert het aantal verwerkte berichten."""
+    return Backfill(base_url, posts_needed, start_ts, end_ts, keywords, status_callback, reddit_cookie).run()
@@ -0,0 +1,277 @@
+import os
+import json
+
+# Uitgevouwen reacties en voortgang per bericht (verwijderd na een geslaagde export)
+CHECKPOINT_DIR = os.path.join(os.getcwd(), 'data', 'comment_checkpoints')
+MORECHILDREN_URL = "https://www.reddit.com/api/morechildren.json"
+# Reddit accepteert maximaal 100 ID's per morechildren-verzoek
+MORECHILDREN_BATCH = 100
+
+def comment_record(data, depth):
+    return {
+        'author': data.get('author', 'Onbekend'),
+        'body': data.get('body', ''),
+        'created_utc': data.get('created_utc', 0),
+        'id': data.get('id', ''),
+        'parent_id': data.get('parent_id', ''),
+        'depth': depth
+    }
+
+class CommentExpander:
+    """
+    Vouwt de volledige reactieboom van één bericht uit, inclusief 'more'-stubs.
+    Reacties worden direct naar een spoolbestand (JSONL) geschreven in plaats van
+    in het geheugen opgebouwd; na elk verzoek wordt een checkpoint opgeslagen,
+    zodat een onderbroken bericht later verder kan waar het gebleven was.
+
+    Na run() is de expander zelf de reactielijst voor de exports: itereren levert
+    platte records (met parent_id en depth) uit de spool, write_json() schrijft de
+    geneste vorm ('replies') zonder de boom in het geheugen op te bouwen.
+
+    fetch is een functie url -> JSON (bijv. scraper.get_reddit_data).
+    """
+    def __init__(self, post_id, fetch, should_stop=None, max_comments=0):
+        self.post_id = post_id
+        self.fetch = fetch
+        self.should_stop = should_stop or (lambda: False)
+        self.max_comments = max_comments
+        self.spool_path = os.path.join(CHECKPOINT_DIR, f"{post_id}.jsonl")
+        self.checkpoint_path = os.path.join(CHECKPOINT_DIR, f"{post_id}.json")
+
+        # Alleen ID's en diepte worden bijgehouden, niet de inhoud van reacties
+        self.depths = {}
+        self.pending = []
+        self.count = 0
+        self.missing = 0
+        self.spool_size = 0
+
+    # --- Checkpoint ---
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path) or not os.path.exists(self.spool_path):
+            return False
+        try:
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except Exception:
+            return False
+        self.depths = state['depths']
+        self.pending = state['pending']
+        self.count = state['count']
+        self.missing = state.get('missing', 0)
+        self.spool_size = state['spool_size']
+        return True
+
+    def _save_checkpoint(self, spool):
+        spool.flush()
+        state = {
+            'post_id': self.post_id,
+            'depths': self.depths,
+            'pending': self.pending,
+            'count': self.count,
+            'missing': self.missing,
+            'spool_size': spool.tell()
+        }
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def discard(self):
+        """Verwijder spool en checkpoint (na een geslaagde export)."""
+        for path in (self.spool_path, self.checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    # --- Uitvouwen ---
+
+    def _limit_reached(self):
+        return self.max_comments > 0 and self.count >= self.max_comments
+
+    def _emit(self, record, spool):
+        spool.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+        self.depths[record['id']] = record['depth']
+        self.count += 1
+
+    def _walk(self, children, depth, spool):
+        """Loop iteratief door een (deel)boom; 'more'-stubs gaan naar de wachtrij."""
+        stack = [(child, depth) for child in reversed(children)]
+        while stack and not self._limit_reached():
+            child, d = stack.pop()
+            data = child.get('data', {})
+            if child.get('kind') == 't1':
+                self._emit(comment_record(data, d), spool)
+                replies = data.get('replies')
+                if isinstance(replies, dict):
+                    replies_children = replies.get('data', {}).get('children', [])
+                    stack.extend((c, d + 1) for c in reversed(replies_children))
+            elif child.get('kind') == 'more':
+                ids = data.get('children') or []
+                if ids:
+                    self.pending.append({'ids': ids, 'depth': d})
+                elif data.get('parent_id', '').startswith('t1_'):
+                    # "Verder in deze discussie": vervolgen via de permalink van de ouder
+                    self.pending.append({'continue': data['parent_id'][3:], 'depth': d})
+
+    def _depth_for(self, thing, default):
+        parent_id = thing.get('data', {}).get('parent_id', '')
+        if parent_id.startswith('t1_') and parent_id[3:] in self.depths:
+            return self.depths[parent_id[3:]] + 1
+        return default
+
+    def _resolve_item(self, item, spool):
+        """Haal één wachtrij-item op. Retourneert False als het verzoek mislukte."""
+        if 'continue' in item:
+            url = f"https://www.reddit.com/comments/{self.post_id}/_/{item['continue']}.json?limit=500&raw_json=1"
+            data = self.fetch(url)
+            if not isinstance(data, list) or len(data) < 2:
+                return False
+            for parent in data[1].get('data', {}).get('children', []):
+                replies = parent.get('data', {}).get('replies')
+                if parent.get('kind') == 't1' and isinstance(replies, dict):
+                    self._walk(replies.get('data', {}).get('children', []), item['depth'], spool)
+            return True
+
+        batch = item['ids'][:MORECHILDREN_BATCH]
+        rest = item['ids'][MORECHILDREN_BATCH:]
+        url = (f"{MORECHILDREN_URL}?api_type=json&link_id=t3_{self.post_id}"
+               f"&children={','.join(batch)}&limit_children=false&raw_json=1")
+        data = self.fetch(url)
+        if not isinstance(data, dict) or 'json' not in data:
+            return False
+        if rest:
+            self.pending.insert(0, {'ids': rest, 'depth': item['depth']})
+        for thing in data['json'].get('data', {}).get('things', []):
+            self._walk([thing], self._depth_for(thing, item['depth']), spool)
+        return True
+
+    def run(self, children, expand_more=True):
+        """
+        Vouw de boom uit naar het spoolbestand.
+        Retourneert True als de boom compleet is, False bij een stopverzoek (checkpoint blijft staan).
+        """
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        resumed = self._load_checkpoint()
+        with open(self.spool_path, 'r+b' if resumed else 'wb') as spool:
+            if resumed:
+                # Alles na het laatste checkpoint opnieuw ophalen
+                spool.truncate(self.spool_size)
+                spool.seek(self.spool_size)
+            else:
+                self._walk(children, 0, spool)
+                self._save_checkpoint(spool)
+
+            while expand_more and self.pending and not self._limit_reached():
+                if self.should_stop():
+                    return False
+                item = self.pending.pop(0)
+                if not self._resolve_item(item, spool):
+                    if self.should_stop():
+                        self.pending.insert(0, item)
+                        return False
+                    # Definitief mislukt: deze tak overslaan en doorgaan
+                    self.missing += len(item.get('ids', [])) or 1
+                self._save_checkpoint(spool)
+        return True
+
+    # --- Lezen ---
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return self.iter_comments()
+
+    def iter_comments(self):
+        """Loop streamend over de uitgevouwen reacties (platte records met 'depth')."""
+        if not os.path.exists(self.spool_path):
+            return
+        with open(self.spool_path, 'rb') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def _tree_offsets(self):
+        """
+        Structuur van de boom als posities in de spool: (wortels, {reactie-ID: posities van antwoorden}).
+        Alleen ID's en posities, niet de inhoud; een reactie waarvan de ouder ontbreekt is een wortel.
+        """
+        roots = []
+        replies = {}
+        offset = 0
+        with open(self.spool_path, 'rb') as f:
+            for line in f:
+                record = json.loads(line)
+                replies.setdefault(record['id'], [])
+                parent_id = record['parent_id']
+                siblings = replies.get(parent_id[3:]) if parent_id.startswith('t1_') else None
+                (siblings if siblings is not None else roots).append(offset)
+                offset += len(line)
+        return roots, replies
+
+    def write_json(self, f, indent=None, level=0):
+        """
+        Schrijf de reacties als geneste JSON-lijst ('replies') naar het tekstbestand f,
+        gelijk aan json.dump(build_tree(), f, indent=indent, ensure_ascii=False) op
+        inspringniveau level. Elke reactie wordt pas bij het schrijven uit de spool gelezen.
+        """
+        if not self.count or not os.path.exists(self.spool_path):
+            f.write('[]')
+            return
+        roots, replies = self._tree_offsets()
+        sep = ', ' if indent is None else ','
+
+        def nl(depth):
+            return '' if indent is None else '\n' + ' ' * (indent * depth)
+
+        with open(self.spool_path, 'rb') as spool:
+            f.write('[')
+            # Per geopende lijst: (resterende posities, niveau van de lijst, eerste element)
+            stack = [[iter(roots), level, True]]
+            while stack:
+                frame = stack[-1]
+                offset = next(frame[0], None)
+                if offset is None:
+                    stack.pop()
+                    f.write(nl(frame[1]) + ']')
+                    if stack:
+                        # Einde van de 'replies' van een reactie: ook de reactie zelf afsluiten
+                        f.write(nl(frame[1] - 1) + '}')
+                    continue
+                depth = frame[1] + 1
+                f.write(('' if frame[2] else sep) + nl(depth))
+                frame[2] = False
+                spool.seek(offset)
+                record = json.loads(spool.readline())
+                for i, key in enumerate(('author', 'body', 'created_utc', 'id', 'parent_id')):
+                    f.write(('{' if i == 0 else sep) + nl(depth + 1) + f'"{key}": ' + json.dumps(record[key], ensure_ascii=False))
+                f.write(sep + nl(depth + 1) + '"replies": ')
+                children = replies.get(record['id'])
+                if children:
+                    f.write('[')
+                    stack.append([iter(children), depth + 1, True])
+                else:
+                    f.write('[]' + nl(depth) + '}')
+
+    def build_tree(self):
+        """
+        Zet de reacties om naar de geneste structuur ('replies') als lijst in het geheugen.
+        Alleen voor weergave (output_sink); de exports gebruiken iteratie en write_json().
+        """
+        roots = []
+        nodes = {}
+        for record in self.iter_comments():
+            node = {
+                'author': record['author'],
+                'body': record['body'],
+                'created_utc': record['created_utc'],
+                'id': record['id'],
+                'parent_id': record['parent_id'],
+                'replies': []
+            }
+            nodes[node['id']] = node
+            parent = nodes.get(node['parent_id'][3:]) if node['parent_id'].startswith('t1_') else None
+            if parent is not None:
+                parent['replies'].append(node)
+            else:
+                roots.append(node)
+        return roots
@@ -0,0 +1,113 @@
+import os
+import csv
+import time
+import threading
+import atexit
+from functools import lru_cache
+
+CSV_FILE = 'all_data.csv'
+FIELDNAMES = [
+    'type', 'subreddit', 'post_id', 'post_title', 'id', 'parent_id',
+    'author', 'content', 'created_utc', 'date', 'media_url', 'permalink'
+]
+
+# Rijen worden gebundeld weggeschreven: na FLUSH_ROWS rijen of FLUSH_INTERVAL seconden
+FLUSH_ROWS = 500
+FLUSH_INTERVAL = 10.0
+
+@lru_cache(maxsize=4096)
+def format_timestamp(created_utc):
+    """Zet een Unix-tijdstempel om naar 'JJJJ-MM-DD UU:MM:SS' (lokale tijd)."""
+    if not created_utc:
+        return ''
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(created_utc))
+
+class CsvExporter:
+    """
+    CSV-export voor één subreddit. Het bestand blijft open tijdens de run
+    en rijen worden in batches weggeschreven; flush() sluit het bestand weer,
+    zodat het tussen runs kan worden verplaatst of verwijderd (Windows).
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, CSV_FILE)
+        self.lock = threading.Lock()
+        self._file = None
+        self._writer = None
+        self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def _open(self):
+        os.makedirs(self.folder, exist_ok=True)
+        write_header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=FIELDNAMES)
+        if write_header:
+            self._writer.writeheader()
+
+    def add_rows(self, rows):
+        with self.lock:
+            self._buffer.extend(rows)
+            if len(self._buffer) >= FLUSH_ROWS or time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+                self._flush()
+
+    def _flush(self):
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        if self._file is None:
+            self._open()
+        self._writer.writerows(self._buffer)
+        self._file.flush()
+        self._buffer = []
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+    def flush(self):
+        """Schrijf gebufferde rijen weg en sluit het bestand (wordt zo nodig opnieuw geopend)."""
+        with self.lock:
+            self._flush()
+            self._close_file()
+
+    def close(self):
+        self.flush()
+
+_exporters = {}
+_exporters_lock = threading.Lock()
+
+def get_exporter(folder):
+    """Retourneer de (gedeelde) exporter voor een subreddit-map."""
+    folder = os.path.abspath(folder)
+    with _exporters_lock:
+        exporter = _exporters.get(folder)
+        if exporter is None:
+            exporter = CsvExporter(folder)
+            _exporters[folder] = exporter
+        return exporter
+
+def flush_all():
+    """Schrijf alle exporters weg en sluit hun bestanden (aan het einde van een run)."""
+    with _exporters_lock:
+        exporters = list(_exporters.values())
+    for exporter in exporters:
+        try:
+            exporter.flush()
+        except Exception as e:
+            print(f"Fout bij schrijven naar CSV: {e}")
+
+def close_all():
+    with _exporters_lock:
+        exporters = list(_exporters.values())
+        _exporters.clear()
+    for exporter in exporters:
+        try:
+            exporter.close()
+        except Exception as e:
+            print(f"Fout bij schrijven naar CSV: {e}")
+
+# Voorkom dat gebufferde rijen verloren gaan bij afsluiten
+atexit.register(close_all)
@@ -1,14 +1,37 @@
 import os
 import json
-import re
 import shutil
 import sys
 import csv
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import master_store
+import database
+import post_index
+import job_manager
+
+# Gedeelde modules (../shared)
+_shared_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _shared_parent not in sys.path:
+    sys.path.append(_shared_parent)
+from shared.matcher import Matcher
 
 # Configuratie
 EXPORTS_DIR = os.path.join(os.getcwd(), 'exports')
 KEYWORDS_FILE = os.path.join(os.getcwd(), 'keywords.csv')
 
+# 'ICE' als los woord, niet hoofdlettergevoelig
+ICE_MATCHER = Matcher(['ice'], whole_words=True)
+# Verhogen wanneer post_matches verandert, zodat opgeslagen statistieken vervallen
+CLEANUP_FILTER_VERSION = 1
+# Aantal processen voor het volledig scannen van archieven zonder geldige statistieken
+STATS_WORKERS = max(1, min(4, os.cpu_count() or 1))
+# Aantal processen voor batch-opschoning (één subreddit per proces)
+CLEANUP_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+# De map -> post-ID index en de opschoonstatistieken staan in de database
+database.init_db()
+
 def load_keywords_list():
     """
     Laadt de trefwoorden uit het CSV-bestand.
@@ -51,9 +74,7 @@ def contains_ice(text):
     """
     if not text:
         return False
-    # Regex voor woordgrens + ice + woordgrens, niet hoofdlettergevoelig
-    pattern = r'\bice\b'
-    return bool(re.search(pattern, str(text), re.IGNORECASE))
+    return ICE_MATCHER.search(str(text))
 
 def list_subreddits():
     """Geeft een lijst van beschikbare subreddits in de exportmap."""
@@ -62,24 +83,27 @@ def list_subreddits():
         return []
     
     subreddits = [d for d in os.listdir(EXPORTS_DIR) 
-                  if os.path.isdir(os.path.join(EXPORTS_DIR, d))]
+                  if os.path.isdir(os.path.join(EXPORTS_DIR, d)) and not d.startswith('.')]
     return subreddits
 
 def load_data(subreddit):
-    """Laadt de all_data.json voor een specifieke subreddit."""
-    json_path = os.path.join(EXPORTS_DIR, subreddit, 'all_data.json')
-    if not os.path.exists(json_path):
-        print(f"Geen all_data.json gevonden in {json_path}")
+    """Laadt het archief (all_data.jsonl of oud all_data.json) voor een specifieke subreddit."""
+    folder = os.path.join(EXPORTS_DIR, subreddit)
+    if not master_store.has_archive(folder):
+        print(f"Geen all_data.jsonl of all_data.json gevonden in {folder}")
         return None
     
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data
+        return master_store.load_entries(folder)
     except Exception as e:
         print(f"Fout bij lezen JSON: {e}")
         return None
 
+def post_matches(item):
+    """Controleer of 'ICE' voorkomt in 'title' of 'text' (binnen 'post' object)."""
+    post = item.get('post', {})
+    return contains_ice(post.get('title', '')) or contains_ice(post.get('text', ''))
+
 def filter_posts(data):
     """
     Filtert de gegevenslijst.
@@ -91,11 +115,9 @@ def filter_posts(data):
     
     for item in data:
         post = item.get('post', {})
-        title = post.get('title', '')
-        text = post.get('text', '')
         
         # Controleer titel en tekst
-        if contains_ice(title) or contains_ice(text):
+        if post_matches(item):
             filtered_data.append(item)
             if 'id' in post:
                 accepted_ids.add(post['id'])
@@ -107,7 +129,7 @@ def get_post_id_from_folder(folder_path):
     Probeert de post-ID te vinden door JSON-bestanden in de map te scannen.
     """
     for filename in os.listdir(folder_path):
-        if filename.endswith('.json') and filename != 'all_data.json':
+        if filename.endswith('.json') and not filename.startswith('all_data'):
             try:
                 with open(os.path.join(folder_path, filename), 'r', encoding='utf-8') as f:
                     content = json.load(f)
@@ -122,28 +144,164 @@ def get_post_id_from_folder(folder_path):
                 continue
     return None
 
-def calculate_cleanup_stats(subreddit):
+def folder_post_ids(subreddit, build_index=True):
     """
-    Berekent de statistieken voor een opschoonactie zonder deze daadwerkelijk uit te voeren.
-    Retourneert: (totaal, geaccepteerd, verwijderd, gefilterde_data, geaccepteerde_ids) of None bij fout.
+    Alle (map, post-ID) paren van een subreddit. Komt uit de index in de database,
+    zodat niet elke map geopend en geparst hoeft te worden; de index wordt zo nodig
+    eenmalig opgebouwd (met build_index=False worden de mappen dan zelf gelezen,
+    zonder naar de database te schrijven).
     """
-    data = load_data(subreddit)
-    if not data:
-        return None
+    source_path = os.path.join(EXPORTS_DIR, subreddit)
+    indexed = os.path.abspath(source_path) == os.path.abspath(os.path.join(post_index.EXPORTS_DIR, subreddit))
+    if indexed and not database.is_post_index_built(subreddit) and build_index:
+        post_index.rebuild(subreddit)
+    if indexed and database.is_post_index_built(subreddit):
+        return database.get_post_index_folders(subreddit)
+    # Andere exportmap dan die van de scraper, of (nog) zonder index
+    return [
+        (item, get_post_id_from_folder(os.path.join(source_path, item)))
+        for item in os.listdir(source_path) if os.path.isdir(os.path.join(source_path, item))
+    ]
 
-    total_items = len(data)
-    filtered_data, accepted_ids = filter_posts(data)
-    accepted_count = len(filtered_data)
-    deleted_count = total_items - accepted_count
-    
+def _link_or_copy(src, dst):
+    """Hardlink in plaats van kopie: een opgeschoonde map kost geen extra schijfruimte."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        # Bijv. een bestandssysteem zonder hardlinks
+        shutil.copy2(src, dst)
+    return dst
+
+def scan_archive(folder, start=0):
+    """
+    Scan een archief vanaf byte-positie start.
+    Retourneert ({post_id: voldoet aan filter}, byte-positie tot waar is gescand);
+    bij meerdere versies van een bericht telt de laatste.
+    Leest het bestand zelf (zonder master_store-index), zodat dit ook in een apart
+    proces kan draaien naast een scraper die het archief aanvult.
+    """
+    posts = {}
+    name = master_store.archive_filename(folder)
+    path = os.path.join(folder, name)
+    if name == master_store.LEGACY_FILE:
+        # Oud formaat: altijd volledig
+        with open(path, 'r', encoding='utf-8') as f:
+            for item in json.load(f):
+                post_id = item.get('post', {}).get('id')
+                if post_id:
+                    posts[post_id] = post_matches(item)
+        return posts, os.path.getsize(path)
+
+    end = start
+    with open(path, 'rb') as f:
+        f.seek(start)
+        for raw in f:
+            if not raw.endswith(b'\n'):
+                # Regel wordt nog geschreven: volgende keer meenemen
+                break
+            end += len(raw)
+            try:
+                item = json.loads(raw)
+            except ValueError:
+                continue
+            post_id = item.get('post', {}).get('id')
+            if post_id:
+                posts[post_id] = post_matches(item)
+    return posts, end
+
+def _archive_state(folder):
+    """Kenmerken van het archiefbestand waarop opgeslagen statistieken zijn gebaseerd."""
+    name = master_store.archive_filename(folder)
+    if not name:
+        return None
+    st = os.stat(os.path.join(folder, name))
     return {
-        'total': total_items,
-        'accepted': accepted_count,
-        'deleted': deleted_count,
-        'data': filtered_data,
-        'accepted_ids': accepted_ids
+        'archive_name': name,
+        'archive_inode': st.st_ino,
+        'archive_size': st.st_size,
+        'archive_mtime': st.st_mtime,
+        'filter_version': CLEANUP_FILTER_VERSION
     }
 
+def _scan_start(cached, state):
+    """
+    Vanaf welke byte-positie het archief gescand moet worden:
+    None als de opgeslagen statistieken nog kloppen, 0 voor een volledige scan.
+    """
+    if not cached or any(cached[k] != state[k] for k in ('archive_name', 'archive_inode', 'filter_version')):
+        return 0
+    if cached['archive_size'] == state['archive_size'] and cached['archive_mtime'] == state['archive_mtime']:
+        return None
+    if state['archive_name'] == master_store.ARCHIVE_FILE and cached['scanned_offset'] <= state['archive_size']:
+        # Append-only archief dat is aangegroeid: alleen de nieuwe regels
+        return cached['scanned_offset']
+    return 0
+
+def _stats(total, accepted):
+    return {'total': total, 'accepted': accepted, 'deleted': total - accepted}
+
+def _save_scan(subreddit, state, posts, end, full):
+    counts = database.save_cleanup_stats(subreddit, dict(state, scanned_offset=end), posts, full)
+    if counts:
+        return _stats(*counts)
+    if full:
+        return _stats(len(posts), sum(posts.values()))
+    return None
+
+def collect_cleanup_stats(subreddits):
+    """
+    Statistieken per subreddit ({subreddit: {'total', 'accepted', 'deleted'}}).
+    Opgeslagen statistieken worden hergebruikt of met de nieuwe regels bijgewerkt;
+    archieven die volledig gescand moeten worden, worden over processen verdeeld.
+    Subreddits zonder (leesbaar) archief ontbreken in het resultaat.
+    """
+    results = {}
+    full_scans = []
+    for sub in subreddits:
+        folder = os.path.join(EXPORTS_DIR, sub)
+        try:
+            state = _archive_state(folder)
+            if not state:
+                continue
+            cached = database.get_cleanup_stats(sub)
+            start = _scan_start(cached, state)
+            if start is None:
+                results[sub] = _stats(cached['total'], cached['accepted'])
+            elif start:
+                posts, end = scan_archive(folder, start)
+                results[sub] = _save_scan(sub, state, posts, end, full=False)
+            else:
+                full_scans.append((sub, folder, state))
+        except Exception as e:
+            print(f"Fout bij analyseren van {sub}: {e}")
+
+    if len(full_scans) == 1:
+        sub, folder, state = full_scans[0]
+        try:
+            posts, end = scan_archive(folder)
+            results[sub] = _save_scan(sub, state, posts, end, full=True)
+        except Exception as e:
+            print(f"Fout bij analyseren van {sub}: {e}")
+    elif full_scans:
+        workers = min(STATS_WORKERS, len(full_scans))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {pool.submit(scan_archive, folder): (sub, state) for sub, folder, state in full_scans}
+            for future in as_completed(futures):
+                sub, state = futures[future]
+                try:
+                    posts, end = future.result()
+                    results[sub] = _save_scan(sub, state, posts, end, full=True)
+                except Exception as e:
+                    print(f"Fout bij analyseren van {sub}: {e}")
+    return {sub: stats for sub, stats in results.items() if stats}
+
+def calculate_cleanup_stats(subreddit):
+    """
+    Berekent de statistieken voor een opschoonactie zonder deze daadwerkelijk uit te voeren.
+    Retourneert: {'total', 'accepted', 'deleted'} of None bij fout.
+    """
+    return collect_cleanup_stats([subreddit]).get(subreddit)
+
 def calculate_batch_cleanup_stats(subreddits):
     """
     Berekent geaggregeerde statistieken voor een lijst van subreddits.
@@ -153,8 +311,9 @@ def calculate_batch_cleanup_stats(subreddits):
     deleted = 0
     details = []
 
+    all_stats = collect_cleanup_stats(subreddits)
     for sub in subreddits:
-        stats = calculate_cleanup_stats(sub)
+        stats = all_stats.get(sub)
         if stats:
             total += stats['total']
             accepted += stats['accepted']
@@ -172,78 +331,127 @@ def calculate_batch_cleanup_stats(subreddits):
         'details': details
     }
 
-def perform_cleanup(subreddit, force=False):
+def perform_cleanup(subreddit, force=False, build_index=True):
     """
     Voert de opschoonactie uit voor een subreddit.
     Retourneert een dictionary met resultaten.
     force parameter wordt genegeerd omdat nu unieke mappen worden gegenereerd.
+
+    Het archief wordt in één doorgang gelezen en gefilterd weggeschreven (er staat
+    nooit het hele archief in het geheugen); berichtmappen worden als hardlinks
+    overgenomen. build_index: zie folder_post_ids.
     """
-    stats = calculate_cleanup_stats(subreddit)
-    if not stats:
+    source_path = os.path.join(EXPORTS_DIR, subreddit)
+    if not master_store.has_archive(source_path):
         return {'success': False, 'error': 'Kon gegevens niet laden'}
 
-    if stats['accepted'] == 0:
-        return {'success': False, 'error': 'Geen items gevonden die aan de criteria voldoen'}
-
     # Gebruik unieke naamgeving in plaats van overschrijven
     output_folder_base = f"{subreddit}_cleaned"
     output_path, output_folder_name = get_unique_output_path(output_folder_base)
+    # Eerst in een verborgen werkmap; pas na afloop hernoemd, of verwijderd als niets voldoet
+    work_path = os.path.join(EXPORTS_DIR, f".{output_folder_name}.tmp")
+
+    counts = {'total': 0, 'accepted': 0}
+    accepted_ids = set()
+
+    def accepted_entries():
+        # Alleen lezen: geen index bijwerken of archief afkappen naast een lopende scraper
+        for item in master_store.read_entries(source_path):
+            counts['total'] += 1
+            if post_matches(item):
+                counts['accepted'] += 1
+                post_id = item.get('post', {}).get('id')
+                if post_id:
+                    accepted_ids.add(post_id)
+                yield item
     
     try:
-        os.makedirs(output_path)
+        if os.path.exists(work_path):
+            shutil.rmtree(work_path)
+        os.makedirs(work_path)
         
-        # Schrijf all_data.json
-        with open(os.path.join(output_path, 'all_data.json'), 'w', encoding='utf-8') as f:
-            json.dump(stats['data'], f, indent=2)
+        # Schrijf het archief (all_data.jsonl)
+        master_store.write_archive(work_path, accepted_entries())
+        if counts['accepted'] == 0:
+            shutil.rmtree(work_path)
+            return {'success': False, 'error': 'Geen items gevonden die aan de criteria voldoen'}
         
-        # Kopieer mappen
-        source_path = os.path.join(EXPORTS_DIR, subreddit)
+        # Koppel de mappen van geaccepteerde berichten
         copied_folders = 0
-        
-        for item in os.listdir(source_path):
-            item_path = os.path.join(source_path, item)
-            if not os.path.isdir(item_path):
+        for folder, post_id in folder_post_ids(subreddit, build_index):
+            if post_id not in accepted_ids:
                 continue
-                
-            post_id = get_post_id_from_folder(item_path)
-            if post_id and post_id in stats['accepted_ids']:
-                dest_path = os.path.join(output_path, item)
-                shutil.copytree(item_path, dest_path)
+            item_path = os.path.join(source_path, folder)
+            if os.path.isdir(item_path):
+                shutil.copytree(item_path, os.path.join(work_path, folder), copy_function=_link_or_copy)
                 copied_folders += 1
 
+        os.rename(work_path, output_path)
         return {
             'success': True,
             'original_subreddit': subreddit,
             'new_subreddit': output_folder_name,
-            'total': stats['total'],
-            'accepted': stats['accepted'],
-            'deleted': stats['deleted'],
+            'total': counts['total'],
+            'accepted': counts['accepted'],
+            'deleted': counts['total'] - counts['accepted'],
             'copied_folders': copied_folders
         }
     except Exception as e:
+        if os.path.exists(work_path):
+            shutil.rmtree(work_path, ignore_errors=True)
         return {'success': False, 'error': str(e)}
 
-def perform_batch_cleanup(subreddits):
+def _cleanup_worker(subreddit):
+    """Opschonen van één subreddit in een apart proces; database en archief worden daar alleen gelezen."""
+    return perform_cleanup(subreddit, build_index=False)
+
+def perform_batch_cleanup(subreddits, status_callback=None):
     """
-    Voert opschoning uit voor een lijst van subreddits.
+    Voert opschoning uit voor een lijst van subreddits, verdeeld over CLEANUP_WORKERS processen.
+    De voortgang wordt per subreddit gemeld via status_callback; binnen een taak
+    (job_manager) worden subreddits die nog niet zijn begonnen overgeslagen zodra de taak stopt.
     """
+    report = status_callback or print
     results = []
+    errors = {}
     total_accepted = 0
     total_processed = 0
-    
-    for sub in subreddits:
-        res = perform_cleanup(sub)
-        if res['success']:
-            results.append(res['new_subreddit'])
-            total_accepted += res['accepted']
-            total_processed += res['total']
+
+    if subreddits:
+        workers = min(CLEANUP_WORKERS, len(subreddits))
+        report(f"Opschonen van {len(subreddits)} subreddits ({workers} processen)...")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {pool.submit(_cleanup_worker, sub): sub for sub in subreddits}
+            for future in as_completed(futures):
+                sub = futures[future]
+                if future.cancelled():
+                    continue
+                try:
+                    res = future.result()
+                except Exception as e:
+                    res = {'success': False, 'error': str(e)}
+
+                if res['success']:
+                    results.append(res['new_subreddit'])
+                    total_accepted += res['accepted']
+                    total_processed += res['total']
+                    report(f"[{sub}] {res['accepted']} van {res['total']} berichten -> {res['new_subreddit']}")
+                else:
+                    errors[sub] = res.get('error')
+                    report(f"[{sub}] Overgeslagen: {res.get('error')}")
+                job_manager.count('subreddits')
+
+                if job_manager.cancelled():
+                    for pending in futures:
+                        pending.cancel()
     
     return {
         'success': True,
         'processed_count': len(subreddits),
         'created_folders': results,
         'total_accepted': total_accepted,
-        'total_processed': total_processed
+        'total_processed': total_processed,
+        'errors': errors
     }
 
 def run_interactive_cleanup():
@@ -256,24 +464,35 @@ def run_interactive_cleanup():
         return
 
     print("\nBeschikbare mappen:")
+    print("0. Alle mappen (parallel)")
     for idx, sub in enumerate(subreddits):
         print(f"{idx + 1}. {sub}")
     
     try:
         choice = int(input("\nSelecteer een nummer: "))
-        if choice < 1 or choice > len(subreddits):
+        if choice < 0 or choice > len(subreddits):
             print("Ongeldige keuze.")
             return
-        selected_subreddit = subreddits[choice - 1]
     except ValueError:
         print("Voer een geldig nummer in.")
         return
 
+    if choice == 0:
+        result = perform_batch_cleanup([s for s in subreddits if "_cleaned" not in s])
+        print("\n--- Rapportage ---")
+        print(f"Nieuwe mappen: {len(result['created_folders'])}")
+        print(f"Totaal verwerkt: {result['total_processed']}")
+        print(f"Geaccepteerd: {result['total_accepted']}")
+        print("------------------")
+        return
+    selected_subreddit = subreddits[choice - 1]
+
     print(f"\nVerwerken van: {selected_subreddit}...")
     
     # Gebruik de nieuwe functies
     stats = calculate_cleanup_stats(selected_subreddit)
     if not stats:
+        print(f"Kon gegevens van {selected_subreddit} niet analyseren.")
         return
 
     print(f"Totaal aantal items gevonden: {stats['total']}")
@@ -306,7 +525,7 @@ def run_interactive_cleanup():
         print(f"Totaal verwerkt: {result['total']}")
         print(f"Geaccepteerd: {result['accepted']}")
         print(f"Verwijderd: {result['deleted']}")
-        print(f"Gekopieerde mappen: {result['copied_folders']}")
+        print(f"Gekoppelde mappen (hardlinks): {result['copied_folders']}")
         print("------------------")
         print("Voltooid.")
     else:
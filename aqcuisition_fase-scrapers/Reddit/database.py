@@ -1,66 +1,691 @@
 import sqlite3
 import os
+import json
 import time
+import threading
+import atexit
 
 DB_FILE = os.path.join(os.getcwd(), 'data', 'scraper_history.db')
 
-def init_db():
-    """Initialiseer de database indien deze nog niet bestaat."""
-    try:
-        # Verifieer of de gegevensmap bestaat
+# Schrijfacties worden gebundeld: commit na BATCH_SIZE regels of FLUSH_INTERVAL seconden
+BATCH_SIZE = 50
+FLUSH_INTERVAL = 5.0
+# Maximaal aantal parameters per query (SQLite-limiet is 999)
+MAX_QUERY_PARAMS = 900
+
+# Eén langlevende verbinding, gedeeld door alle threads en geserialiseerd via een lock
+_conn = None
+_lock = threading.RLock()
+_pending = []
+_pending_ids = set()
+_last_flush = time.monotonic()
+
+def _get_conn():
+    """Open (eenmalig) de gedeelde verbinding in WAL-modus."""
+    global _conn
+    if _conn is None:
         db_dir = os.path.dirname(DB_FILE)
         if not os.path.exists(db_dir):
             os.makedirs(db_dir)
-            
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        # Er wordt een index op ID aangemaakt voor geoptimaliseerde zoekopdrachten
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS processed_posts (
-                id TEXT PRIMARY KEY,
-                subreddit TEXT,
-                title TEXT,
-                scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_subreddit ON processed_posts(subreddit)')
-        conn.commit()
-        conn.close()
+        _conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+        _conn.execute('PRAGMA journal_mode=WAL')
+        _conn.execute('PRAGMA synchronous=NORMAL')
+    return _conn
+
+def init_db():
+    """Initialiseer de database indien deze nog niet bestaat."""
+    try:
+        with _lock:
+            conn = _get_conn()
+            c = conn.cursor()
+            # Er wordt een index op ID aangemaakt voor geoptimaliseerde zoekopdrachten
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS processed_posts (
+                    id TEXT PRIMARY KEY,
+                    subreddit TEXT,
+                    title TEXT,
+                    scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_subreddit ON processed_posts(subreddit)')
+            # Wachtrij en statustabel voor mediadownloads (zie media_queue.py)
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS media_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    post_id TEXT,
+                    kind TEXT,
+                    url TEXT,
+                    folder TEXT,
+                    prefix TEXT,
+                    status TEXT DEFAULT 'pending',
+                    attempts INTEGER DEFAULT 0,
+                    last_error TEXT,
+                    next_attempt_at REAL DEFAULT 0,
+                    owner TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # Oudere databases: kolom met het proces dat een taak heeft opgepakt
+            columns = {row[1] for row in c.execute('PRAGMA table_info(media_jobs)')}
+            if 'owner' not in columns:
+                c.execute('ALTER TABLE media_jobs ADD COLUMN owner TEXT')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_media_jobs_status ON media_jobs(status, next_attempt_at)')
+            # Gedeelde mediaopslag: URL-hash -> inhoud-hash (zie media_store.py)
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS media_blobs (
+                    url_hash TEXT PRIMARY KEY,
+                    url TEXT,
+                    content_hash TEXT,
+                    ext TEXT,
+                    size INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_media_blobs_content ON media_blobs(content_hash)')
+            # Runjournaal: instellingen per run en voortgang per subreddit (zie scraper.resume_run)
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id TEXT PRIMARY KEY,
+                    params TEXT,
+                    status TEXT DEFAULT 'running',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS run_progress (
+                    run_id TEXT,
+                    subreddit TEXT,
+                    phase TEXT DEFAULT 'listing',
+                    after TEXT,
+                    processed INTEGER DEFAULT 0,
+                    history_end_ts REAL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (run_id, subreddit)
+                )
+            ''')
+            # Tijdvensters van de historische zoekopdracht (zie backfill.py)
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS backfill_windows (
+                    subreddit TEXT,
+                    query TEXT,
+                    start_ts INTEGER,
+                    end_ts INTEGER,
+                    status TEXT DEFAULT 'pending',
+                    after TEXT,
+                    found INTEGER DEFAULT 0,
+                    processed INTEGER DEFAULT 0,
+                    failed TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (subreddit, query, start_ts, end_ts)
+                )
+            ''')
+            # Oudere databases: kolom met de ID's van berichten die opnieuw geprobeerd moeten worden
+            columns = {row[1] for row in c.execute('PRAGMA table_info(backfill_windows)')}
+            if 'failed' not in columns:
+                c.execute('ALTER TABLE backfill_windows ADD COLUMN failed TEXT')
+            # Overzicht van geëxporteerde berichten per subreddit-map (zie post_index.py)
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS post_index (
+                    subreddit TEXT,
+                    folder TEXT,
+                    post_id TEXT,
+                    title TEXT,
+                    author TEXT,
+                    created_utc REAL,
+                    media_type TEXT,
+                    comment_count INTEGER DEFAULT 0,
+                    exported_at REAL,
+                    PRIMARY KEY (subreddit, folder)
+                )
+            ''')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_post_index_post ON post_index(subreddit, post_id)')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_post_index_created ON post_index(subreddit, created_utc)')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_post_index_exported ON post_index(subreddit, exported_at)')
+            # Subreddits waarvan de index volledig vanaf schijf is opgebouwd
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS post_index_state (
+                    subreddit TEXT PRIMARY KEY,
+                    rebuilt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # Opschoonstatistieken per subreddit (zie data_cleaner.py); geldig zolang het
+            # archiefbestand niet is vervangen, bij aangroei worden alleen nieuwe regels gescand
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS cleanup_stats (
+                    subreddit TEXT PRIMARY KEY,
+                    archive_name TEXT,
+                    archive_inode INTEGER,
+                    archive_size INTEGER,
+                    archive_mtime REAL,
+                    scanned_offset INTEGER,
+                    filter_version INTEGER,
+                    total INTEGER DEFAULT 0,
+                    accepted INTEGER DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # Per bericht of het aan het opschoonfilter voldoet (nodig om nieuwe versies te verrekenen)
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS cleanup_posts (
+                    subreddit TEXT,
+                    post_id TEXT,
+                    accepted INTEGER,
+                    PRIMARY KEY (subreddit, post_id)
+                ) WITHOUT ROWID
+            ''')
+            # Nieuwste bericht per subreddit uit de laatste volledige incrementele run
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS subreddit_marks (
+                    subreddit TEXT PRIMARY KEY,
+                    newest_utc REAL,
+                    newest_fullname TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.commit()
     except Exception as e:
         print(f"Fout bij database-initialisatie: {e}")
 
+def flush():
+    """Schrijf alle gebufferde berichten weg in één transactie."""
+    global _last_flush
+    with _lock:
+        _last_flush = time.monotonic()
+        if not _pending:
+            return
+        rows = list(_pending)
+        try:
+            conn = _get_conn()
+            conn.executemany('INSERT OR IGNORE INTO processed_posts (id, subreddit, title) VALUES (?, ?, ?)', rows)
+            conn.commit()
+            _pending.clear()
+            _pending_ids.clear()
+        except Exception as e:
+            print(f"Kon berichten niet opslaan in database: {e}")
+
 def is_post_processed(post_id):
     """Controleer of een bericht-ID reeds in de database aanwezig is."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute('SELECT 1 FROM processed_posts WHERE id = ?', (post_id,))
-        result = c.fetchone()
-        conn.close()
-        return result is not None
+        with _lock:
+            if post_id in _pending_ids:
+                return True
+            c = _get_conn().execute('SELECT 1 FROM processed_posts WHERE id = ?', (post_id,))
+            return c.fetchone() is not None
     except:
         return False
 
-def mark_post_processed(post_id, subreddit, title):
-    """Markeer een bericht als verwerkt."""
+def filter_unprocessed(post_ids):
+    """
+    Retourneer de ID's uit post_ids die nog niet verwerkt zijn (volgorde blijft behouden).
+    Eén query per blok van maximaal MAX_QUERY_PARAMS ID's.
+    """
+    post_ids = [pid for pid in post_ids if pid]
+    if not post_ids:
+        return []
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute('INSERT OR IGNORE INTO processed_posts (id, subreddit, title) VALUES (?, ?, ?)', 
-                  (post_id, subreddit, title))
-        conn.commit()
-        conn.close()
+        known = set()
+        with _lock:
+            known.update(pid for pid in post_ids if pid in _pending_ids)
+            conn = _get_conn()
+            unique_ids = list(dict.fromkeys(post_ids))
+            for i in range(0, len(unique_ids), MAX_QUERY_PARAMS):
+                chunk = unique_ids[i:i + MAX_QUERY_PARAMS]
+                placeholders = ','.join('?' * len(chunk))
+                c = conn.execute(f'SELECT id FROM processed_posts WHERE id IN ({placeholders})', chunk)
+                known.update(row[0] for row in c.fetchall())
+        return [pid for pid in post_ids if pid not in known]
     except Exception as e:
-        print(f"Kon bericht niet opslaan in database: {e}")
+        print(f"Fout bij controleren verwerkte berichten: {e}")
+        return post_ids
+
+def mark_post_processed(post_id, subreddit, title):
+    """Markeer een bericht als verwerkt (gebufferd, zie BATCH_SIZE / FLUSH_INTERVAL)."""
+    with _lock:
+        if post_id in _pending_ids:
+            return
+        _pending.append((post_id, subreddit, title))
+        _pending_ids.add(post_id)
+        if len(_pending) >= BATCH_SIZE or time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+            flush()
 
 def get_processed_count():
     """Berekent het totaal aantal verwerkte berichten."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute('SELECT COUNT(*) FROM processed_posts')
-        count = c.fetchone()[0]
-        conn.close()
-        return count
+        with _lock:
+            flush()
+            c = _get_conn().execute('SELECT COUNT(*) FROM processed_posts')
+            return c.fetchone()[0]
     except:
         return 0
+
+def enqueue_media_job(post_id, kind, url, folder, prefix):
+    """Zet een mediadownload in de wachtrij ('file' of 'video'). Direct gecommit."""
+    try:
+        with _lock:
+            conn = _get_conn()
+            c = conn.execute('INSERT INTO media_jobs (post_id, kind, url, folder, prefix) VALUES (?, ?, ?, ?, ?)',
+                             (post_id, kind, url, folder, prefix))
+            conn.commit()
+            return c.lastrowid
+    except Exception as e:
+        print(f"Kon mediadownload niet in wachtrij plaatsen: {e}")
+        return None
+
+def claim_media_jobs(limit, kind=None, owner=None):
+    """
+    Reserveer maximaal limit wachtende taken (status 'running') en retourneer ze als dicts.
+    owner identificeert het proces dat de taken uitvoert (zie requeue_running_media_jobs).
+    """
+    try:
+        with _lock:
+            conn = _get_conn()
+            query = 'SELECT id, post_id, kind, url, folder, prefix, attempts FROM media_jobs WHERE status = ? AND next_attempt_at <= ?'
+            params = ['pending', time.time()]
+            if kind:
+                query += ' AND kind = ?'
+                params.append(kind)
+            query += ' ORDER BY id LIMIT ?'
+            params.append(limit)
+            rows = conn.execute(query, params).fetchall()
+            jobs = []
+            for row in rows:
+                conn.execute("UPDATE media_jobs SET status = 'running', attempts = attempts + 1, owner = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", (owner, row[0]))
+                jobs.append({
+                    'id': row[0], 'post_id': row[1], 'kind': row[2], 'url': row[3],
+                    'folder': row[4], 'prefix': row[5], 'attempts': row[6] + 1
+                })
+            conn.commit()
+            return jobs
+    except Exception as e:
+        print(f"Fout bij ophalen mediataken: {e}")
+        return []
+
+def finish_media_job(job_id, success, error=None, retry_delay=None):
+    """Sla de uitkomst op: 'done', opnieuw 'pending' na retry_delay seconden, of 'failed'."""
+    try:
+        with _lock:
+            conn = _get_conn()
+            if success:
+                conn.execute("UPDATE media_jobs SET status = 'done', last_error = NULL, updated_at = CURRENT_TIMESTAMP WHERE id = ?", (job_id,))
+            elif retry_delay is not None:
+                conn.execute("UPDATE media_jobs SET status = 'pending', last_error = ?, next_attempt_at = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                             (error, time.time() + retry_delay, job_id))
+            else:
+                conn.execute("UPDATE media_jobs SET status = 'failed', last_error = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", (error, job_id))
+            conn.commit()
+    except Exception as e:
+        print(f"Kon status van mediataak niet opslaan: {e}")
+
+def get_running_media_owners():
+    """Eigenaren (processen) van taken met status 'running'; None voor taken zonder eigenaar."""
+    try:
+        with _lock:
+            rows = _get_conn().execute("SELECT DISTINCT owner FROM media_jobs WHERE status = 'running'").fetchall()
+            return [row[0] for row in rows]
+    except Exception as e:
+        print(f"Fout bij ophalen mediataken: {e}")
+        return []
+
+def requeue_running_media_jobs(owners):
+    """
+    Zet lopende taken van de opgegeven eigenaren terug in de wachtrij, bedoeld voor
+    taken van een proces dat niet meer bestaat. None in owners: taken zonder eigenaar.
+    """
+    owners = list(owners)
+    if not owners:
+        return
+    try:
+        with _lock:
+            conn = _get_conn()
+            if None in owners:
+                conn.execute("UPDATE media_jobs SET status = 'pending' WHERE status = 'running' AND owner IS NULL")
+            named = [owner for owner in owners if owner is not None]
+            for i in range(0, len(named), MAX_QUERY_PARAMS):
+                chunk = named[i:i + MAX_QUERY_PARAMS]
+                conn.execute(f"UPDATE media_jobs SET status = 'pending' WHERE status = 'running' AND owner IN ({','.join('?' * len(chunk))})", chunk)
+            conn.commit()
+    except Exception as e:
+        print(f"Fout bij herstellen mediataken: {e}")
+
+def get_media_job_counts():
+    """Aantal mediataken per status."""
+    try:
+        with _lock:
+            rows = _get_conn().execute('SELECT status, COUNT(*) FROM media_jobs GROUP BY status').fetchall()
+            return {status: count for status, count in rows}
+    except:
+        return {}
+
+def get_high_water_mark(subreddit):
+    """Retourneer (newest_utc, newest_fullname) van een subreddit, of None."""
+    try:
+        with _lock:
+            c = _get_conn().execute('SELECT newest_utc, newest_fullname FROM subreddit_marks WHERE subreddit = ?', (subreddit.lower(),))
+            return c.fetchone()
+    except:
+        return None
+
+def update_high_water_mark(subreddit, newest_utc, newest_fullname):
+    """Verplaats de high-water mark naar voren (nooit terug). Direct gecommit."""
+    try:
+        with _lock:
+            conn = _get_conn()
+            conn.execute('''
+                INSERT INTO subreddit_marks (subreddit, newest_utc, newest_fullname) VALUES (?, ?, ?)
+                ON CONFLICT(subreddit) DO UPDATE SET
+                    newest_utc = excluded.newest_utc,
+                    newest_fullname = excluded.newest_fullname,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE excluded.newest_utc > subreddit_marks.newest_utc
+            ''', (subreddit.lower(), newest_utc, newest_fullname))
+            conn.commit()
+    except Exception as e:
+        print(f"Kon high-water mark niet opslaan: {e}")
+
+def create_run(run_id, params):
+    """Leg een nieuwe run vast met de instellingen (dict) waarmee deze gestart is."""
+    try:
+        with _lock:
+            conn = _get_conn()
+            conn.execute('INSERT OR REPLACE INTO runs (run_id, params, status) VALUES (?, ?, ?)',
+                         (run_id, json.dumps(params), 'running'))
+            conn.commit()
+    except Exception as e:
+        print(f"Kon run niet vastleggen: {e}")
+
+def set_run_status(run_id, status):
+    try:
+        with _lock:
+            conn = _get_conn()
+            conn.execute('UPDATE runs SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE run_id = ?', (status, run_id))
+            conn.commit()
+    except Exception as e:
+        print(f"Kon runstatus niet opslaan: {e}")
+
+def get_run(run_id):
+    """Retourneer {'run_id', 'params', 'status', ...} of None."""
+    try:
+        with _lock:
+            row = _get_conn().execute(
+                'SELECT run_id, params, status, created_at, updated_at FROM runs WHERE run_id = ?', (run_id,)
+            ).fetchone()
+        if not row:
+            return None
+        return {'run_id': row[0], 'params': json.loads(row[1]), 'status': row[2], 'created_at': row[3], 'updated_at': row[4]}
+    except Exception as e:
+        print(f"Fout bij ophalen run: {e}")
+        return None
+
+def list_runs(limit=20):
+    """Meest recente runs met het totaal aantal verwerkte berichten."""
+    try:
+        with _lock:
+            rows = _get_conn().execute('''
+                SELECT r.run_id, r.status, r.created_at, r.updated_at, COALESCE(SUM(p.processed), 0)
+                FROM runs r LEFT JOIN run_progress p ON p.run_id = r.run_id
+                GROUP BY r.run_id ORDER BY r.created_at DESC LIMIT ?
+            ''', (limit,)).fetchall()
+        return [
+            {'run_id': r[0], 'status': r[1], 'created_at': r[2], 'updated_at': r[3], 'processed': r[4]}
+            for r in rows
+        ]
+    except Exception as e:
+        print(f"Fout bij ophalen runs: {e}")
+        return []
+
+def get_run_progress(run_id, subreddit):
+    """Voortgang van één subreddit binnen een run, of None."""
+    try:
+        with _lock:
+            row = _get_conn().execute(
+                'SELECT phase, after, processed, history_end_ts FROM run_progress WHERE run_id = ? AND subreddit = ?',
+                (run_id, subreddit.lower())
+            ).fetchone()
+        if not row:
+            return None
+        return {'phase': row[0], 'after': row[1], 'processed': row[2], 'history_end_ts': row[3]}
+    except:
+        return None
+
+def get_unfinished_subreddits(run_id, subreddits):
+    """Subreddits uit de lijst zonder voortgangsregel met fase 'done' in deze run."""
+    try:
+        with _lock:
+            rows = _get_conn().execute(
+                "SELECT subreddit FROM run_progress WHERE run_id = ? AND phase = 'done'", (run_id,)
+            ).fetchall()
+        done = {row[0] for row in rows}
+        return [sub for sub in subreddits if sub.lower() not in done]
+    except Exception as e:
+        print(f"Fout bij ophalen runvoortgang: {e}")
+        return list(subreddits)
+
+def save_run_progress(run_id, subreddit, phase, after=None, processed=0, history_end_ts=None):
+    """Checkpoint van een subreddit binnen een run. Direct gecommit."""
+    try:
+        with _lock:
+            conn = _get_conn()
+            conn.execute('''
+                INSERT OR REPLACE INTO run_progress (run_id, subreddit, phase, after, processed, history_end_ts, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', (run_id, subreddit.lower(), phase, after, processed, history_end_ts))
+            conn.commit()
+    except Exception as e:
+        print(f"Kon runvoortgang niet opslaan: {e}")
+
+def get_backfill_windows(subreddit, query, start_ts, end_ts):
+    """Alle vastgelegde tijdvensters die [start_ts, end_ts] overlappen, nieuwste eerst."""
+    try:
+        with _lock:
+            c = _get_conn().execute('''
+                SELECT start_ts, end_ts, status, after, found, processed, failed FROM backfill_windows
+                WHERE subreddit = ? AND query = ? AND end_ts > ? AND start_ts < ?
+                ORDER BY end_ts DESC
+            ''', (subreddit.lower(), query, int(start_ts), int(end_ts)))
+            return [
+                {'start_ts': r[0], 'end_ts': r[1], 'status': r[2], 'after': r[3], 'found': r[4], 'processed': r[5],
+                 'failed': json.loads(r[6]) if r[6] else []}
+                for r in c.fetchall()
+            ]
+    except Exception as e:
+        print(f"Fout bij ophalen tijdvensters: {e}")
+        return []
+
+def save_backfill_window(subreddit, query, start_ts, end_ts, status, after=None, found=0, processed=0, failed=None):
+    """
+    Leg de voortgang van een tijdvenster vast (checkpoint). Direct gecommit.
+    failed: ID's van berichten die niet konden worden verwerkt en opnieuw geprobeerd worden.
+    """
+    try:
+        with _lock:
+            conn = _get_conn()
+            conn.execute('''
+                INSERT OR REPLACE INTO backfill_windows (subreddit, query, start_ts, end_ts, status, after, found, processed, failed, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', (subreddit.lower(), query, int(start_ts), int(end_ts), status, after, found, processed,
+                  json.dumps(failed) if failed else None))
+            conn.commit()
+    except Exception as e:
+        print(f"Kon tijdvenster niet opslaan: {e}")
+
+def get_media_blob(url_hash):
+    """Retourneer (content_hash, ext) van een eerder gedownloade URL, of None."""
+    try:
+        with _lock:
+            c = _get_conn().execute('SELECT content_hash, ext FROM media_blobs WHERE url_hash = ?', (url_hash,))
+            return c.fetchone()
+    except:
+        return None
+
+def record_media_blob(url_hash, url, content_hash, ext, size):
+    """Leg vast welke inhoud bij een URL hoort. Direct gecommit."""
+    try:
+        with _lock:
+            conn = _get_conn()
+            conn.execute('INSERT OR REPLACE INTO media_blobs (url_hash, url, content_hash, ext, size) VALUES (?, ?, ?, ?, ?)',
+                         (url_hash, url, content_hash, ext, size))
+            conn.commit()
+    except Exception as e:
+        print(f"Kon media niet registreren: {e}")
+
+# Sorteermogelijkheden van het berichtenoverzicht (post_index)
+POST_INDEX_SORTS = {
+    'exported': 'exported_at',
+    'created': 'created_utc',
+    'title': 'title COLLATE NOCASE',
+    'comments': 'comment_count'
+}
+_POST_INDEX_COLUMNS = ('folder', 'post_id', 'title', 'author', 'created_utc', 'media_type', 'comment_count', 'exported_at')
+
+def index_post(subreddit, folder, post_id, title, author, created_utc, media_type, comment_count, exported_at):
+    """Neem een geëxporteerd bericht op in het overzicht. Direct gecommit."""
+    try:
+        with _lock:
+            conn = _get_conn()
+            conn.execute('''
+                INSERT OR REPLACE INTO post_index (subreddit, folder, post_id, title, author, created_utc, media_type, comment_count, exported_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (subreddit, folder, post_id, title, author, created_utc, media_type, comment_count, exported_at))
+            conn.commit()
+    except Exception as e:
+        print(f"Kon bericht niet indexeren: {e}")
+
+def replace_post_index(subreddit, rows, started_at):
+    """
+    Vervang het overzicht van een subreddit in één transactie en markeer het als compleet.
+    rows: tuples (folder, post_id, title, author, created_utc, media_type, comment_count, exported_at).
+    Berichten die na started_at via index_post zijn toegevoegd blijven staan.
+    """
+    try:
+        with _lock:
+            conn = _get_conn()
+            conn.execute('DELETE FROM post_index WHERE subreddit = ? AND exported_at <= ?', (subreddit, started_at))
+            conn.execute('INSERT OR REPLACE INTO post_index_state (subreddit) VALUES (?)', (subreddit,))
+            conn.executemany('''
+                INSERT OR IGNORE INTO post_index (subreddit, folder, post_id, title, author, created_utc, media_type, comment_count, exported_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(subreddit,) + tuple(row) for row in rows])
+            conn.commit()
+    except Exception as e:
+        print(f"Kon index niet opnieuw opbouwen: {e}")
+
+def get_indexed_folder(subreddit, post_id):
+    """Map waarin dit bericht eerder is geëxporteerd, of None."""
+    try:
+        with _lock:
+            c = _get_conn().execute('SELECT folder FROM post_index WHERE subreddit = ? AND post_id = ? LIMIT 1', (subreddit, post_id))
+            row = c.fetchone()
+            return row[0] if row else None
+    except:
+        return None
+
+def get_post_index_folders(subreddit):
+    """Alle (map, post-ID) paren van een subreddit uit de index."""
+    try:
+        with _lock:
+            c = _get_conn().execute('SELECT folder, post_id FROM post_index WHERE subreddit = ?', (subreddit,))
+            return c.fetchall()
+    except Exception as e:
+        print(f"Fout bij ophalen berichtmappen: {e}")
+        return []
+
+def is_post_index_built(subreddit):
+    """True als de index van deze subreddit ooit volledig vanaf schijf is opgebouwd."""
+    try:
+        with _lock:
+            c = _get_conn().execute('SELECT 1 FROM post_index_state WHERE subreddit = ?', (subreddit,))
+            return c.fetchone() is not None
+    except:
+        return False
+
+def query_post_index(subreddit, sort='exported', descending=True, search=None, media_type=None, limit=50, offset=0):
+    """
+    Eén pagina uit het berichtenoverzicht.
+    search zoekt in titel en auteur; media_type 'none' selecteert berichten zonder media.
+    Retourneert (totaal aantal treffers, lijst met dicts).
+    """
+    where = ['subreddit = ?']
+    params = [subreddit]
+    if search:
+        where.append("(title LIKE ? ESCAPE '\\' OR author LIKE ? ESCAPE '\\')")
+        pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        params += [pattern, pattern]
+    if media_type == 'none':
+        where.append('media_type IS NULL')
+    elif media_type:
+        where.append('media_type = ?')
+        params.append(media_type)
+    clause = ' AND '.join(where)
+    order = f"{POST_INDEX_SORTS.get(sort, 'exported_at')} {'DESC' if descending else 'ASC'}, folder"
+    try:
+        with _lock:
+            conn = _get_conn()
+            total = conn.execute(f'SELECT COUNT(*) FROM post_index WHERE {clause}', params).fetchone()[0]
+            c = conn.execute(
+                f'SELECT {", ".join(_POST_INDEX_COLUMNS)} FROM post_index WHERE {clause} ORDER BY {order} LIMIT ? OFFSET ?',
+                params + [int(limit), int(offset)]
+            )
+            return total, [dict(zip(_POST_INDEX_COLUMNS, row)) for row in c.fetchall()]
+    except Exception as e:
+        print(f"Fout bij ophalen berichtenoverzicht: {e}")
+        return 0, []
+
+_CLEANUP_STATE_COLUMNS = ('archive_name', 'archive_inode', 'archive_size', 'archive_mtime', 'scanned_offset', 'filter_version')
+
+def get_cleanup_stats(subreddit):
+    """Opgeslagen opschoonstatistieken van een subreddit (dict), of None."""
+    columns = _CLEANUP_STATE_COLUMNS + ('total', 'accepted')
+    try:
+        with _lock:
+            c = _get_conn().execute(f'SELECT {", ".join(columns)} FROM cleanup_stats WHERE subreddit = ?', (subreddit,))
+            row = c.fetchone()
+            return dict(zip(columns, row)) if row else None
+    except Exception as e:
+        print(f"Fout bij ophalen opschoonstatistieken: {e}")
+        return None
+
+def save_cleanup_stats(subreddit, state, posts, full=False):
+    """
+    Verwerk een scan van het archief in de opschoonstatistieken.
+    state: dict met de _CLEANUP_STATE_COLUMNS; posts: {post_id: voldoet aan filter}.
+    Met full=True vervangen de posts alle eerder opgeslagen berichten van deze subreddit.
+    Retourneert (totaal, geaccepteerd), of None bij een fout.
+    """
+    try:
+        with _lock:
+            conn = _get_conn()
+            if full:
+                conn.execute('DELETE FROM cleanup_posts WHERE subreddit = ?', (subreddit,))
+            conn.executemany(
+                'INSERT OR REPLACE INTO cleanup_posts (subreddit, post_id, accepted) VALUES (?, ?, ?)',
+                [(subreddit, post_id, int(accepted)) for post_id, accepted in posts.items()]
+            )
+            total, accepted = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(accepted), 0) FROM cleanup_posts WHERE subreddit = ?', (subreddit,)
+            ).fetchone()
+            conn.execute(f'''
+                INSERT OR REPLACE INTO cleanup_stats (subreddit, {", ".join(_CLEANUP_STATE_COLUMNS)}, total, accepted, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', [subreddit] + [state[k] for k in _CLEANUP_STATE_COLUMNS] + [total, accepted])
+            conn.commit()
+            return total, accepted
+    except Exception as e:
+        print(f"Fout bij opslaan opschoonstatistieken: {e}")
+        return None
+
+def close():
+    """Schrijf de buffer weg en sluit de verbinding."""
+    global _conn
+    with _lock:
+        flush()
+        if _conn is not None:
+            try:
+                _conn.close()
+            except Exception:
+                pass
+            _conn = None
+
+# Voorkom dat gebufferde berichten verloren gaan bij afsluiten
+atexit.register(close)
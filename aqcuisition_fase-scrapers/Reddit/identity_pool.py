@@ -0,0 +1,160 @@
+import threading
+import time
+import uuid
+
+import rate_limiter
+import session_pool
+
+# Aantal geïsoleerde Tor-circuits dat als afzonderlijke identiteit wordt ingezet
+TOR_CIRCUITS = 4
+# Directe verbinding ook gebruiken wanneer Tor actief is (geeft het eigen IP-adres prijs)
+TOR_INCLUDE_DIRECT = False
+# Na zoveel 429's achter elkaar gaat ook een Tor-identiteit in quarantaine;
+# daarvoor volstaat een nieuw circuit
+TOR_STRIKES_BEFORE_QUARANTINE = 3
+# Quarantaine verdubbelt bij elke opeenvolgende 429, tot dit maximum (seconden)
+MAX_QUARANTINE = 15 * 60
+
+def parse_cookies(raw):
+    """Eén of meer reddit_session-cookies, gescheiden door komma's of regeleinden."""
+    if not raw:
+        return []
+    parts = raw if isinstance(raw, (list, tuple)) else raw.replace('\n', ',').split(',')
+    cookies = []
+    for part in parts:
+        part = part.strip()
+        if part and part not in cookies:
+            cookies.append(part)
+    return cookies
+
+class Identity:
+    """
+    Eén route naar Reddit: directe verbinding of Tor-circuit, eventueel met cookie.
+    Het budget staat in rate_limiter onder een vaste sleutel, ook als het circuit wisselt.
+    """
+    def __init__(self, name, tor_proxy=None, cookie=None):
+        self.name = name
+        self.tor_proxy = tor_proxy
+        self.cookie = cookie
+        self.key = rate_limiter.identity_key(None if name == 'direct' else name, cookie)
+        self.proxy = None
+        self.circuit = 0
+        self.strikes = 0
+        self.quarantined_until = 0.0
+        self.requests = 0
+        self.throttled = 0
+        if tor_proxy:
+            self.new_circuit()
+
+    def new_circuit(self):
+        """
+        Tor zet verbindingen met verschillende SOCKS-inloggegevens op aparte
+        circuits (IsolateSOCKSAuth); nieuwe gegevens betekenen dus een nieuw circuit,
+        zonder NEWNYM en zonder dat andere identiteiten hoeven te wachten.
+        """
+        scheme, address = self.tor_proxy.split('://', 1)
+        self.proxy = f"{scheme}://{self.name}-{uuid.uuid4().hex[:8]}:x@{address}"
+        self.circuit += 1
+
+    def stats(self, now):
+        return {
+            'name': self.name,
+            'rate_limit_key': self.key,
+            'circuit': self.circuit,
+            'requests': self.requests,
+            'throttled': self.throttled,
+            'strikes': self.strikes,
+            'quarantined_for': round(max(0.0, self.quarantined_until - now), 1)
+        }
+
+class IdentityPool:
+    """Identiteiten voor één combinatie van Tor-proxy en cookies."""
+    def __init__(self, tor_proxy, cookies):
+        routes = []
+        if not tor_proxy or TOR_INCLUDE_DIRECT:
+            routes.append(('direct', None))
+        if tor_proxy:
+            routes.extend((f"tor-{i + 1}", tor_proxy) for i in range(max(1, TOR_CIRCUITS)))
+        self.identities = [Identity(name, proxy, cookie) for name, proxy in routes for cookie in (cookies or [None])]
+
+    def size(self):
+        return len(self.identities)
+
+    def select(self):
+        """
+        Kies de identiteit die het snelst een verzoek mag doen (bij gelijke stand:
+        het meeste resterende budget) en reserveer één token.
+        Retourneert (identiteit, wachttijd in seconden).
+        """
+        with _lock:
+            now = time.monotonic()
+            best = None
+            for identity in self.identities:
+                wait, tokens = rate_limiter.peek(identity.key)
+                wait = max(wait, identity.quarantined_until - now)
+                score = (wait, -tokens, identity.requests)
+                if best is None or score < best[0]:
+                    best = (score, identity)
+            identity = best[1]
+            identity.requests += 1
+            wait = max(rate_limiter.reserve(identity.key), identity.quarantined_until - now)
+            return identity, wait
+
+    def acquire(self, should_stop=None, on_wait=None):
+        """Blokkerende variant van select. Retourneert de identiteit, of None indien gestopt."""
+        identity, wait = self.select()
+        if not rate_limiter.sleep(wait, should_stop, on_wait):
+            rate_limiter.release(identity.key)
+            return None
+        return identity
+
+# Eén pool per instelling, zodat gelijktijdige taken met verschillende
+# instellingen (Tor, cookies) elkaars quarantaines en circuits niet verstoren
+_pools = {}
+_lock = threading.Lock()
+
+def get_pool(tor_proxy=None, cookies=None):
+    """Pool voor deze Tor-proxy en cookie(s); dezelfde instellingen leveren dezelfde pool op."""
+    cookies = parse_cookies(cookies)
+    signature = (tor_proxy, tuple(cookies), TOR_CIRCUITS, TOR_INCLUDE_DIRECT)
+    with _lock:
+        pool = _pools.get(signature)
+        if pool is None:
+            pool = IdentityPool(tor_proxy, cookies)
+            _pools[signature] = pool
+        return pool
+
+def report_success(identity):
+    with _lock:
+        identity.strikes = 0
+
+def report_throttle(identity, headers=None):
+    """
+    Verwerk een 429 voor deze identiteit. Een Tor-identiteit krijgt een nieuw circuit;
+    na herhaalde 429's (of zonder Tor) gaat de identiteit in quarantaine, zodat
+    verzoeken naar de overige identiteiten gaan.
+    Retourneert de quarantaine in seconden (0 = direct opnieuw bruikbaar).
+    """
+    seconds = rate_limiter.record_throttle(identity.key, headers)
+    old_proxy = None
+    quarantine = 0
+    with _lock:
+        identity.throttled += 1
+        identity.strikes += 1
+        if identity.tor_proxy:
+            old_proxy = identity.proxy
+            identity.new_circuit()
+            rate_limiter.reset(identity.key)
+        if not identity.tor_proxy or identity.strikes >= TOR_STRIKES_BEFORE_QUARANTINE:
+            quarantine = min(MAX_QUARANTINE, seconds * 2 ** (identity.strikes - 1))
+            identity.quarantined_until = time.monotonic() + quarantine
+    if old_proxy:
+        # Oude verbindingen lopen nog via het vorige circuit
+        session_pool.reset_session(old_proxy)
+    return quarantine
+
+def get_stats():
+    """Status per identiteit voor het dashboard (budget: zie rate_limiter.get_stats)."""
+    with _lock:
+        now = time.monotonic()
+        return [identity.stats(now) for pool in _pools.values() for identity in pool.identities]
@@ -0,0 +1,223 @@
+import contextvars
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Maximaal aantal taken (scrapes, opschoonacties) dat tegelijk draait; de rest wacht in de rij
+MAX_CONCURRENT_JOBS = 3
+# Aantal logregels dat per taak wordt bewaard
+LOG_SIZE = 200
+# Aantal afgeronde taken dat in het overzicht blijft staan
+KEEP_FINISHED_JOBS = 50
+# Tellerwijzigingen worden per taak hooguit zo vaak (seconden) als gebeurtenis verstuurd
+COUNTER_EVENT_INTERVAL = 1.0
+# Aantal gebeurtenissen dat per abonnee (bijv. SSE-verbinding) in de rij mag staan
+SUBSCRIBER_QUEUE_SIZE = 500
+
+# Taak waarbinnen de huidige code draait; wordt meegegeven aan asyncio-taken
+# en aan threads die via submit() of run_in_job() worden gestart
+_current_job = contextvars.ContextVar('current_job', default=None)
+
+def _now():
+    return datetime.now().strftime('%d-%m-%Y %H:%M:%S')
+
+# --- Gebeurtenissen (statuswijzigingen voor de live-weergave) ---
+
+_subscribers = set()
+_subscribers_lock = threading.Lock()
+
+def subscribe():
+    """Nieuwe abonnee: een rij waarin alle volgende gebeurtenissen (dicts met 'type') verschijnen."""
+    q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    with _subscribers_lock:
+        _subscribers.add(q)
+    return q
+
+def unsubscribe(q):
+    with _subscribers_lock:
+        _subscribers.discard(q)
+
+def publish(event):
+    """
+    Verstuur een gebeurtenis naar alle abonnees. Een abonnee die achterloopt
+    krijgt in plaats van de gemiste gebeurtenissen één 'resync'.
+    """
+    with _subscribers_lock:
+        subscribers = list(_subscribers)
+    for q in subscribers:
+        try:
+            q.put_nowait(event)
+        except queue.Full:
+            try:
+                while True:
+                    q.get_nowait()
+            except queue.Empty:
+                pass
+            q.put_nowait({'type': 'resync'})
+
+class Job:
+    """
+    Eén achtergrondtaak met eigen stopsignaal, voortgangstellers en logboek.
+    update() is de status_callback van de scraper.
+    """
+    def __init__(self, kind, params=None):
+        self.id = uuid.uuid4().hex[:8]
+        self.kind = kind
+        self.params = params or {}
+        self.status = 'queued'
+        self.message = 'In de wachtrij...'
+        self.counters = {}
+        self.log = deque(maxlen=LOG_SIZE)
+        self.result = None
+        self.created_time = _now()
+        self.start_time = None
+        self.end_time = None
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self._counters_published = 0.0
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def update(self, msg):
+        line = f"[{datetime.now().strftime('%H:%M:%S')}] {msg}"
+        with self._lock:
+            self.message = msg
+            self.log.append(line)
+        publish({'type': 'message', 'job': self.id, 'message': msg, 'line': line})
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+            now = time.monotonic()
+            if now - self._counters_published < COUNTER_EVENT_INTERVAL:
+                return
+            self._counters_published = now
+            counters = dict(self.counters)
+        publish({'type': 'counters', 'job': self.id, 'counters': counters})
+
+    def set_status(self, status):
+        with self._lock:
+            self.status = status
+            if status == 'running':
+                self.start_time = _now()
+            elif status not in ('queued', 'running'):
+                self.end_time = _now()
+            event = {
+                'type': 'status', 'job': self.id, 'kind': self.kind, 'status': status,
+                'start_time': self.start_time, 'end_time': self.end_time,
+                'counters': dict(self.counters), 'result': self.result
+            }
+        publish(event)
+
+    def snapshot(self, log_lines=10):
+        with self._lock:
+            log = list(self.log)
+            return {
+                'id': self.id,
+                'kind': self.kind,
+                'params': self.params,
+                'status': self.status,
+                'is_running': self.status in ('queued', 'running'),
+                'cancel_requested': self.cancelled,
+                'message': self.message,
+                'counters': dict(self.counters),
+                'history': log[-log_lines:] if log_lines else log,
+                'result': self.result,
+                'created_time': self.created_time,
+                'start_time': self.start_time,
+                'end_time': self.end_time
+            }
+
+class JobManager:
+    """Voert taken uit in een begrensde threadpool en houdt hun status bij."""
+    def __init__(self, max_workers=MAX_CONCURRENT_JOBS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, func, params=None):
+        """
+        Plan func(job) in. De taak is binnen func (en in threads die via
+        run_in_job worden gestart) op te vragen met current_job().
+        """
+        job = Job(kind, params)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        job.set_status('queued')
+        self._pool.submit(self._run, job, func)
+        return job
+
+    def _run(self, job, func):
+        if job.cancelled:
+            job.set_status('stopped')
+            return
+        job.set_status('running')
+        token = _current_job.set(job)
+        status = 'failed'
+        try:
+            job.result = func(job)
+            status = 'stopped' if job.cancelled else 'finished'
+        except Exception as e:
+            job.update(f"Fout: {e}")
+        finally:
+            _current_job.reset(token)
+            job.set_status(status)
+
+    def _prune(self):
+        finished = [j for j in self._jobs.values() if j.status not in ('queued', 'running')]
+        for job in finished[:max(0, len(finished) - KEEP_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        """Alle bekende taken, oudste eerst."""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def stop(self, job_id):
+        job = self.get(job_id)
+        if job:
+            job.cancel()
+            publish({'type': 'stopping', 'job': job.id})
+        return job
+
+    def stop_all(self):
+        jobs = [j for j in self.list() if j.status in ('queued', 'running')]
+        for job in jobs:
+            job.cancel()
+            publish({'type': 'stopping', 'job': job.id})
+        return jobs
+
+manager = JobManager()
+
+def current_job():
+    return _current_job.get()
+
+def cancelled():
+    """True als de taak waarbinnen de huidige code draait is gestopt."""
+    job = _current_job.get()
+    return job is not None and job.cancelled
+
+def count(name, amount=1):
+    """Verhoog een voortgangsteller van de huidige taak (geen effect buiten een taak)."""
+    job = _current_job.get()
+    if job is not None:
+        job.count(name, amount)
+
+def run_in_job(func):
+    """Wikkel func zodat deze in een andere thread binnen de huidige taak draait (bijv. executor.submit)."""
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.copy().run(func, *args, **kwargs)
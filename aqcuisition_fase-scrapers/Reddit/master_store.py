@@ -0,0 +1,622 @@
+import os
+import sys
+import json
+import gzip
+import shutil
+import threading
+import itertools
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+# Append-only archief per subreddit: één JSON-regel per (versie van een) bericht
+ARCHIVE_FILE = 'all_data.jsonl'
+# Index: per regel "post_id<TAB>offset<TAB>lengte" van de meest recente versie
+INDEX_FILE = 'all_data.jsonl.idx'
+# Vergrendeling tussen processen: schrijven (upsert) en herschrijven (compact) nooit tegelijk
+LOCK_FILE = 'all_data.jsonl.lock'
+# Oud formaat: één JSON-lijst die per bericht volledig werd herschreven
+LEGACY_FILE = 'all_data.json'
+LEGACY_BACKUP_FILE = 'all_data.legacy.json'
+# Berichten per pagina in de archiefweergave (/api/archive/<subreddit>)
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Aantal zoekopdrachten waarvan de treffers worden onthouden, zodat bladeren niet opnieuw zoekt
+SEARCH_CACHE_SIZE = 16
+
+# Generaties zijn uniek binnen het proces, ook over opnieuw aangemaakte MasterStores heen
+_generations = itertools.count(1)
+
+@contextmanager
+def _process_lock(path):
+    """Exclusieve vergrendeling van een bestand over processen heen (wacht tot deze vrij is)."""
+    with open(path, 'a+b') as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK geeft na ongeveer 10 seconden op: opnieuw proberen
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+class MasterStore:
+    """
+    Append-only JSONL-archief met een ID -> offset index.
+    Een upsert voegt één regel toe; oudere versies blijven staan tot compact().
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        self.data_path = os.path.join(folder, ARCHIVE_FILE)
+        self.index_path = os.path.join(folder, INDEX_FILE)
+        self.lock_path = os.path.join(folder, LOCK_FILE)
+        # Alleen tussen threads; schrijfacties nemen daarnaast _write_lock() (tussen processen)
+        self.lock = threading.RLock()
+        self.index = {}
+        self.line_count = 0
+        # Wordt verhoogd wanneer het archief is herschreven (compact(), ook vanuit een
+        # ander proces): eerder opgevraagde posities zijn dan ongeldig
+        self.generation = next(_generations)
+        self._locations = None
+        self._loaded = False
+        # Bestand (inode) en byte-positie tot waar het archief in self.index staat
+        self._inode = None
+        self._scanned_end = 0
+        # Geïndexeerd bij het lezen, maar nog niet in het indexbestand (zie _persist)
+        self._pending = []
+        self._index_valid = True
+
+    # --- Index ---
+
+    def _is_current(self):
+        """False als het archief buiten deze index om is vervangen of ingekort (bijv. compact in een ander proces)."""
+        try:
+            st = os.stat(self.data_path)
+        except FileNotFoundError:
+            return self._inode is None
+        return st.st_ino == self._inode and st.st_size >= self._scanned_end
+
+    def _reset(self):
+        self.index = {}
+        self.line_count = 0
+        self.generation = next(_generations)
+        self._locations = None
+        self._loaded = False
+        self._inode = None
+        self._scanned_end = 0
+        self._pending = []
+        self._index_valid = True
+
+    def _load(self, write=False):
+        """
+        Laad de index (eenmalig, of opnieuw als het archief is vervangen).
+        Lezen schrijft nooit naar schijf; met write=True worden een oud all_data.json
+        omgezet, ongeïndexeerde regels aan het indexbestand toegevoegd en een half
+        geschreven laatste regel (na een crash) verwijderd.
+        """
+        if self._loaded and not self._is_current():
+            self._reset()
+
+        if not self._loaded:
+            if not os.path.exists(self.data_path):
+                if os.path.exists(os.path.join(self.folder, LEGACY_FILE)) and not write:
+                    # Oud formaat: pas omzetten bij de volgende scrape of via de CLI
+                    return
+                if write:
+                    os.makedirs(self.folder, exist_ok=True)
+                    self._migrate_legacy()
+
+            indexed_end = 0
+            if os.path.exists(self.index_path):
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        parts = line.rstrip('\n').split('\t')
+                        if len(parts) != 3:
+                            continue
+                        post_id, offset, length = parts[0], int(parts[1]), int(parts[2])
+                        self.index[post_id] = (offset, length)
+                        self.line_count += 1
+                        indexed_end = max(indexed_end, offset + length)
+
+            if os.path.exists(self.data_path):
+                self._inode = os.stat(self.data_path).st_ino
+                if indexed_end > os.path.getsize(self.data_path):
+                    # Index hoort niet bij dit archief: volledig opnieuw opbouwen
+                    self.index = {}
+                    self.line_count = 0
+                    indexed_end = 0
+                    self._index_valid = False
+            self._scanned_end = indexed_end
+            # Regels na de laatste indexregel (bijv. na een crash) alsnog indexeren
+            self._scan_tail()
+            self._loaded = True
+
+        if write:
+            self._persist()
+
+    def _scan_tail(self):
+        """Indexeer (in het geheugen) de volledige regels na self._scanned_end."""
+        if not os.path.exists(self.data_path):
+            return
+        with open(self.data_path, 'rb') as f:
+            f.seek(self._scanned_end)
+            offset = self._scanned_end
+            for raw in f:
+                if not raw.endswith(b'\n'):
+                    break
+                try:
+                    post_id = json.loads(raw)['post']['id']
+                except Exception:
+                    break
+                self.index[post_id] = (offset, len(raw))
+                self.line_count += 1
+                self._pending.append((post_id, offset, len(raw)))
+                offset += len(raw)
+        if offset != self._scanned_end:
+            self._scanned_end = offset
+            self._locations = None
+
+    def _persist(self):
+        """Schrijf bij het lezen gevonden regels naar het indexbestand en herstel een afgebroken laatste regel."""
+        if not os.path.exists(self.data_path):
+            return
+        self._scan_tail()
+        if self._scanned_end < os.path.getsize(self.data_path):
+            # Half geschreven laatste regel verwijderen
+            with open(self.data_path, 'r+b') as f:
+                f.truncate(self._scanned_end)
+        if self._pending or not self._index_valid:
+            with open(self.index_path, 'a' if self._index_valid else 'w', encoding='utf-8') as f:
+                for post_id, offset, length in self._pending:
+                    f.write(f"{post_id}\t{offset}\t{length}\n")
+            self._pending = []
+            self._index_valid = True
+
+    def _migrate_legacy(self):
+        """Zet een bestaand all_data.json eenmalig om naar het JSONL-archief."""
+        legacy_path = os.path.join(self.folder, LEGACY_FILE)
+        if not os.path.exists(legacy_path):
+            return
+        with open(legacy_path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        _write_lines(self.data_path, entries)
+        os.replace(legacy_path, os.path.join(self.folder, LEGACY_BACKUP_FILE))
+
+    # --- Schrijven ---
+
+    @contextmanager
+    def _write_lock(self):
+        """self.lock plus de bestandsvergrendeling, zodat een ander proces niet tegelijk schrijft of compact() uitvoert."""
+        with self.lock:
+            os.makedirs(self.folder, exist_ok=True)
+            with _process_lock(self.lock_path):
+                yield
+
+    def upsert(self, entry):
+        """Voeg de nieuwste versie van een bericht toe."""
+        line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+        self._append(entry['post']['id'], lambda f: f.write(line))
+
+    def upsert_from(self, post_id, source):
+        """
+        Als upsert(), maar de JSON-regel (inclusief afsluitende newline) staat al in het
+        binaire bestand source en wordt in blokken gekopieerd, zonder hem in het geheugen te laden.
+        """
+        source.seek(0)
+        self._append(post_id, lambda f: shutil.copyfileobj(source, f))
+
+    def _append(self, post_id, write):
+        with self._write_lock():
+            # Binnen de vergrendeling: een compact() van een ander proces is dan al afgerond en wordt hier opgemerkt
+            self._load(write=True)
+            with open(self.data_path, 'ab') as f:
+                f.seek(0, os.SEEK_END)
+                offset = f.tell()
+                write(f)
+                length = f.tell() - offset
+            if self._inode is None:
+                self._inode = os.stat(self.data_path).st_ino
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(f"{post_id}\t{offset}\t{length}\n")
+            self.index[post_id] = (offset, length)
+            self.line_count += 1
+            self._scanned_end = offset + length
+            self._locations = None
+
+    def compact(self):
+        """
+        Herschrijf het archief met alleen de meest recente versie per bericht.
+        Retourneert het aantal verwijderde (verouderde) regels.
+        """
+        with self._write_lock():
+            self._load(write=True)
+            superseded = self.line_count - len(self.index)
+            if superseded <= 0:
+                return 0
+            tmp_path = self.data_path + '.tmp'
+            tmp_index = self.index_path + '.tmp'
+            new_index = {}
+            with open(self.data_path, 'rb') as src, open(tmp_path, 'wb') as dst, open(tmp_index, 'w', encoding='utf-8') as idx:
+                for post_id, (offset, length) in sorted(self.index.items(), key=lambda item: item[1][0]):
+                    src.seek(offset)
+                    raw = src.read(length)
+                    new_offset = dst.tell()
+                    dst.write(raw)
+                    idx.write(f"{post_id}\t{new_offset}\t{length}\n")
+                    new_index[post_id] = (new_offset, length)
+            os.replace(tmp_path, self.data_path)
+            os.replace(tmp_index, self.index_path)
+            self.index = new_index
+            self.line_count = len(new_index)
+            self.generation = next(_generations)
+            self._locations = None
+            self._inode = os.stat(self.data_path).st_ino
+            self._scanned_end = os.path.getsize(self.data_path)
+            return superseded
+
+    # --- Lezen ---
+
+    def __len__(self):
+        with self.lock:
+            self._load()
+            return len(self.index)
+
+    def __contains__(self, post_id):
+        with self.lock:
+            self._load()
+            return post_id in self.index
+
+    def get(self, post_id):
+        """Haal de meest recente versie van één bericht op via de index."""
+        with self.lock:
+            self._load()
+            location = self.index.get(post_id)
+            if not location:
+                return None
+            offset, length = location
+            with open(self.data_path, 'rb') as f:
+                f.seek(offset)
+                return json.loads(f.read(length))
+
+    def locations(self):
+        """
+        (offset, lengte) van de meest recente versie van elk bericht, in archiefvolgorde,
+        samen met de versie van het archief (zie read_at).
+        """
+        with self.lock:
+            self._load()
+            if self._locations is None:
+                self._locations = sorted(self.index.values())
+            return self._locations, (self.generation, self.line_count)
+
+    def read_at(self, locations, version=None):
+        """
+        Lees de berichten op de gegeven posities. Retourneert None als het archief
+        sinds locations() is herschreven (andere versie).
+        """
+        with self.lock:
+            self._load()
+            if version is not None and version[0] != self.generation:
+                return None
+            entries = []
+            if not locations:
+                return entries
+            with open(self.data_path, 'rb') as f:
+                for offset, length in locations:
+                    f.seek(offset)
+                    entries.append(json.loads(f.read(length)))
+            return entries
+
+    def _open_snapshot(self):
+        """
+        Posities, versie en een geopend archiefbestand dat daarbij hoort (of None),
+        zodat zonder de lock kan worden gelezen terwijl een ander proces compact() uitvoert.
+        """
+        while True:
+            locations, version = self.locations()
+            with self.lock:
+                inode = self._inode
+            if inode is None:
+                return locations, version, None
+            f = open(self.data_path, 'rb')
+            if os.fstat(f.fileno()).st_ino == inode:
+                return locations, version, f
+            # Net vervangen: index opnieuw laden en nogmaals proberen
+            f.close()
+
+    def find(self, predicate, needle=None, previous=None):
+        """
+        Posities van de meest recente versies waarvoor predicate(bericht) waar is, in
+        archiefvolgorde, de versie van het archief en de byte-positie tot waar is gezocht.
+        Met needle (bytes) worden regels waarin deze niet voorkomt overgeslagen zonder ze te parsen.
+        previous: eerdere uitkomst (found, version, end) van dezelfde zoekopdracht. Is het
+        archief sindsdien alleen aangegroeid (zelfde generatie), dan worden alleen de nieuwe
+        regels gelezen en vervallen eerdere treffers waarvan een nieuwere versie bestaat.
+        Het archief wordt gelezen zonder de lock vast te houden, zodat een scraper kan doorschrijven.
+        """
+        locations, version, f = self._open_snapshot()
+        current = dict(locations)
+        end = locations[-1][0] + locations[-1][1] if locations else 0
+        start = 0
+        found = []
+        if previous and previous[1][0] == version[0] and previous[2] <= end:
+            start = previous[2]
+            found = [(offset, length) for offset, length in previous[0] if current.get(offset) == length]
+        if f is None:
+            return found, version, end
+        with f:
+            f.seek(start)
+            offset = start
+            for raw in f:
+                if offset >= end:
+                    break
+                length = current.get(offset)
+                if length == len(raw) and (needle is None or needle in raw.lower()):
+                    if predicate(json.loads(raw)):
+                        found.append((offset, length))
+                offset += len(raw)
+        return found, version, end
+
+    def iter_entries(self):
+        """Loop streamend over de meest recente versie van elk bericht (archiefvolgorde)."""
+        locations, _, f = self._open_snapshot()
+        current = {offset for offset, _ in locations}
+        if f is None:
+            return
+        with f:
+            offset = 0
+            for raw in f:
+                if offset in current:
+                    yield json.loads(raw)
+                offset += len(raw)
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def _write_lines(path, entries):
+    with open(path, 'wb') as f:
+        for entry in entries:
+            f.write((json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8'))
+
+def get_store(folder):
+    """Retourneer het (gedeelde) archief voor een subreddit-map."""
+    folder = os.path.abspath(folder)
+    with _stores_lock:
+        store = _stores.get(folder)
+        if store is None:
+            store = MasterStore(folder)
+            _stores[folder] = store
+        return store
+
+def archive_filename(folder):
+    """Naam van het aanwezige archiefbestand (JSONL of oud JSON), of None."""
+    for name in (ARCHIVE_FILE, LEGACY_FILE):
+        if os.path.exists(os.path.join(folder, name)):
+            return name
+    return None
+
+def has_archive(folder):
+    return archive_filename(folder) is not None
+
+def iter_entries(folder):
+    """Lees de berichten van een subreddit-map, ongeacht het opslagformaat."""
+    name = archive_filename(folder)
+    if name == ARCHIVE_FILE:
+        yield from get_store(folder).iter_entries()
+    elif name == LEGACY_FILE:
+        with open(os.path.join(folder, LEGACY_FILE), 'r', encoding='utf-8') as f:
+            yield from json.load(f)
+
+def read_entries(folder):
+    """
+    Lees de meest recente versie van elk bericht rechtstreeks uit het bestand, zonder
+    MasterStore: de index wordt niet gebruikt of bijgewerkt en een onvolledige laatste
+    regel (nog in aanbouw) wordt overgeslagen in plaats van afgekapt. Bedoeld voor
+    aparte processen (opschonen) naast een scraper die het archief aanvult.
+    Twee doorgangen: eerst de laatste positie per bericht, daarna de regels zelf.
+    """
+    name = archive_filename(folder)
+    if name == LEGACY_FILE:
+        with open(os.path.join(folder, LEGACY_FILE), 'r', encoding='utf-8') as f:
+            yield from json.load(f)
+        return
+    if name != ARCHIVE_FILE:
+        return
+    with open(os.path.join(folder, ARCHIVE_FILE), 'rb') as f:
+        latest = {}
+        end = 0
+        for raw in f:
+            if not raw.endswith(b'\n'):
+                break
+            try:
+                post_id = json.loads(raw).get('post', {}).get('id')
+            except ValueError:
+                post_id = None
+            if post_id:
+                latest[post_id] = end
+            end += len(raw)
+        current = set(latest.values())
+        f.seek(0)
+        offset = 0
+        # Alleen tot het eind van de eerste doorgang: wat daarna is bijgeschreven telt niet mee
+        while offset < end:
+            raw = f.readline()
+            if offset in current:
+                yield json.loads(raw)
+            offset += len(raw)
+
+def migrate(folder):
+    """Zet een oud all_data.json om naar all_data.jsonl. Retourneert True als er iets is omgezet."""
+    if archive_filename(folder) != LEGACY_FILE:
+        return False
+    store = get_store(folder)
+    with store._write_lock():
+        store._load(write=True)
+    return True
+
+def load_entries(folder):
+    return list(iter_entries(folder))
+
+def write_archive(folder, entries):
+    """Schrijf een nieuw archief (bijv. een opgeschoonde kopie) in één keer weg."""
+    os.makedirs(folder, exist_ok=True)
+    _write_lines(os.path.join(folder, ARCHIVE_FILE), entries)
+    index_path = os.path.join(folder, INDEX_FILE)
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    with _stores_lock:
+        _stores.pop(os.path.abspath(folder), None)
+
+def _post_matches(entry, author, keyword, date_from, date_to):
+    post = entry.get('post', {})
+    if author and (post.get('author') or '').lower() != author:
+        return False
+    created = post.get('created_utc') or 0
+    if date_from is not None and created < date_from:
+        return False
+    if date_to is not None and created >= date_to:
+        return False
+    if keyword:
+        text = f"{post.get('title') or ''}\n{post.get('text') or ''}".lower()
+        if keyword not in text:
+            return False
+    return True
+
+_search_cache = OrderedDict()
+_search_cache_lock = threading.Lock()
+
+def _search(store, author, keyword, date_from, date_to):
+    """
+    Treffers van een zoekopdracht. Onthouden per generatie van het archief: na nieuwe
+    berichten worden alleen de bijgeschreven regels doorzocht (zie MasterStore.find).
+    """
+    _, version = store.locations()
+    key = (store.folder, author, keyword, date_from, date_to)
+    with _search_cache_lock:
+        cached = _search_cache.get(key)
+        if cached:
+            _search_cache.move_to_end(key)
+            if cached[1] == version:
+                return cached[0], cached[1]
+    # Snelle voorselectie op de ruwe regel: alleen voor ASCII zonder tekens die JSON anders opslaat
+    needle = None
+    if keyword and keyword.isascii() and keyword.isprintable() and not any(ch in keyword for ch in '"\\/'):
+        needle = keyword.encode('utf-8')
+    found, version, end = store.find(lambda entry: _post_matches(entry, author, keyword, date_from, date_to), needle, cached)
+    with _search_cache_lock:
+        _search_cache[key] = (found, version, end)
+        _search_cache.move_to_end(key)
+        while len(_search_cache) > SEARCH_CACHE_SIZE:
+            _search_cache.popitem(last=False)
+    return found, version
+
+def page(folder, page=1, per_page=PAGE_SIZE, order='asc', author=None, keyword=None, date_from=None, date_to=None):
+    """
+    Eén pagina berichten uit het archief, via de index (alleen deze berichten worden gelezen).
+    Een oud all_data.json wordt hier niet omgezet (zie migrate) en levert geen berichten op.
+    author: exacte auteursnaam; keyword: tekst in titel of bericht; date_from/date_to:
+    Unix-tijden (tot, niet tot en met). Niet hoofdlettergevoelig.
+    order 'asc' is de volgorde van het archief (oudste export eerst), 'desc' omgekeerd.
+    """
+    per_page = max(1, min(MAX_PAGE_SIZE, int(per_page)))
+    page = max(1, int(page))
+    descending = order == 'desc'
+    author = (author or '').strip().lower() or None
+    keyword = (keyword or '').strip().lower() or None
+    store = get_store(folder)
+
+    for _ in range(2):
+        if author or keyword or date_from is not None or date_to is not None:
+            locations, version = _search(store, author, keyword, date_from, date_to)
+        else:
+            locations, version = store.locations()
+        total = len(locations)
+        start = (page - 1) * per_page
+        if descending:
+            selected = locations[max(0, total - start - per_page):max(0, total - start)][::-1]
+        else:
+            selected = locations[start:start + per_page]
+        posts = store.read_at(selected, version)
+        if posts is not None:
+            break
+    else:
+        # Archief werd tweemaal herschreven tijdens het opvragen
+        posts = []
+
+    return {
+        'posts': posts,
+        'total': total,
+        'page': page,
+        'pages': max(1, (total + per_page - 1) // per_page),
+        'per_page': per_page,
+        'order': 'desc' if descending else 'asc',
+        'author': author or '',
+        'q': keyword or '',
+        'from': date_from,
+        'to': date_to
+    }
+
+def export_json(folder, compress=False):
+    """
+    Schrijf een momentopname als JSON-lijst (oud formaat) voor notebooks en analyses.
+    Met compress=True wordt all_data.export.json.gz geschreven.
+    """
+    name = 'all_data.export.json.gz' if compress else 'all_data.export.json'
+    path = os.path.join(folder, name)
+    opener = gzip.open if compress else open
+    with opener(path, 'wt', encoding='utf-8') as f:
+        f.write('[')
+        for i, entry in enumerate(iter_entries(folder)):
+            if i:
+                f.write(',\n')
+            json.dump(entry, f, ensure_ascii=False)
+        f.write(']')
+    return path
+
+def main():
+    """
+    Gebruik: python master_store.py compact|export-json|migrate [subreddit ...]
+    Zonder subreddits worden alle mappen in exports/ verwerkt.
+    migrate zet een oud all_data.json om naar all_data.jsonl (gebeurt anders bij de volgende scrape).
+    """
+    if len(sys.argv) < 2 or sys.argv[1] not in ('compact', 'export-json', 'migrate'):
+        print(main.__doc__.strip())
+        return
+
+    exports_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exports')
+    subreddits = sys.argv[2:]
+    if not subreddits and os.path.exists(exports_dir):
+        subreddits = sorted(d for d in os.listdir(exports_dir) if os.path.isdir(os.path.join(exports_dir, d)) and not d.startswith('.'))
+
+    for sub in subreddits:
+        folder = os.path.join(exports_dir, sub)
+        if not has_archive(folder):
+            continue
+        if sys.argv[1] == 'compact':
+            removed = get_store(folder).compact()
+            print(f"{sub}: {removed} verouderde regels verwijderd")
+        elif sys.argv[1] == 'migrate':
+            if migrate(folder):
+                print(f"{sub}: omgezet naar {ARCHIVE_FILE}")
+        else:
+            print(f"{sub}: geëxporteerd naar {export_json(folder)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import psutil
+
+import database
+
+# Gelijktijdige downloads: threads voor losse bestanden (HTTP), processen voor yt-dlp/ffmpeg
+HTTP_WORKERS = 4
+VIDEO_WORKERS = 2
+# Een mislukte taak wordt maximaal MAX_ATTEMPTS keer geprobeerd,
+# met RETRY_DELAY * poging seconden wachttijd tussen de pogingen
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 30
+# Hoe vaak de wachtrij wordt nagekeken als er geen nieuwe taken binnenkomen
+POLL_INTERVAL = 2.0
+
+def _download_file_job(url, folder, prefix):
+    import scraper
+    return scraper.download_file(url, folder, prefix=prefix)
+
+def _download_video_job(url, folder, prefix):
+    # Draait in een apart proces: video_download heeft geen bijwerkingen bij importeren
+    import video_download
+    return video_download.download_video_with_ytdlp(url, folder, prefix=prefix)
+
+def _owner_token():
+    """Identificatie van dit proces: pid plus starttijd (een pid kan worden hergebruikt)."""
+    process = psutil.Process(os.getpid())
+    return f"{process.pid}:{process.create_time()}"
+
+def _owner_alive(owner):
+    if not owner:
+        return False
+    try:
+        pid, created = owner.split(':', 1)
+        return psutil.Process(int(pid)).create_time() == float(created)
+    except (ValueError, psutil.Error):
+        return False
+
+class MediaQueue:
+    """
+    Achtergrondverwerking van mediadownloads.
+    Taken staan in de tabel media_jobs (database.py), zodat openstaande
+    downloads een herstart overleven en de status per taak zichtbaar is.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._wake = threading.Event()
+        self._idle = threading.Condition(self.lock)
+        self._thread = None
+        self._http_pool = None
+        self._video_pool = None
+        self._active = {}
+        self._owner = _owner_token()
+
+    def start(self):
+        with self.lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            # Taken die 'running' bleven staan bij een proces dat niet meer bestaat opnieuw
+            # aanbieden; taken van een ander lopend proces (CLI naast de webinterface) blijven van dat proces
+            dead = [owner for owner in database.get_running_media_owners()
+                    if owner != self._owner and not _owner_alive(owner)]
+            database.requeue_running_media_jobs(dead)
+            self._http_pool = ThreadPoolExecutor(max_workers=HTTP_WORKERS, thread_name_prefix='media')
+            self._video_pool = self._new_video_pool()
+            self._thread = threading.Thread(target=self._run, name='media-dispatcher', daemon=True)
+            self._thread.start()
+
+    def _new_video_pool(self):
+        # 'spawn' voorkomt het forken van een proces met actieve threads (Flask, scraper)
+        return ProcessPoolExecutor(max_workers=VIDEO_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+
+    def enqueue(self, post_id, kind, url, folder, prefix):
+        job_id = database.enqueue_media_job(post_id, kind, url, folder, prefix)
+        self.start()
+        self._wake.set()
+        return job_id
+
+    def _run(self):
+        while True:
+            self._dispatch('file', self._http_pool, _download_file_job, HTTP_WORKERS)
+            self._dispatch('video', self._video_pool, _download_video_job, VIDEO_WORKERS)
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+
+    def _dispatch(self, kind, pool, func, capacity):
+        with self.lock:
+            free = capacity - sum(1 for job in self._active.values() if job['kind'] == kind)
+        if free <= 0:
+            return
+        for job in database.claim_media_jobs(free, kind, self._owner):
+            try:
+                future = pool.submit(func, job['url'], job['folder'], job['prefix'])
+            except Exception as e:
+                self._finish(job, False, str(e))
+                continue
+            job['pool'] = pool
+            with self.lock:
+                self._active[future] = job
+            future.add_done_callback(self._on_done)
+
+    def _on_done(self, future):
+        with self.lock:
+            job = self._active.pop(future)
+        try:
+            success = bool(future.result())
+            error = None if success else 'Download mislukt'
+        except BrokenProcessPool as e:
+            # Een vastgelopen of gecrasht yt-dlp-proces: pool vervangen voor volgende taken
+            success = False
+            error = str(e)
+            with self.lock:
+                if job['pool'] is self._video_pool:
+                    self._video_pool = self._new_video_pool()
+        except Exception as e:
+            success = False
+            error = str(e)
+        self._finish(job, success, error)
+        self._wake.set()
+
+    def _finish(self, job, success, error):
+        if success:
+            database.finish_media_job(job['id'], True)
+        elif job['attempts'] < MAX_ATTEMPTS:
+            database.finish_media_job(job['id'], False, error, retry_delay=RETRY_DELAY * job['attempts'])
+        else:
+            print(f"Mediadownload definitief mislukt ({job['url']}): {error}")
+            database.finish_media_job(job['id'], False, error)
+        with self.lock:
+            self._idle.notify_all()
+
+    def wait_until_idle(self, timeout=None):
+        """Wacht tot er geen wachtende of lopende taken meer zijn. Retourneert True als dat zo is."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            counts = database.get_media_job_counts()
+            if not counts.get('pending') and not counts.get('running'):
+                return True
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            self.start()
+            with self.lock:
+                self._idle.wait(POLL_INTERVAL if remaining is None else min(POLL_INTERVAL, remaining))
+
+_queue = MediaQueue()
+
+def enqueue(post_id, kind, url, folder, prefix=""):
+    """Plaats een download in de wachtrij. kind is 'file' (HTTP) of 'video' (yt-dlp)."""
+    return _queue.enqueue(post_id, kind, url, folder, prefix)
+
+def start():
+    """Start de verwerking van openstaande taken (ook die van een vorige run)."""
+    _queue.start()
+
+def wait_until_idle(timeout=None):
+    return _queue.wait_until_idle(timeout)
+
+def get_status():
+    """Aantal taken per status (pending, running, done, failed)."""
+    return database.get_media_job_counts()
@@ -0,0 +1,122 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import threading
+
+import database
+import session_pool
+
+# Gedeelde opslag binnen exports/ (zelfde volume, zodat hardlinks mogelijk zijn).
+# Mappen die met een punt beginnen worden door de webinterface en opschoning overgeslagen.
+EXPORTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exports')
+STORE_DIR = os.path.join(EXPORTS_DIR, '.media')
+CHUNK_SIZE = 65536
+
+# Eén download tegelijk per URL binnen dit proces
+_url_locks = {}
+_url_locks_lock = threading.Lock()
+
+def url_hash(url):
+    return hashlib.sha256(url.split('#')[0].encode('utf-8')).hexdigest()
+
+def blob_path(content_hash, ext):
+    """Locatie van een bestand in de opslag: .media/ab/abcdef....ext"""
+    return os.path.join(STORE_DIR, content_hash[:2], content_hash + ext)
+
+def split_url_name(url):
+    """Bestandsnaam en extensie uit een URL (zonder querystring)."""
+    filename = url.split('/')[-1].split('?')[0] or "downloaded_file"
+    name, ext = os.path.splitext(filename)
+    return name, ext or ".bin"
+
+def _url_lock(key):
+    with _url_locks_lock:
+        lock = _url_locks.get(key)
+        if lock is None:
+            lock = threading.Lock()
+            _url_locks[key] = lock
+        return lock
+
+def _target_name(prefix, name, content_hash, ext):
+    # Naam volgt uit de inhoud: hetzelfde bestand krijgt in een map altijd dezelfde naam
+    filename = f"{name}_{content_hash[:12]}{ext}"
+    return f"{prefix}_{filename}" if prefix else filename
+
+def link_into(src, folder, filename):
+    """Plaats een bestand uit de opslag in een postmap (hardlink, anders kopie)."""
+    os.makedirs(folder, exist_ok=True)
+    target = os.path.join(folder, filename)
+    if os.path.exists(target):
+        return target
+    try:
+        os.link(src, target)
+    except OSError:
+        # Bijv. een bestandssysteem zonder hardlinks
+        shutil.copy2(src, target)
+    return target
+
+def link_known(url, folder, prefix="", name=None):
+    """Koppel een eerder gedownloade URL aan de postmap. Retourneert het pad, of None."""
+    known = database.get_media_blob(url_hash(url))
+    if not known:
+        return None
+    content_hash, ext = known
+    src = blob_path(content_hash, ext)
+    if not os.path.exists(src):
+        return None
+    return link_into(src, folder, _target_name(prefix, name or split_url_name(url)[0], content_hash, ext))
+
+def _store(tmp_path, content_hash, size, url, folder, prefix, name, ext):
+    """Verplaats een tijdelijk bestand naar de opslag, tenzij dezelfde inhoud er al staat."""
+    dest = blob_path(content_hash, ext)
+    if os.path.exists(dest):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(tmp_path, dest)
+    database.record_media_blob(url_hash(url), url, content_hash, ext, size)
+    return link_into(dest, folder, _target_name(prefix, name, content_hash, ext))
+
+def new_temp_dir():
+    """Tijdelijke map op hetzelfde volume als de opslag (voor yt-dlp)."""
+    os.makedirs(STORE_DIR, exist_ok=True)
+    return tempfile.mkdtemp(dir=STORE_DIR, prefix='tmp_')
+
+def fetch(url, folder, prefix=""):
+    """
+    Download een bestand via de opslag en koppel het aan de postmap.
+    Eerst op URL-hash (geen download nodig), daarna op inhoud-hash (geen dubbele opslag).
+    """
+    name, ext = split_url_name(url)
+    with _url_lock(url_hash(url)):
+        existing = link_known(url, folder, prefix)
+        if existing:
+            return existing
+
+        os.makedirs(STORE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=STORE_DIR, suffix='.part')
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            # Media wordt via de directe verbinding opgehaald, met hergebruik van de pool
+            session = session_pool.get_session()
+            with os.fdopen(fd, 'wb') as f, session.get(url, stream=True, timeout=60) as r:
+                r.raise_for_status()
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return _store(tmp_path, digest.hexdigest(), size, url, folder, prefix, name, ext)
+
+def ingest_file(path, url, folder, prefix="", name=None):
+    """Neem een elders gedownload bestand (bijv. van yt-dlp) op in de opslag."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    base, ext = os.path.splitext(os.path.basename(path))
+    return _store(path, digest.hexdigest(), os.path.getsize(path), url, folder, prefix, name or base, ext or ".bin")
@@ -0,0 +1,134 @@
+import sys
+import threading
+import contextvars
+from datetime import datetime
+
+from rich.console import Console, Group
+from rich.markdown import Markdown
+from rich.panel import Panel
+from rich.tree import Tree
+from rich.text import Text
+from rich.markup import escape
+
+# Beschikbare uitvoermodi:
+#   'rich'  - panelen, Markdown en reactieboom (interactief gebruik)
+#   'plain' - één logregel per melding, zonder opmaak (webinterface, Docker-logs)
+#   'none'  - geen uitvoer
+OUTPUT_MODES = ('rich', 'plain', 'none')
+
+_rich_console = Console()
+
+def add_comments_to_tree(tree, comments):
+    """
+    Visualiseer reacties in een boomstructuur.
+    """
+    stack = [(tree, iter(comments))]
+    while stack:
+        branch, remaining = stack[-1]
+        comment = next(remaining, None)
+        if comment is None:
+            stack.pop()
+            continue
+        author = escape(f"u/{comment['author']}")
+        comment_panel_content = Group(
+            Markdown(f"**{author}**"),
+            Markdown(comment['body'])
+        )
+        child = branch.add(Panel(comment_panel_content, expand=False))
+        if comment['replies']:
+            stack.append((child, iter(comment['replies'])))
+
+class RichSink:
+    def print(self, *objects, **kwargs):
+        _rich_console.print(*objects, **kwargs)
+
+    def show_post(self, post_info, comments):
+        _rich_console.print(Panel(f"[bold]{post_info['title']}[/bold]\n\nAuteur: u/{post_info['author']}", title="Reddit Post"))
+
+        if post_info['text']:
+            _rich_console.print(Panel(Markdown(post_info['text']), title="Bericht"))
+
+        if post_info['media']:
+            _rich_console.print(f"[bold green]Media gevonden:[/bold green] {post_info['media']}")
+
+        _rich_console.print("\n[bold]Reacties (inclusief sub-reacties):[/bold]")
+
+        # Alleen voor deze weergave wordt de geneste boom uit de reactiespool opgebouwd
+        root = Tree("Reacties")
+        add_comments_to_tree(root, comments.build_tree())
+        _rich_console.print(root)
+
+        _rich_console.print("\n")
+
+class PlainSink:
+    """Tekstregels met tijdstip; rich-opmaak wordt verwijderd, panelen en bomen worden niet opgebouwd."""
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def print(self, *objects, **kwargs):
+        parts = []
+        for obj in objects:
+            if isinstance(obj, str):
+                parts.append(Text.from_markup(obj).plain.strip())
+            # Andere renderables (Panel, Tree) worden overgeslagen
+        line = ' '.join(p for p in parts if p)
+        if not line:
+            return
+        with self.lock:
+            sys.stdout.write(f"[{datetime.now().strftime('%H:%M:%S')}] {line}\n")
+            sys.stdout.flush()
+
+    def show_post(self, post_info, comments):
+        media = f", media: {post_info['media_type']}" if post_info.get('media_url') else ""
+        self.print(f"Bericht: {escape(post_info['title'])} (u/{escape(str(post_info['author']))}, {len(comments)} reacties{media})")
+
+class NullSink:
+    def print(self, *objects, **kwargs):
+        pass
+
+    def show_post(self, post_info, comments):
+        pass
+
+_sinks = {'rich': RichSink(), 'plain': PlainSink(), 'none': NullSink()}
+_mode = 'rich'
+# Modus binnen één taak (job_manager), zodat gelijktijdige runs elkaars modus niet terugzetten
+_task_mode = contextvars.ContextVar('output_mode', default=None)
+
+def _check_mode(mode):
+    if mode not in OUTPUT_MODES:
+        raise ValueError(f"Onbekende uitvoermodus: {mode} (kies uit {', '.join(OUTPUT_MODES)})")
+
+def set_mode(mode):
+    """Kies de uitvoermodus. Retourneert de vorige modus."""
+    global _mode
+    _check_mode(mode)
+    previous = _mode
+    _mode = mode
+    return previous
+
+def use_mode(mode):
+    """Kies de uitvoermodus voor de huidige taak en de threads die deze start. Retourneert een token voor reset_mode."""
+    _check_mode(mode)
+    return _task_mode.set(mode)
+
+def reset_mode(token):
+    _task_mode.reset(token)
+
+def get_mode():
+    return _task_mode.get() or _mode
+
+def show_post(post_info, comments):
+    _sinks[get_mode()].show_post(post_info, comments)
+
+class SinkConsole:
+    """
+    Vervanger voor rich.Console in scraper.py: print() gaat naar de actieve
+    uitvoermodus, invoer (input) blijft via rich lopen.
+    """
+    def print(self, *objects, **kwargs):
+        _sinks[get_mode()].print(*objects, **kwargs)
+
+    def input(self, *args, **kwargs):
+        return _rich_console.input(*args, **kwargs)
+
+console = SinkConsole()
@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import time
+
+import database
+import job_manager
+
+EXPORTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exports')
+# Berichten per pagina in het overzicht van /subreddit/<naam>
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+SORT_OPTIONS = tuple(database.POST_INDEX_SORTS)
+
+def count_comments(comments):
+    count = 0
+    stack = list(comments)
+    while stack:
+        comment = stack.pop()
+        count += 1
+        stack.extend(comment.get('replies', []))
+    return count
+
+def add(subreddit_dir, base_path, post_info, comment_count):
+    """Neem een zojuist geëxporteerd bericht op in de index (aangeroepen door scraper.export_data)."""
+    database.index_post(
+        subreddit_dir, os.path.basename(base_path), post_info.get('id'), post_info.get('title'),
+        post_info.get('author'), post_info.get('created_utc'), post_info.get('media_type'),
+        comment_count, time.time()
+    )
+
+def find_folder(subreddit_dir, post_id):
+    """Map waarin dit bericht al staat, zonder de JSON-bestanden van alle mappen te openen."""
+    folder = database.get_indexed_folder(subreddit_dir, post_id)
+    if folder and os.path.isdir(os.path.join(EXPORTS_DIR, subreddit_dir, folder)):
+        return folder
+    return None
+
+def read_folder(folder_path):
+    """Lees de indexgegevens uit de bericht-JSON in een map, of None."""
+    json_files = sorted(f for f in os.listdir(folder_path) if f.endswith('.json'))
+    if not json_files:
+        return None
+    with open(os.path.join(folder_path, json_files[0]), 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    post = data.get('post', {})
+    return (
+        os.path.basename(folder_path), post.get('id'), post.get('title'), post.get('author'),
+        post.get('created_utc'), post.get('media_type'), count_comments(data.get('comments', [])),
+        os.path.getmtime(folder_path)
+    )
+
+def rebuild(subreddit_dir, status_callback=None):
+    """
+    Bouw de index van een subreddit opnieuw op vanuit de mappen op schijf
+    (voor exports van vóór de index). Retourneert het aantal geïndexeerde berichten,
+    of None als de taak is gestopt (de bestaande index blijft dan staan).
+    """
+    subreddit_path = os.path.join(EXPORTS_DIR, subreddit_dir)
+    started_at = time.time()
+    rows = []
+    with os.scandir(subreddit_path) as entries:
+        for entry in entries:
+            if job_manager.cancelled():
+                return None
+            if not entry.is_dir() or entry.name.startswith('.'):
+                continue
+            try:
+                row = read_folder(entry.path)
+            except Exception as e:
+                print(f"Kon {entry.name} niet indexeren: {e}")
+                continue
+            if row:
+                rows.append(row)
+                job_manager.count('folders')
+                if status_callback and len(rows) % 1000 == 0:
+                    status_callback(f"[{subreddit_dir}] {len(rows)} mappen geïndexeerd...")
+    database.replace_post_index(subreddit_dir, rows, started_at)
+    if status_callback:
+        status_callback(f"[{subreddit_dir}] Index opgebouwd: {len(rows)} berichten.")
+    return len(rows)
+
+def page(subreddit_dir, page=1, per_page=PAGE_SIZE, sort='exported', order='desc', search=None, media_type=None):
+    """Eén pagina van het overzicht, met de gegevens voor paginering."""
+    per_page = max(1, min(MAX_PAGE_SIZE, int(per_page)))
+    sort = sort if sort in SORT_OPTIONS else 'exported'
+    descending = order != 'asc'
+    page = max(1, int(page))
+    total, posts = database.query_post_index(
+        subreddit_dir, sort, descending, search or None, media_type or None, per_page, (page - 1) * per_page
+    )
+    return {
+        'posts': posts,
+        'total': total,
+        'page': page,
+        'pages': max(1, (total + per_page - 1) // per_page),
+        'per_page': per_page,
+        'sort': sort,
+        'order': 'desc' if descending else 'asc',
+        'search': search or '',
+        'media_type': media_type or ''
+    }
+
+def main():
+    """
+    Gebruik: python post_index.py rebuild [subreddit ...]
+    Zonder subreddits worden alle mappen in exports/ verwerkt.
+    """
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print(main.__doc__.strip())
+        return
+
+    subreddits = sys.argv[2:]
+    if not subreddits and os.path.exists(EXPORTS_DIR):
+        subreddits = sorted(d for d in os.listdir(EXPORTS_DIR) if os.path.isdir(os.path.join(EXPORTS_DIR, d)) and not d.startswith('.'))
+
+    for sub in subreddits:
+        if os.path.isdir(os.path.join(EXPORTS_DIR, sub)):
+            print(f"{sub}: {rebuild(sub)} berichten geïndexeerd")
+
+if __name__ == "__main__":
+    database.init_db()
+    main()
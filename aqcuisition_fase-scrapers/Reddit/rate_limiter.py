@@ -0,0 +1,227 @@
+import hashlib
+import threading
+import time
+
+# Standaardbudget zolang Reddit nog geen X-Ratelimit headers heeft teruggestuurd
+DEFAULT_CAPACITY = 10
+DEFAULT_REFILL_PER_SECOND = 0.5
+# Wachttijd na een 429 zonder bruikbare headers
+DEFAULT_THROTTLE_SECONDS = 15
+
+class TokenBucket:
+    """
+    Token bucket voor één identiteit (cookie / Tor-circuit / directe verbinding).
+    Zolang er budget is wordt nooit gewacht. Zodra Reddit X-Ratelimit headers
+    meestuurt, volgt de bucket exact het door Reddit opgegeven venster.
+    """
+    def __init__(self):
+        now = time.monotonic()
+        self.capacity = DEFAULT_CAPACITY
+        self.tokens = float(DEFAULT_CAPACITY)
+        self.refill_rate = DEFAULT_REFILL_PER_SECOND
+        self.updated = now
+        # Tijdstip waarop Reddit het venster reset (None = geen headers ontvangen)
+        self.reset_at = None
+        self.blocked_until = 0.0
+        # Gereserveerde verzoeken waarvan de response nog niet binnen is
+        self.in_flight = 0
+
+        # Tellers voor het dashboard
+        self.requests = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.throttled = 0
+        self.remaining = None
+        self.used = None
+
+    def _refill(self, now):
+        if self.reset_at is not None:
+            # Venster van Reddit: volledig budget terug na de reset
+            if now >= self.reset_at:
+                self.tokens = float(self.capacity)
+                self.reset_at = None
+        else:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def reserve(self):
+        """Neem één token en retourneer het aantal seconden dat gewacht moet worden."""
+        now = time.monotonic()
+        self._refill(now)
+        self.requests += 1
+        self.tokens -= 1
+        self.in_flight += 1
+
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 0:
+            if self.reset_at is not None:
+                wait = max(wait, self.reset_at - now)
+            else:
+                wait = max(wait, -self.tokens / self.refill_rate)
+
+        if wait > 0:
+            self.waits += 1
+            self.wait_seconds += wait
+        return wait
+
+    def peek(self):
+        """Wachttijd voor het volgende verzoek en het huidige budget, zonder een token te nemen."""
+        now = time.monotonic()
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1:
+            if self.reset_at is not None:
+                wait = max(wait, self.reset_at - now)
+            else:
+                wait = max(wait, (1 - self.tokens) / self.refill_rate)
+        return wait, self.tokens
+
+    def release(self):
+        """Eén gereserveerd verzoek is afgehandeld (met of zonder response)."""
+        self.in_flight = max(0, self.in_flight - 1)
+
+    def update(self, remaining, reset_seconds, used=None):
+        """
+        Neem het budget over zoals opgegeven in de response headers. Verzoeken die nog
+        onderweg zijn telt Reddit nog niet mee; hun reservering blijft daarom staan.
+        """
+        now = time.monotonic()
+        self.remaining = remaining
+        self.used = used
+        if used is not None:
+            self.capacity = max(1, int(round(used + remaining)))
+        self.tokens = float(remaining) - self.in_flight
+        self.reset_at = now + reset_seconds
+        self.updated = now
+
+    def block(self, seconds):
+        """Blokkeer deze identiteit (na een 429) tot het venster voorbij is."""
+        self.throttled += 1
+        self.tokens = min(self.tokens, 0.0)
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            'tokens': round(max(self.tokens, 0.0), 1),
+            'capacity': self.capacity,
+            'remaining': self.remaining,
+            'used': self.used,
+            'reset_in': round(max(0.0, self.reset_at - now), 1) if self.reset_at else None,
+            'blocked_for': round(max(0.0, self.blocked_until - now), 1),
+            'in_flight': self.in_flight,
+            'requests': self.requests,
+            'waits': self.waits,
+            'wait_seconds': round(self.wait_seconds, 1),
+            'throttled': self.throttled
+        }
+
+_buckets = {}
+_lock = threading.Lock()
+
+def identity_key(proxy=None, cookie=None):
+    """
+    Bepaal de sleutel van een identiteit. De cookie wordt gehasht zodat
+    deze niet in het dashboard of de logs terechtkomt.
+    """
+    key = proxy or 'direct'
+    if cookie:
+        key += '|' + hashlib.sha1(cookie.encode('utf-8')).hexdigest()[:8]
+    return key
+
+def _get_bucket(identity):
+    bucket = _buckets.get(identity)
+    if bucket is None:
+        bucket = TokenBucket()
+        _buckets[identity] = bucket
+    return bucket
+
+def _parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def reserve(identity):
+    """Reserveer een verzoek voor deze identiteit; retourneert de wachttijd in seconden."""
+    with _lock:
+        return _get_bucket(identity).reserve()
+
+def peek(identity):
+    """Retourneer (wachttijd, tokens) voor deze identiteit zonder budget te reserveren."""
+    with _lock:
+        return _get_bucket(identity).peek()
+
+def acquire(identity, should_stop=None, on_wait=None):
+    """
+    Blokkerende variant van reserve. Wacht in stappen van maximaal één seconde
+    zodat should_stop() (bijv. scraper.stop_requested) tussentijds wordt gecontroleerd.
+    Retourneert False indien gestopt (de reservering is dan al afgerond).
+    """
+    if sleep(reserve(identity), should_stop, on_wait):
+        return True
+    release(identity)
+    return False
+
+def sleep(wait, should_stop=None, on_wait=None):
+    """Wacht een gereserveerde wachttijd uit; retourneert False indien gestopt."""
+    if wait > 0 and on_wait:
+        on_wait(wait)
+    end = time.monotonic() + wait
+    while True:
+        if should_stop and should_stop():
+            return False
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            return True
+        time.sleep(min(1.0, remaining))
+
+def release(identity):
+    """Rond een reservering af zonder response (verbindingsfout, of gestopt voor het verzoek)."""
+    with _lock:
+        _get_bucket(identity).release()
+
+def update_from_headers(identity, headers):
+    """
+    Verwerk de response van een gereserveerd verzoek: de reservering wordt afgerond
+    en X-Ratelimit-Remaining / -Reset / -Used worden overgenomen.
+    """
+    remaining = _parse_float(headers.get('X-Ratelimit-Remaining'))
+    reset = _parse_float(headers.get('X-Ratelimit-Reset'))
+    used = _parse_float(headers.get('X-Ratelimit-Used'))
+    with _lock:
+        bucket = _get_bucket(identity)
+        bucket.release()
+        if remaining is not None and reset is not None:
+            bucket.update(remaining, reset, used)
+
+def record_throttle(identity, headers=None):
+    """
+    Verwerk een 429: de identiteit wordt geblokkeerd tot de reset die Reddit opgeeft
+    (X-Ratelimit-Reset of Retry-After). Retourneert de wachttijd in seconden.
+    """
+    seconds = None
+    if headers is not None:
+        seconds = _parse_float(headers.get('X-Ratelimit-Reset'))
+        if seconds is None:
+            seconds = _parse_float(headers.get('Retry-After'))
+    if seconds is None or seconds <= 0:
+        seconds = DEFAULT_THROTTLE_SECONDS
+    with _lock:
+        _get_bucket(identity).block(seconds)
+    return seconds
+
+def reset(identity):
+    """Herstel het budget van een identiteit (bijv. na een nieuw Tor-circuit); tellers blijven behouden."""
+    with _lock:
+        bucket = _buckets.get(identity)
+        if bucket:
+            bucket.tokens = float(bucket.capacity)
+            bucket.reset_at = None
+            bucket.blocked_until = 0.0
+            bucket.updated = time.monotonic()
+
+def get_stats():
+    """Tellers per identiteit voor het dashboard."""
+    with _lock:
+        return {identity: bucket.stats() for identity, bucket in _buckets.items()}
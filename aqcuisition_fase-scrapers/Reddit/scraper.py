@@ -1,22 +1,16 @@
 import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-import urllib.parse
 import json
 import sys
 import os
 import re
 import time
 import csv
-import yt_dlp
-import static_ffmpeg
+import io
+import tempfile
+import threading
+import atexit
 import uuid
 from datetime import datetime
-from rich.console import Console
-from rich.markdown import Markdown
-from rich.panel import Panel
-from rich.tree import Tree
-from rich.markup import escape
 from rich.prompt import Confirm
 
 import random
@@ -26,9 +20,28 @@ from stem.control import Controller
 from stem.process import launch_tor_with_config
 import shutil
 import database  # Lokale database module
+import session_pool  # Gedeelde HTTP-sessies
+import rate_limiter  # Verzoekbudget per identiteit
+import identity_pool  # Verdeling van verzoeken over identiteiten
+import master_store  # Append-only JSON-archief per subreddit
+import csv_exporter  # Gebufferde CSV-export per subreddit
+import media_queue  # Mediadownloads op de achtergrond
+import media_store  # Gedeelde mediaopslag met deduplicatie
+import video_download  # yt-dlp-downloads (ook in de videoprocessen van media_queue)
+import comment_expander  # Volledige, hervatbare reactiebomen
+import output_sink  # Uitvoer: rich, platte logregels of niets
+import post_index  # Overzicht van geëxporteerde berichten
+import job_manager  # Stopsignaal en voortgang per achtergrondtaak
 import psutil
 
-console = Console()
+# Gedeelde modules (../shared)
+_shared_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _shared_parent not in sys.path:
+    sys.path.append(_shared_parent)
+from shared.matcher import get_matcher  # Alle zoekwoorden in één doorgang
+
+# Alle uitvoer loopt via de actieve sink (zie output_sink.set_mode)
+console = output_sink.console
 
 def get_memory_usage():
     """Retourneert het actuele geheugengebruik in MB"""
@@ -36,9 +49,13 @@ def get_memory_usage():
     mem = process.memory_info().rss / 1024 / 1024
     return f"{mem:.2f} MB"
 
-# Globale variabele voor stop-signaal
+# Globale variabele voor stop-signaal (CLI); taken uit de webinterface hebben een eigen stopsignaal
 STOP_REQUESTED = False
 
+def stop_requested():
+    """True bij het globale stopsignaal of wanneer de huidige taak (job_manager) is gestopt."""
+    return STOP_REQUESTED or job_manager.cancelled()
+
 # Tor configuratie
 TOR_PROXY = None
 USE_TOR = False
@@ -47,6 +64,20 @@ TOR_CONTROL_PORT = 9053
 TOR_SOCKS_PORT = 9052
 TOR_PROCESS = None
 
+# Optionele extra uitvoer: Parquet-datasets per subreddit in exports/<sub>/parquet (vereist pyarrow)
+PARQUET_EXPORT = False
+
+# Stop met pagineren na zoveel volledig bekende lijstpagina's achter elkaar (0 = nooit)
+MAX_FULLY_SEEN_PAGES = 0
+
+# 'more'-stubs in reactiebomen uitvouwen via /api/morechildren
+EXPAND_MORE_COMMENTS = True
+# Maximaal aantal reacties per bericht (0 = onbeperkt)
+MAX_COMMENTS = 0
+
+# Uitvoermodus voor run_scraper_headless (webinterface): 'rich', 'plain' of 'none'
+HEADLESS_OUTPUT_MODE = 'plain'
+
 # Initialiseer de database bij het laden
 database.init_db()
 
@@ -80,7 +111,8 @@ def start_tor_service():
     try:
         # Configuratie voor Tor
         config = {
-            'SocksPort': str(TOR_SOCKS_PORT),
+            # Elke combinatie van SOCKS-inloggegevens krijgt een eigen circuit (zie identity_pool)
+            'SocksPort': f"{TOR_SOCKS_PORT} IsolateSOCKSAuth",
             'ControlPort': str(TOR_CONTROL_PORT),
             'DataDirectory': tor_data_dir,
             'CookieAuthentication': '1',
@@ -222,10 +254,23 @@ def renew_tor_identity():
         return False
 
 # Initialiseer ffmpeg voor videoverwerking
-try:
-    static_ffmpeg.add_paths()
-except Exception as e:
-    console.print(f"[yellow]Waarschuwing: Kon videobewerkingstool niet starten: {e}[/yellow]")
+video_download.ensure_ffmpeg()
+
+def get_current_proxy():
+    """
+    Retourneer de Tor-proxy indien actief (None = directe verbinding).
+    Een taak die zonder Tor is gestart verbindt altijd direct, ook als Tor voor een andere taak draait.
+    """
+    job = job_manager.current_job()
+    if job is not None and not job.params.get('use_tor'):
+        return None
+    return TOR_PROXY if USE_TOR else None
+
+def ensure_tor_service():
+    """Start Tor alleen als deze nog niet draait, zodat lopende taken hun circuits behouden."""
+    if USE_TOR and TOR_PROXY and (TOR_PROCESS is None or TOR_PROCESS.poll() is None):
+        return True
+    return start_tor_service()
 
 def get_random_headers():
     """
@@ -253,19 +298,11 @@ def get_random_headers():
         'Referer': 'https://www.google.com/' # Simuleer Google als referer
     }
 
-def get_reddit_data(url, status_callback=None, reddit_cookie=None):
+def ensure_json_url(url):
     """
-    Haal gegevens op van de opgegeven Reddit-URL.
-    Voegt .json toe voor de scraper.
-    Implementeert herhalingsmechanisme bij fouten.
-    Specifieke afhandeling voor 429 (Rate Limit) fouten.
+    Zorg voor .json suffix in URL.
+    Parameters dienen behouden te blijven.
     """
-    global STOP_REQUESTED
-    if STOP_REQUESTED:
-        return None
-
-    # Zorg voor .json suffix in URL
-    # Parameters dienen behouden te blijven
     if '.json' not in url.split('?')[0]:
         if '?' in url:
             base, query = url.split('?', 1)
@@ -276,123 +313,73 @@ def get_reddit_data(url, status_callback=None, reddit_cookie=None):
             if url.endswith('/'):
                 url = url[:-1]
             url = f"{url}.json"
-            
-    # Start sessie
-    session = requests.Session()
-    headers = get_random_headers()
-    
-    # Voeg cookie toe indien beschikbaar
-    if reddit_cookie:
-        headers['Cookie'] = f"reddit_session={reddit_cookie}"
-    
-    # Configureer Tor indien actief
-    if USE_TOR:
-        session.proxies = {
-            'http': TOR_PROXY,
-            'https': TOR_PROXY
-        }
+    return url
+
+def get_reddit_data(url, status_callback=None, reddit_cookie=None):
+    """
+    Haal gegevens op van de opgegeven Reddit-URL.
+    Voegt .json toe voor de scraper.
+    Implementeert herhalingsmechanisme bij fouten.
+    Specifieke afhandeling voor 429 (Rate Limit) fouten.
+    """
+    if stop_requested():
+        return None
+
+    url = ensure_json_url(url)
+
+    # Pool van identiteiten: Tor-circuits en/of directe verbinding, per cookie
+    pool = identity_pool.get_pool(get_current_proxy(), reddit_cookie)
     
-    # Configureer retry strategie
-    retry = Retry(
-        total=3,
-        backoff_factor=1,
-        status_forcelist=[500, 502, 503, 504], # 429 wordt handmatig afgehandeld
-        allowed_methods=["GET"]
-    )
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount("https://", adapter)
-    session.mount("http://", adapter)
+    def announce_wait(seconds):
+        if seconds >= 5:
+            msg = f"Verzoekbudget op. Wachten tot reset: {int(seconds)} seconden..."
+            console.print(f"[yellow]{msg}[/yellow]")
+            if status_callback: status_callback(msg)
 
     # Handmatige herhalingslus
     max_manual_retries = 20
     for attempt in range(max_manual_retries):
-        if STOP_REQUESTED:
+        if stop_requested():
             return None
             
         try:
-            # Willekeurige vertraging
-            base_delay = random.uniform(1.0, 3.0)
-            if attempt > 5:
-                base_delay += (attempt - 5) * 2
-            
-            time.sleep(base_delay)
+            # Identiteit met het meeste resterende budget; alleen wachten als alle identiteiten op zijn
+            identity = pool.acquire(should_stop=stop_requested, on_wait=announce_wait)
+            if identity is None:
+                return None
+
+            # Gedeelde sessie (connection pool) per identiteit
+            session = session_pool.get_session(identity.proxy)
+            headers = get_random_headers()
+            if identity.cookie:
+                headers['Cookie'] = f"reddit_session={identity.cookie}"
             
-            response = session.get(url, headers=headers, timeout=30)
+            try:
+                response = session.get(url, headers=headers, timeout=30)
+            except Exception:
+                # Geen response: de reservering vervalt zonder nieuwe budgetgegevens
+                rate_limiter.release(identity.key)
+                raise
+            rate_limiter.update_from_headers(identity.key, response.headers)
             
             # Controleer op 429 (Too Many Requests)
             if response.status_code == 429:
-                # Probeer nieuwe identiteit via Tor
-                if attempt < 3:
-                    msg = f"Toegang beperkt (429). Nieuw IP-adres wordt aangevraagd..."
-                    console.print(f"[yellow]{msg}[/yellow]")
-                    if status_callback: status_callback(msg)
-                    
-                    if USE_TOR:
-                        ip_changed = renew_tor_identity()
-                        if not ip_changed:
-                             console.print("[red]IP-wissel mislukt, overschakelen op wachttijd...[/red]")
-                             
-                             wait_time = 60 * (attempt + 1)
-                             for remaining in range(wait_time, 0, -1):
-                                if STOP_REQUESTED: return None
-                                if remaining % 10 == 0: console.print(f"[yellow]Wachten... {remaining}[/yellow]")
-                                time.sleep(1)
-                             continue
-
-                    else:
-                        msg = "429 Fout! Wijzig VPN-server of wacht 10s..."
-                        console.print(f"[bold red]{msg}[/bold red]")
-                        if status_callback: status_callback(msg)
-                        
-                        for i in range(10, 0, -1):
-                            if STOP_REQUESTED: return None
-                            if i % 2 == 0: console.print(f"[dim]Wachten... {i}[/dim]")
-                            time.sleep(1)
-                            
-                        session = requests.Session()
-                        headers = get_random_headers()
-                        if reddit_cookie:
-                            headers['Cookie'] = f"reddit_session={reddit_cookie}"
-                        continue
-                    
-                    # Reset sessie
-                    headers = get_random_headers()
-                    if reddit_cookie:
-                        headers['Cookie'] = f"reddit_session={reddit_cookie}"
-                        
-                    session = requests.Session()
-                    
-                    if USE_TOR:
-                        session.close()
-                        session = requests.Session()
-                        session.proxies = {
-                            'http': TOR_PROXY,
-                            'https': TOR_PROXY
-                        }
-                    
-                    adapter = HTTPAdapter(max_retries=retry)
-                    session.mount("https://", adapter)
-                    session.mount("http://", adapter)
-                    
-                    time.sleep(random.uniform(5.0, 10.0))
-                    continue
-                
-                # Lange wachttijd bij aanhoudende fouten
-                wait_time = 15
-                if USE_TOR:
-                    wait_time = 60 * (attempt + 1)
-                
-                for remaining in range(wait_time, 0, -1):
-                    if STOP_REQUESTED: return None
-                    msg = f"Toegang geweigerd (429). Wachttijd resterend: {remaining} seconden..."
-                    if remaining % 10 == 0 or remaining == wait_time:
-                        console.print(f"[yellow]{msg}[/yellow]")
-                    
-                    if status_callback: status_callback(msg)
-                    time.sleep(1)
+                # Nieuw Tor-circuit of quarantaine; het volgende verzoek gaat naar een andere identiteit
+                quarantine = identity_pool.report_throttle(identity, response.headers)
+                job_manager.count('throttled')
+                if quarantine:
+                    msg = f"Toegang geweigerd (429) via {identity.name}. Identiteit {int(quarantine)} seconden in quarantaine..."
+                    if not identity.tor_proxy:
+                        msg += " (wijzig eventueel van VPN-server)"
+                else:
+                    msg = f"Toegang beperkt (429) via {identity.name}. Nieuw Tor-circuit wordt gebruikt..."
+                console.print(f"[yellow]{msg}[/yellow]")
+                if status_callback: status_callback(msg)
                 continue
                 
             response.raise_for_status()
+            identity_pool.report_success(identity)
+            job_manager.count('requests')
             return response.json()
             
         except Exception as e:
@@ -502,73 +489,27 @@ def sanitize_filename(name):
     name = re.sub(r'_{2,}', '_', name)
     return name[:100]
 
-def download_video_with_ytdlp(url, folder, prefix=""):
-    """
-    Download video inclusief audio via 'yt-dlp'.
-    """
-    try:
-        unique_id = str(uuid.uuid4())
-        
-        ydl_opts = {
-            'outtmpl': os.path.join(folder, f'{prefix}_%(title)s_{unique_id}.%(ext)s'),
-            'format': 'bestvideo+bestaudio/best',
-            'quiet': True,
-            'no_warnings': True,
-            'ignoreerrors': True,
-            'merge_output_format': 'mp4',
-            'postprocessor_args': {'merger': ['-c:a', 'aac']},
-        }
-        
-        if prefix:
-             ydl_opts['outtmpl'] = os.path.join(folder, f'{prefix}_video_{unique_id}.%(ext)s')
-
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
-        return True
-    except Exception as e:
-        console.print(f"[red]Fout bij downloaden video: {e}[/red]")
-        return False
+# Videodownloads staan in video_download.py (zonder bijwerkingen bij importeren)
+download_video_with_ytdlp = video_download.download_video_with_ytdlp
 
 def download_file(url, folder, prefix=""):
     """
-    Download een individueel bestand en sla het op.
+    Download een individueel bestand via de gedeelde mediaopslag.
+    Een URL of inhoud die al eerder is opgehaald wordt alleen gekoppeld (hardlink).
     """
     try:
-        filename = url.split('/')[-1].split('?')[0]
-        if not filename:
-            filename = "downloaded_file"
-        
-        name, ext = os.path.splitext(filename)
-        if not ext:
-            ext = ".bin"
-            
-        unique_filename = f"{name}_{uuid.uuid4()}{ext}"
-        
-        if prefix:
-            unique_filename = f"{prefix}_{unique_filename}"
-            
-        filepath = os.path.join(folder, unique_filename)
-        
-        if os.path.exists(filepath):
-            return filepath
-
-        with requests.get(url, stream=True) as r:
-            r.raise_for_status()
-            with open(filepath, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    f.write(chunk)
-        return filepath
+        return media_store.fetch(url, folder, prefix)
     except Exception as e:
         console.print(f"[red]Kon bestand niet downloaden {url}: {e}[/red]")
         return None
 
 def flatten_comments(comments, post_info):
     """
-    Converteer geneste reactiestructuur naar een platte lijst voor exportdoeleinden.
+    Zet de reacties om naar CSV-rijen, één voor één.
+    comments is de CommentExpander van het bericht: platte records uit de spool, ouders vóór antwoorden.
     """
-    flattened = []
     for comment in comments:
-        flattened.append({
+        yield {
             'type': 'comment',
             'subreddit': post_info['subreddit'],
             'post_id': post_info['id'],
@@ -578,31 +519,21 @@ def flatten_comments(comments, post_info):
             'author': comment['author'],
             'content': comment['body'],
             'created_utc': comment['created_utc'],
-            'date': datetime.fromtimestamp(comment['created_utc']).strftime('%Y-%m-%d %H:%M:%S') if comment['created_utc'] else '',
+            'date': csv_exporter.format_timestamp(comment['created_utc']),
             'media_url': '',
             'permalink': '' 
-        })
-        if comment['replies']:
-            flattened.extend(flatten_comments(comment['replies'], post_info))
-    return flattened
+        }
 
 def append_to_master_csv(post_info, comments):
     """
     Exporteer bericht en reacties naar geaggregeerd CSV-bestand in de subreddit-map.
+    Rijen worden gebufferd door de exporter van de subreddit (zie csv_exporter) en
+    per FLUSH_ROWS aangeboden, zodat een groot bericht nooit in zijn geheel in het geheugen staat.
     """
     subreddit_dir_name = sanitize_filename(post_info['subreddit'])
     
     script_dir = os.path.dirname(os.path.abspath(__file__))
     exports_dir = os.path.join(script_dir, 'exports', subreddit_dir_name)
-    os.makedirs(exports_dir, exist_ok=True)
-    csv_path = os.path.join(exports_dir, 'all_data.csv')
-    
-    file_exists = os.path.exists(csv_path)
-    
-    fieldnames = [
-        'type', 'subreddit', 'post_id', 'post_title', 'id', 'parent_id', 
-        'author', 'content', 'created_utc', 'date', 'media_url', 'permalink'
-    ]
     
     rows = []
     
@@ -617,67 +548,148 @@ def append_to_master_csv(post_info, comments):
         'author': post_info['author'],
         'content': post_info['text'],
         'created_utc': post_info['created_utc'],
-        'date': datetime.fromtimestamp(post_info['created_utc']).strftime('%Y-%m-%d %H:%M:%S') if post_info['created_utc'] else '',
+        'date': csv_exporter.format_timestamp(post_info['created_utc']),
         'media_url': post_info['media_url'] if isinstance(post_info['media_url'], str) else str(post_info['media_url']),
         'permalink': f"https://www.reddit.com{post_info['original_url']}"
     })
     
-    # Voeg reacties toe
-    rows.extend(flatten_comments(comments, post_info))
-    
     try:
-        with open(csv_path, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            if not file_exists:
-                writer.writeheader()
-            writer.writerows(rows)
-        console.print(f"[green]✓ Data toegevoegd aan {csv_path}[/green]")
+        exporter = csv_exporter.get_exporter(exports_dir)
+        # Voeg reacties toe
+        for row in flatten_comments(comments, post_info):
+            rows.append(row)
+            if len(rows) >= csv_exporter.FLUSH_ROWS:
+                exporter.add_rows(rows)
+                rows = []
+        exporter.add_rows(rows)
+        console.print(f"[green]✓ Data toegevoegd aan {exporter.path}[/green]")
     except Exception as e:
         console.print(f"[red]Fout bij schrijven naar CSV: {e}[/red]")
 
 def append_to_master_json(post_info, comments):
     """
     Voeg bericht en reacties toe aan het JSON-archief van de subreddit.
+    Het archief is append-only (JSONL); een bestaand bericht krijgt een nieuwe versie.
+    De regel wordt vanuit de reactiespool naar een tijdelijk bestand geschreven en daarna
+    in het archief gekopieerd, zodat de reactieboom niet in het geheugen wordt opgebouwd.
     """
     subreddit_dir_name = sanitize_filename(post_info['subreddit'])
     script_dir = os.path.dirname(os.path.abspath(__file__))
     exports_dir = os.path.join(script_dir, 'exports', subreddit_dir_name)
-    os.makedirs(exports_dir, exist_ok=True)
-    json_path = os.path.join(exports_dir, 'all_data.json')
     
-    all_data = []
-    if os.path.exists(json_path):
-        try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                all_data = json.load(f)
-        except Exception as e:
-            console.print(f"[red]Kon bestaande JSON niet lezen: {e}, nieuw bestand wordt aangemaakt.[/red]")
-            all_data = []
+    try:
+        with io.TextIOWrapper(tempfile.TemporaryFile(), encoding='utf-8', newline='') as line:
+            write_post_json(line, post_info, comments, scraped_at=datetime.now().isoformat())
+            line.write('\n')
+            line.flush()
+            master_store.get_store(exports_dir).upsert_from(post_info['id'], line.buffer)
+        console.print(f"[green]✓ Data toegevoegd aan {os.path.join(exports_dir, master_store.ARCHIVE_FILE)}[/green]")
+    except Exception as e:
+        console.print(f"[red]Fout bij schrijven naar JSON: {e}[/red]")
 
-    new_entry = {
-        'post': post_info,
-        'comments': comments,
-        'scraped_at': datetime.now().isoformat()
-    }
+_parquet_writers = {}
+_parquet_lock = threading.Lock()
+
+def append_to_parquet(post_info, comments):
+    """
+    Schrijf bericht en reacties naar de kolomgeoriënteerde datasets van de subreddit.
+    Rijen worden per row group weggeschreven; zie shared/columnar.py.
+    """
+    shared_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if shared_parent not in sys.path:
+        sys.path.append(shared_parent)
+    from shared import columnar
     
-    # Voorkom duplicaten
-    post_id = post_info['id']
-    exists = False
-    for i, entry in enumerate(all_data):
-        if entry['post']['id'] == post_id:
-            all_data[i] = new_entry
-            exists = True
-            break
-            
-    if not exists:
-        all_data.append(new_entry)
+    subreddit_dir_name = sanitize_filename(post_info['subreddit'])
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parquet_dir = os.path.join(script_dir, 'exports', subreddit_dir_name, 'parquet')
+    post_row = columnar.reddit_row({'post': post_info, 'scraped_at': datetime.now().isoformat()})
+    post_row['num_comments'] = len(comments)
     
     try:
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(all_data, f, indent=4, ensure_ascii=False)
-        console.print(f"[green]✓ Data toegevoegd aan {json_path}[/green]")
+        with _parquet_lock:
+            writers = _parquet_writers.get(subreddit_dir_name)
+            if writers is None:
+                writers = (
+                    columnar.ColumnarWriter('reddit', os.path.join(parquet_dir, 'posts')),
+                    columnar.ColumnarWriter('reddit_comments', os.path.join(parquet_dir, 'comments'))
+                )
+                _parquet_writers[subreddit_dir_name] = writers
+            post_writer, comment_writer = writers
+            post_writer.add_row(post_row)
+            # Reacties rechtstreeks uit de spool; de diepte staat al in elk record
+            for comment in comments:
+                comment_writer.add_row(columnar.reddit_comment_row(post_info, comment, comment['depth']))
     except Exception as e:
-        console.print(f"[red]Fout bij schrijven naar JSON: {e}[/red]")
+        console.print(f"[red]Fout bij schrijven naar Parquet: {e}[/red]")
+
+def close_parquet_writers():
+    """Sluit de Parquet-bestanden van deze run af (laatste row group wegschrijven)."""
+    with _parquet_lock:
+        writers = list(_parquet_writers.values())
+        _parquet_writers.clear()
+    for post_writer, comment_writer in writers:
+        try:
+            post_writer.close()
+            comment_writer.close()
+        except Exception as e:
+            console.print(f"[red]Fout bij afsluiten Parquet-bestand: {e}[/red]")
+
+# Ook bij een onverwachte afsluiting de laatste row group en de footer wegschrijven
+atexit.register(close_parquet_writers)
+
+def write_post_json(f, post_info, comments, scraped_at=None, indent=None):
+    """
+    Schrijf {'post': ..., 'comments': [...], 'scraped_at': ...} naar het tekstbestand f,
+    gelijk aan json.dump met dezelfde indent. De geneste reacties komen rechtstreeks
+    uit de spool (CommentExpander.write_json); scraped_at wordt weggelaten als het None is.
+    """
+    if indent is None:
+        newline, sep = '', ', '
+    else:
+        newline, sep = '\n' + ' ' * indent, ','
+
+    def value(obj):
+        text = json.dumps(obj, indent=indent, ensure_ascii=False)
+        # Eén niveau dieper inspringen; nieuwe regels in strings zijn door json.dumps al geëscaped
+        return text if indent is None else text.replace('\n', newline)
+
+    f.write('{' + newline + '"post": ' + value(post_info) + sep + newline + '"comments": ')
+    comments.write_json(f, indent=indent, level=1)
+    if scraped_at is not None:
+        f.write(sep + newline + '"scraped_at": ' + value(scraped_at))
+    f.write(('' if indent is None else '\n') + '}')
+
+def queue_media_downloads(post_info, base_path):
+    """
+    Plaats de media van een bericht in de downloadwachtrij.
+    Retourneert het aantal geplaatste taken.
+    """
+    post_id = post_info.get('id')
+    media_type = post_info['media_type']
+    media_url = post_info['media_url']
+    jobs = []
+
+    if media_type == 'image':
+        jobs.append(('file', media_url, "img"))
+    elif media_type == 'video':
+        video_target_url = post_info.get('original_url')
+        if video_target_url:
+            # Video met geluid: samenvoegen via yt-dlp/ffmpeg
+            jobs.append(('video', f"https://www.reddit.com{video_target_url}", "vid"))
+        else:
+            jobs.append(('file', media_url, "vid"))
+    elif media_type == 'youtube':
+        jobs.append(('video', media_url, "yt"))
+    elif media_type == 'gallery':
+        for i, img_url in enumerate(media_url):
+            jobs.append(('file', img_url, f"gallery_{i}"))
+    else:
+        console.print(f"[dim]Mediatype '{media_type}' wordt niet ondersteund.[/dim]")
+
+    for kind, url, prefix in jobs:
+        media_queue.enqueue(post_id, kind, url, base_path, prefix)
+    return len(jobs)
 
 def export_data(post_info, comments, folder_name=None):
     """
@@ -691,9 +703,14 @@ def export_data(post_info, comments, folder_name=None):
     script_dir = os.path.dirname(os.path.abspath(__file__))
     base_path = os.path.join(script_dir, 'exports', subreddit_dir, folder_name)
     
+    # Eerder geëxporteerd? De index kent de map, zonder alle naamgenoten te openen
+    known_folder = post_index.find_folder(subreddit_dir, post_info['id'])
+    if known_folder:
+        base_path = os.path.join(script_dir, 'exports', subreddit_dir, known_folder)
+    
     original_base_path = base_path
     counter = 1
-    while os.path.exists(base_path):
+    while not known_folder and os.path.exists(base_path):
         try:
             existing_files = [f for f in os.listdir(base_path) if f.endswith('.json')]
             if existing_files:
@@ -711,143 +728,63 @@ def export_data(post_info, comments, folder_name=None):
     
     console.print(f"[yellow]Exporteren naar: {base_path}[/yellow]")
     
-    # Opslaan als JSON
-    json_data = {
-        'post': post_info,
-        'comments': comments
-    }
-    
+    # Opslaan als JSON (geneste reacties rechtstreeks uit de spool)
     json_filename = f"data_{uuid.uuid4()}.json"
     json_path = os.path.join(base_path, json_filename)
     
     with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(json_data, f, indent=4, ensure_ascii=False)
+        write_post_json(f, post_info, comments, indent=4)
     console.print(f"[green]✓ Data opgeslagen in {json_filename}[/green]")
     
+    post_index.add(subreddit_dir, base_path, post_info, len(comments))
     append_to_master_csv(post_info, comments)
     append_to_master_json(post_info, comments)
+    if PARQUET_EXPORT:
+        append_to_parquet(post_info, comments)
     
-    # Download media
+    # Media wordt op de achtergrond gedownload (zie media_queue.py)
     if post_info['media_url']:
-        console.print("[yellow]Media downloaden...[/yellow]")
-        if post_info['media_type'] == 'image':
-            download_file(post_info['media_url'], base_path, prefix="img")
-            console.print(f"[green]✓ Afbeelding gedownload[/green]")
-        elif post_info['media_type'] == 'video':
-            video_target_url = post_info.get('original_url')
-            if video_target_url:
-                full_video_url = f"https://www.reddit.com{video_target_url}"
-                console.print(f"[yellow]Video downloaden met geluid...[/yellow]")
-                success = download_video_with_ytdlp(full_video_url, base_path, prefix="vid")
-                if success:
-                    console.print(f"[green]✓ Video gedownload[/green]")
-                else:
-                    console.print(f"[red]! Video download mislukt[/red]")
-            else:
-                download_file(post_info['media_url'], base_path, prefix="vid")
-                console.print(f"[green]✓ Video gedownload (mogelijk zonder geluid)[/green]")
-        
-        elif post_info['media_type'] == 'youtube':
-            console.print(f"[yellow]YouTube video downloaden...[/yellow]")
-            success = download_video_with_ytdlp(post_info['media_url'], base_path, prefix="yt")
-            if success:
-                console.print(f"[green]✓ YouTube video gedownload[/green]")
-            else:
-                console.print(f"[red]! YouTube download mislukt[/red]")
-                
-        elif post_info['media_type'] == 'gallery':
-            for i, img_url in enumerate(post_info['media_url']):
-                download_file(img_url, base_path, prefix=f"gallery_{i}")
-            console.print(f"[green]✓ {len(post_info['media_url'])} galerij-afbeeldingen gedownload[/green]")
-        else:
-            console.print(f"[dim]Mediatype '{post_info['media_type']}' wordt niet ondersteund.[/dim]")
+        queued = queue_media_downloads(post_info, base_path)
+        if queued:
+            console.print(f"[yellow]{queued} mediadownload(s) in wachtrij geplaatst[/yellow]")
 
     console.print(f"[bold green]Export voltooid![/bold green]")
 
-def parse_comments(children, limit=3, depth=0, max_depth=3):
+def load_post(data):
     """
-    Recursieve functie om reacties en sub-reacties te verwerken.
+    Lees het bericht en vouw de volledige reactieboom uit, inclusief 'more'-stubs
+    (zie comment_expander.py). Retourneert (post_info, comments), of None als de
+    data niet herkend wordt of de run gestopt is (het checkpoint blijft dan staan).
+    comments is de CommentExpander zelf: de reacties blijven in de spool tot
+    show_and_export_post() ze heeft weggeschreven en de spool opruimt.
     """
-    parsed_comments = []
-    
-    if depth > max_depth:
-        return parsed_comments
-
-    for child in children[:limit]:
-        if child['kind'] == 't1':
-            data = child['data']
-            author = data.get('author', 'Onbekend')
-            body = data.get('body', '')
-            created_utc = data.get('created_utc', 0)
-            comment_id = data.get('id', '')
-            parent_id = data.get('parent_id', '')
-            
-            replies_data = []
-            
-            replies = data.get('replies')
-            if isinstance(replies, dict):
-                replies_children = replies.get('data', {}).get('children', [])
-                if replies_children:
-                    replies_data = parse_comments(replies_children, limit=limit, depth=depth+1, max_depth=max_depth)
-            
-            parsed_comments.append({
-                'author': author, 
-                'body': body,
-                'created_utc': created_utc,
-                'id': comment_id,
-                'parent_id': parent_id,
-                'replies': replies_data
-            })
-            
-    return parsed_comments
+    if not (isinstance(data, list) and len(data) >= 2):
+        console.print("[red]Datastructuur niet herkend.[/red]")
+        return None
 
-def add_comments_to_tree(tree, comments):
-    """
-    Visualiseer reacties in een boomstructuur.
-    """
-    for comment in comments:
-        author = escape(f"u/{comment['author']}")
-        
-        from rich.console import Group
-        
-        comment_panel_content = Group(
-            Markdown(f"**{author}**"),
-            Markdown(comment['body'])
-        )
-        
-        branch = tree.add(Panel(comment_panel_content, expand=False))
-        
-        if comment['replies']:
-            add_comments_to_tree(branch, comment['replies'])
+    post_listing = data[0]['data']['children'][0]
+    comment_listing = data[1]
+    post_info = parse_post_content(post_listing)
 
-def process_post_data(data, auto_export=False):
+    children = comment_listing['data']['children']
+    expander = comment_expander.CommentExpander(
+        post_info['id'], get_reddit_data, should_stop=stop_requested, max_comments=MAX_COMMENTS
+    )
+    if not expander.run(children, expand_more=EXPAND_MORE_COMMENTS):
+        console.print("[yellow]Reacties niet volledig opgehaald (gestopt). Wordt bij de volgende run hervat.[/yellow]")
+        return None
+    if expander.missing:
+        console.print(f"[yellow]{expander.missing} reacties konden niet worden opgehaald.[/yellow]")
+    return post_info, expander
+
+def show_and_export_post(post_info, comments, auto_export=False):
     """
-    Verwerk en presenteer berichtgegevens.
+    Presenteer een ingelezen bericht en sla het op.
+    comments is de CommentExpander uit load_post(); de spool wordt daarna opgeruimd.
+    Retourneert True als het bericht is geëxporteerd.
     """
-    if isinstance(data, list) and len(data) >= 2:
-        post_listing = data[0]['data']['children'][0]
-        comment_listing = data[1]
-        
-        post_info = parse_post_content(post_listing)
-        
-        console.print(Panel(f"[bold]{post_info['title']}[/bold]\n\nAuteur: u/{post_info['author']}", title="Reddit Post"))
-        
-        if post_info['text']:
-            console.print(Panel(Markdown(post_info['text']), title="Bericht"))
-            
-        if post_info['media']:
-            console.print(f"[bold green]Media gevonden:[/bold green] {post_info['media']}")
-            
-        children = comment_listing['data']['children']
-        comments = parse_comments(children, limit=100, max_depth=10)
-        
-        console.print(f"\n[bold]Reacties (inclusief sub-reacties):[/bold]")
-        
-        root = Tree("Reacties")
-        add_comments_to_tree(root, comments)
-        console.print(root)
-        
-        console.print("\n")
+    try:
+        output_sink.show_post(post_info, comments)
         
         should_export = False
         if auto_export:
@@ -857,9 +794,22 @@ def process_post_data(data, auto_export=False):
             
         if should_export:
             export_data(post_info, comments)
-            
-    else:
-        console.print("[red]Datastructuur niet herkend.[/red]")
+            job_manager.count('posts')
+            return True
+        return False
+    finally:
+        comments.discard()
+
+def process_post_data(data, auto_export=False):
+    """
+    Verwerk en presenteer berichtgegevens.
+    Retourneert True als het bericht is geëxporteerd.
+    """
+    loaded = load_post(data)
+    if not loaded:
+        return False
+    post_info, comments = loaded
+    return show_and_export_post(post_info, comments, auto_export=auto_export)
 
 def load_keywords(csv_path):
     """
@@ -887,9 +837,157 @@ def normalize_reddit_url(input_str):
         return input_str
     return f"https://www.reddit.com/r/{input_str}"
 
-def run_scraper_headless(subreddits_list, limit=10, filter_date=False, start_ts=0, end_ts=0, keywords=None, status_callback=None, reddit_cookie=None, use_parallel=False):
+def select_unprocessed_posts(children, sub_name=None, status_callback=None):
+    """
+    Bepaal in één databasequery welke berichten (t3) van een lijstpagina nog niet verwerkt zijn.
+    Retourneert (nieuwe_berichten, reeds_gezien_ratio).
+    """
+    posts = [child for child in children if child['kind'] == 't3']
+    if not posts:
+        return [], 0.0
+    
+    new_ids = set(database.filter_unprocessed([child['data'].get('id') for child in posts]))
+    new_posts = [child for child in posts if child['data'].get('id') in new_ids]
+    seen_ratio = 1 - len(new_posts) / len(posts)
+    
+    msg = f"Pagina: {len(new_posts)}/{len(posts)} nieuw (reeds gezien: {seen_ratio:.0%})"
+    console.print(f"[dim]{msg}[/dim]")
+    if status_callback: status_callback(f"[{sub_name}] {msg}" if sub_name else msg)
+    return new_posts, seen_ratio
+
+def build_listing_url(base_url, after, batch_limit, keywords, filter_date, sort_new=False):
+    """
+    Stel de URL samen voor één lijstpagina van een subreddit.
+    Met sort_new wordt altijd op datum gesorteerd (nodig voor de incrementele modus).
+    """
+    current_url = base_url
+    params = []
+    
+    if sort_new and not keywords and '/new' not in current_url and '/search' not in current_url:
+        if current_url.endswith('/'):
+            current_url = current_url[:-1]
+        current_url += "/new"
+    
+    if keywords:
+        if '/search' not in current_url:
+                if current_url.endswith('/'):
+                    current_url += "search"
+                else:
+                    current_url += "/search"
+        
+        if '/new' not in current_url and '/search' not in current_url:
+                if current_url.endswith('/'):
+                    current_url = current_url[:-1]
+                current_url += "/new"
+    
+    elif filter_date:
+        if '/new' not in current_url and '/search' not in current_url:
+                if current_url.endswith('/'):
+                    current_url = current_url[:-1]
+                current_url += "/new"
+    
+    if sort_new and '/search' in current_url:
+        params.append("sort=new")
+    
+    if after:
+        params.append(f"after={after}")
+    
+    params.append(f"limit={batch_limit}")
+    
+    separator = '&' if '?' in current_url else '?'
+    return f"{current_url}{separator}{'&'.join(params)}"
+
+def advance_safe_mark(children, failed_ids, pending_ids, safe_mark):
+    """
+    Werk de kandidaat voor de nieuwe high-water mark bij na een (op datum gesorteerde) lijstpagina.
+    safe_mark is het nieuwste bericht waaronder alles tot de vorige mark is afgehandeld:
+    geëxporteerd, eerder verwerkt of door een filter overgeslagen. Na een mislukt bericht
+    (failed_ids) kan alleen een ouder, afgehandeld bericht nog de mark worden.
+    Berichten in pending_ids zijn niet meer bekeken (limiet of stop); daar stopt de telling.
+    Retourneert (created_utc, fullname) of None.
+    """
+    for child in children:
+        if child['kind'] != 't3':
+            continue
+        data = child['data']
+        post_id = data.get('id')
+        if post_id in pending_ids:
+            break
+        if post_id in failed_ids:
+            safe_mark = None
+        elif safe_mark is None:
+            safe_mark = (data.get('created_utc', 0), data.get('name'))
+    return safe_mark
+
+def split_at_high_water_mark(children, mark):
+    """
+    Knip een (op datum gesorteerde) lijstpagina af bij de high-water mark.
+    Retourneert (berichten nieuwer dan de mark, mark bereikt).
+    """
+    if not mark:
+        return children, False
+    mark_utc, mark_name = mark
+    newer = []
+    for child in children:
+        data = child.get('data', {})
+        if child['kind'] == 't3' and (data.get('name') == mark_name or data.get('created_utc', 0) <= mark_utc):
+            return newer, True
+        newer.append(child)
+    return newer, False
+
+def finish_incremental(sub_name, mark, safe_mark, covered):
+    """
+    Sla de nieuwe high-water mark op na een incrementele run.
+    Alleen als de lijst tot aan de oude mark is bekeken (of er nog geen mark was), en niet
+    verder dan safe_mark (zie advance_safe_mark): anders zou een gat ontstaan dat volgende runs overslaan.
+    """
+    if stop_requested():
+        return
+    if not safe_mark:
+        if covered:
+            console.print(f"[yellow]High-water mark van {sub_name} niet bijgewerkt: de oudste nieuwe berichten zijn niet verwerkt.[/yellow]")
+        return
+    if covered or mark is None:
+        database.update_high_water_mark(sub_name, *safe_mark)
+        console.print(f"[dim]High-water mark {sub_name}: {datetime.fromtimestamp(safe_mark[0]).strftime('%d-%m-%Y %H:%M')}[/dim]")
+    else:
+        console.print(f"[yellow]High-water mark van {sub_name} niet bijgewerkt: limiet bereikt voordat de vorige mark werd gepasseerd.[/yellow]")
+
+def check_post_filters(post_data_summary, filter_date, start_ts, end_ts, keywords):
+    """
+    Controleer datum- en zoekwoordfilters voor een bericht uit een lijstpagina.
+    Retourneert 'ok', 'skip' of 'stop' (startdatum gepasseerd).
+    """
+    title = post_data_summary.get('title', 'Onbekend')
+    selftext = post_data_summary.get('selftext', '')
+    created_utc = post_data_summary.get('created_utc', 0)
+    
+    if filter_date:
+        if created_utc < start_ts:
+            console.print(f"[yellow]Bericht van {datetime.fromtimestamp(created_utc).strftime('%d-%m-%Y')} bereikt (voor startdatum). Scraper wordt gestopt.[/yellow]")
+            return 'stop'
+        
+        if created_utc > end_ts:
+            return 'skip'
+    
+    if keywords:
+        matches = get_matcher(keywords).find_all(title + " " + selftext)
+        
+        if not matches:
+            short_title = (title[:40] + '..') if len(title) > 40 else title
+            console.print(f"[dim]Overgeslagen (geen match): {short_title}[/dim]")
+            return 'skip'
+        
+        console.print(f"[green]Match gevonden ({', '.join(matches[:3])}): {title}[/green]")
+    
+    return 'ok'
+
+def run_scraper_headless(subreddits_list, limit=10, filter_date=False, start_ts=0, end_ts=0, keywords=None, status_callback=None, reddit_cookie=None, use_parallel=False, output_mode=None, incremental=False, run_id=None):
     """
     Voert de scraper uit in 'headless' modus (zonder gebruikersinteractie).
+    Zonder output_mode wordt HEADLESS_OUTPUT_MODE gebruikt: geen panelen of reactiebomen.
+    Met incremental stopt de paginering bij het nieuwste bericht van de vorige run.
+    De voortgang wordt vastgelegd in het runjournaal; retourneert de run-ID (zie resume_run).
     """
     global STOP_REQUESTED
     STOP_REQUESTED = False
@@ -897,50 +995,109 @@ def run_scraper_headless(subreddits_list, limit=10, filter_date=False, start_ts=
     if keywords is None:
         keywords = []
 
+    if run_id is None:
+        run_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        # De cookie wordt bewust niet opgeslagen
+        database.create_run(run_id, {
+            'subreddits': list(subreddits_list), 'limit': limit, 'filter_date': filter_date,
+            'start_ts': start_ts, 'end_ts': end_ts, 'keywords': keywords,
+            'use_parallel': use_parallel, 'incremental': incremental
+        })
+    else:
+        database.set_run_status(run_id, 'running')
+    console.print(f"[dim]Run-ID: {run_id}[/dim]")
+    if status_callback: status_callback(f"Run-ID: {run_id}")
+
+    mode_token = output_sink.use_mode(output_mode or HEADLESS_OUTPUT_MODE)
+    try:
+        _run_headless(subreddits_list, limit, filter_date, start_ts, end_ts, keywords, status_callback, reddit_cookie, use_parallel, incremental, run_id)
+        unfinished = unfinished_subreddits(run_id, subreddits_list)
+        if stop_requested():
+            database.set_run_status(run_id, 'stopped')
+        elif unfinished:
+            # Bijv. een lijstpagina die niet kon worden opgehaald: de run blijft te hervatten
+            database.set_run_status(run_id, 'incomplete')
+            msg = f"Run {run_id} onvolledig: {', '.join(unfinished)} niet afgerond. Hervatten is mogelijk."
+            console.print(f"[yellow]{msg}[/yellow]")
+            if status_callback: status_callback(msg)
+        else:
+            database.set_run_status(run_id, 'finished')
+    except Exception:
+        database.set_run_status(run_id, 'failed')
+        raise
+    finally:
+        output_sink.reset_mode(mode_token)
+    return run_id
+
+def unfinished_subreddits(run_id, subreddits_list):
+    """Subreddits van een run die nog niet als afgerond in het runjournaal staan."""
+    names = [normalize_reddit_url(sub).split('/')[-1] for sub in subreddits_list]
+    return database.get_unfinished_subreddits(run_id, names)
+
+def resume_run(run_id, status_callback=None, reddit_cookie=None, output_mode=None):
+    """
+    Zet een onderbroken of onvolledige run voort met dezelfde instellingen. Per subreddit wordt
+    verdergegaan vanaf de laatst vastgelegde pagina of het historische venster.
+    """
+    run = database.get_run(run_id)
+    if not run:
+        msg = f"Run {run_id} niet gevonden."
+        console.print(f"[red]{msg}[/red]")
+        if status_callback: status_callback(msg)
+        return None
+    # Ook oudere runs die als 'finished' zijn vastgelegd terwijl een subreddit mislukte
+    if run['status'] == 'finished' and not unfinished_subreddits(run_id, run['params']['subreddits']):
+        msg = f"Run {run_id} is al voltooid."
+        console.print(f"[yellow]{msg}[/yellow]")
+        if status_callback: status_callback(msg)
+        return run_id
+
+    params = run['params']
+    return run_scraper_headless(
+        params['subreddits'], params['limit'], params['filter_date'], params['start_ts'], params['end_ts'],
+        params['keywords'], status_callback, reddit_cookie, params['use_parallel'], output_mode,
+        params['incremental'], run_id=run_id
+    )
+
+def _run_headless(subreddits_list, limit, filter_date, start_ts, end_ts, keywords, status_callback, reddit_cookie, use_parallel, incremental=False, run_id=None):
+
     target_urls = [normalize_reddit_url(sub) for sub in subreddits_list]
     total_targets = len(target_urls)
     
     console.print(f"[bold]Geheugenstatus bij start:[/bold] {get_memory_usage()}")
     
-    # === PARALLELLE IMPLEMENTATIE ===
+    # === PARALLELLE IMPLEMENTATIE (asyncio) ===
     if use_parallel and total_targets > 1:
-        import concurrent.futures
+        import async_crawler
         
-        max_workers = 3
-        console.print(f"[bold cyan]Starten met {max_workers} threads...[/bold cyan]")
+        console.print(f"[bold cyan]Starten met asynchrone verwerking van {total_targets} subreddits...[/bold cyan]")
+        async_crawler.run_async_crawl(target_urls, limit, filter_date, start_ts, end_ts, keywords, status_callback, reddit_cookie, incremental, run_id)
+        database.flush()
+        csv_exporter.flush_all()
+        close_parquet_writers()
         
-        def process_one_subreddit(base_url):
-            if STOP_REQUESTED: return
-            scrape_single_subreddit(base_url, limit, filter_date, start_ts, end_ts, keywords, status_callback, reddit_cookie)
-            
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(process_one_subreddit, url) for url in target_urls]
-            
-            for future in concurrent.futures.as_completed(futures):
-                if STOP_REQUESTED: 
-                    executor.shutdown(wait=False, cancel_futures=True)
-                    break
-                try:
-                    future.result()
-                except Exception as e:
-                    console.print(f"[red]Fout in thread: {e}[/red]")
-                    
+        if stop_requested():
+            msg = "Proces handmatig gestopt."
+            console.print(f"[bold red]{msg}[/bold red]")
+            if status_callback: status_callback(msg)
         return
 
     # === SEQUENTIËLE IMPLEMENTATIE ===
     for i, base_url in enumerate(target_urls):
-        if STOP_REQUESTED: break
+        if stop_requested(): break
         
         msg = f"Verwerken subreddit {i+1}/{total_targets}: {base_url}"
         console.print(f"\n[bold cyan]=== {msg} ===[/bold cyan]")
         if status_callback: status_callback(msg)
         
-        scrape_single_subreddit(base_url, limit, filter_date, start_ts, end_ts, keywords, status_callback, reddit_cookie)
-        
-        if i < total_targets - 1 and not STOP_REQUESTED:
-            time.sleep(random.uniform(5.0, 10.0))
+        scrape_single_subreddit(base_url, limit, filter_date, start_ts, end_ts, keywords, status_callback, reddit_cookie, incremental, run_id)
+    
+    # Gebufferde database-regels en CSV-rijen direct wegschrijven
+    database.flush()
+    csv_exporter.flush_all()
+    close_parquet_writers()
             
-    if STOP_REQUESTED:
+    if stop_requested():
         msg = "Proces handmatig gestopt."
         console.print(f"[bold red]{msg}[/bold red]")
         if status_callback: status_callback(msg)
@@ -948,102 +1105,55 @@ def run_scraper_headless(subreddits_list, limit=10, filter_date=False, start_ts=
 def scrape_remaining_history(base_url, posts_needed, start_ts, end_ts, keywords, status_callback, reddit_cookie):
     """
     Hulpfunctie voor historische scrape via zoekopdrachten.
+    Tijdvensters worden gelijktijdig doorzocht, met checkpoints in de database (zie backfill.py).
     """
-    global STOP_REQUESTED
-    
-    sub_name = base_url.split('/')[-1]
-    total_processed = 0
-    
-    step_size = 30 * 24 * 60 * 60 
-    current_end = end_ts
-    
-    while current_end > start_ts and total_processed < posts_needed:
-        if STOP_REQUESTED: break
-        
-        current_start = max(start_ts, current_end - step_size)
-        
-        d1 = datetime.fromtimestamp(current_start).strftime('%Y-%m-%d')
-        d2 = datetime.fromtimestamp(current_end).strftime('%Y-%m-%d')
-        msg = f"Historische analyse: {d1} tot {d2}"
-        console.print(f"[dim]{msg}[/dim]")
-        if status_callback: status_callback(f"[{sub_name}] {msg}")
-        
-        query_parts = [f"timestamp:{int(current_start)}..{int(current_end)}"]
-        if keywords:
-            kws = keywords[:10]
-            if kws:
-                query_parts.append("(" + " OR ".join(kws) + ")")
-        
-        full_query = " AND ".join(query_parts)
-        encoded_query = urllib.parse.quote(full_query)
-        
-        search_url = f"https://www.reddit.com/r/{sub_name}/search.json?q={encoded_query}&restrict_sr=on&include_over_18=on&sort=new&limit=100&syntax=cloudsearch"
-        
-        block_after = None
-        while True:
-            if STOP_REQUESTED: break
-            if total_processed >= posts_needed: break
-            
-            page_url = search_url
-            if block_after: page_url += f"&after={block_after}"
-            
-            data = get_reddit_data(page_url, status_callback=status_callback, reddit_cookie=reddit_cookie)
-            if not data: break
-            
-            if isinstance(data, dict) and data.get('kind') == 'Listing':
-                children = data['data']['children']
-                block_after = data['data'].get('after')
-                
-                if not children: break
-                
-                for child in children:
-                    if total_processed >= posts_needed: break
-                    if child['kind'] == 't3':
-                        post_data = child['data']
-                        post_id = post_data.get('id')
-                        title = post_data.get('title', 'Onbekend')
-                        
-                        if database.is_post_processed(post_id): continue
-                        
-                        permalink = post_data.get('permalink')
-                        if permalink:
-                            full_url = f"https://www.reddit.com{permalink}"
-                            console.print(f"[bold magenta]Historie Bericht +{total_processed+1}:[/bold magenta] {title}")
-                            
-                            full_post_data = get_reddit_data(full_url, status_callback=status_callback, reddit_cookie=reddit_cookie)
-                            if full_post_data:
-                                process_post_data(full_post_data, auto_export=True)
-                                total_processed += 1
-                                database.mark_post_processed(post_id, sub_name, title)
-                            
-                            time.sleep(random.uniform(1.5, 3.0))
-                
-                if not block_after: break
-            else:
-                break
-        
-        current_end = current_start
-        
-    return total_processed
+    import backfill
+    return backfill.run_backfill(base_url, posts_needed, start_ts, end_ts, keywords, status_callback, reddit_cookie)
 
-def scrape_single_subreddit(base_url, limit, filter_date, start_ts, end_ts, keywords, status_callback, reddit_cookie):
+def scrape_single_subreddit(base_url, limit, filter_date, start_ts, end_ts, keywords, status_callback, reddit_cookie, incremental=False, run_id=None):
     """
     Logica voor het verwerken van een enkele subreddit.
+    Met run_id wordt de voortgang na elke pagina vastgelegd en bij hervatten ingelezen.
     """
-    global STOP_REQUESTED
-    
     after = None
     processed_count = 0
     keep_going = True
+    fully_seen_pages = 0
     
     sub_name = base_url.split('/')[-1]
     
+    # Incrementele modus: alleen berichten nieuwer dan de high-water mark
+    mark = database.get_high_water_mark(sub_name) if incremental else None
+    safe_mark = None
+    reached_mark = False
+    covered = False
+    fetch_failed = False
+    
+    # Hervatten vanuit het runjournaal
+    progress = database.get_run_progress(run_id, sub_name) if run_id else None
+    if progress:
+        if progress['phase'] == 'done':
+            console.print(f"[dim]{sub_name} is al afgerond in run {run_id}.[/dim]")
+            return
+        after = progress['after']
+        processed_count = progress['processed']
+        msg = f"Hervatten van {sub_name} ({processed_count} berichten verwerkt)..."
+        console.print(f"[cyan]{msg}[/cyan]")
+        if status_callback: status_callback(msg)
+        
+        if progress['phase'] == 'history' and progress['history_end_ts']:
+            target_start_ts = start_ts if start_ts > 0 else 0
+            processed_count += scrape_remaining_history(base_url, limit - processed_count, target_start_ts, progress['history_end_ts'], keywords, status_callback, reddit_cookie)
+            if not stop_requested():
+                database.save_run_progress(run_id, sub_name, 'done', None, processed_count)
+            return
+    
     if status_callback: status_callback(f"Starten met {sub_name} (Limiet: {limit})...")
     
     check_memory_interval = 50
     
     while keep_going:
-        if STOP_REQUESTED: break
+        if stop_requested(): break
         
         if processed_count > 0 and processed_count % check_memory_interval == 0:
             mem_usage = get_memory_usage()
@@ -1051,30 +1161,6 @@ def scrape_single_subreddit(base_url, limit, filter_date, start_ts, end_ts, keyw
             import gc
             gc.collect()
         
-        current_url = base_url
-        params = []
-        
-        if keywords:
-            if '/search' not in current_url:
-                    if current_url.endswith('/'):
-                        current_url += "search"
-                    else:
-                        current_url += "/search"
-            
-            if '/new' not in current_url and '/search' not in current_url:
-                    if current_url.endswith('/'):
-                        current_url = current_url[:-1]
-                    current_url += "/new"
-        
-        elif filter_date:
-            if '/new' not in current_url and '/search' not in current_url:
-                    if current_url.endswith('/'):
-                        current_url = current_url[:-1]
-                    current_url += "/new"
-        
-        if after:
-            params.append(f"after={after}")
-            
         batch_limit = 100
         if limit > 0 and (limit - processed_count) < 100:
             batch_limit = limit - processed_count
@@ -1082,19 +1168,18 @@ def scrape_single_subreddit(base_url, limit, filter_date, start_ts, end_ts, keyw
         if batch_limit <= 0:
              batch_limit = 100
         
-        params.append(f"limit={batch_limit}")
-        
-        separator = '&' if '?' in current_url else '?'
-        current_url = f"{current_url}{separator}{'&'.join(params)}"
+        current_url = build_listing_url(base_url, after, batch_limit, keywords, filter_date, sort_new=incremental)
         
         console.print(f"[dim]URL: {current_url}[/dim]")
 
         data = get_reddit_data(current_url, status_callback=status_callback, reddit_cookie=reddit_cookie)
         
         if not data:
-            if not STOP_REQUESTED:
+            if not stop_requested():
                 console.print(f"[red]Kon geen data ophalen voor {base_url}.[/red]")
                 if status_callback: status_callback(f"[{sub_name}] Fout: Geen data ontvangen.")
+            safe_mark = None
+            fetch_failed = True
             break
 
         if isinstance(data, dict) and data.get('kind') == 'Listing':
@@ -1103,46 +1188,47 @@ def scrape_single_subreddit(base_url, limit, filter_date, start_ts, end_ts, keyw
             
             if not children:
                 console.print("[dim]Geen berichten meer gevonden.[/dim]")
+                covered = True
                 break
             
-            for child in children:
-                if STOP_REQUESTED: break
+            if incremental:
+                children, reached_mark = split_at_high_water_mark(children, mark)
+            
+            # Controleer de hele pagina in één keer tegen de database
+            new_posts, seen_ratio = select_unprocessed_posts(children, sub_name, status_callback)
+            fully_seen_pages = fully_seen_pages + 1 if seen_ratio == 1.0 else 0
+            if MAX_FULLY_SEEN_PAGES and fully_seen_pages >= MAX_FULLY_SEEN_PAGES:
+                console.print(f"[yellow]{fully_seen_pages} pagina's achter elkaar volledig bekend. Paginering gestopt.[/yellow]")
+                break
+            
+            # Voor de high-water mark: mislukte berichten en berichten die niet meer aan bod kwamen
+            failed_ids = set()
+            pending_ids = set()
+            for i, child in enumerate(new_posts):
+                if stop_requested():
+                    pending_ids = {c['data'].get('id') for c in new_posts[i:]}
+                    break
                 
                 if limit > 0 and processed_count >= limit:
+                    pending_ids = {c['data'].get('id') for c in new_posts[i:]}
                     keep_going = False
                     break
                     
                 if child['kind'] == 't3':
                     post_data_summary = child['data']
                     title = post_data_summary.get('title', 'Onbekend')
-                    selftext = post_data_summary.get('selftext', '')
                     permalink = post_data_summary.get('permalink')
-                    created_utc = post_data_summary.get('created_utc', 0)
                     
                     post_id = post_data_summary.get('id')
-                    if database.is_post_processed(post_id):
-                        continue
 
-                    if filter_date:
-                        if created_utc < start_ts:
-                            console.print(f"[yellow]Bericht van {datetime.fromtimestamp(created_utc).strftime('%d-%m-%Y')} bereikt (voor startdatum). Scraper wordt gestopt.[/yellow]")
-                            keep_going = False
-                            break
-                        
-                        if created_utc > end_ts:
-                            continue
-                    
-                    if keywords:
-                            content_to_check = (title + " " + selftext).lower()
-                            matches = [k for k in keywords if k in content_to_check]
-                            has_keyword = len(matches) > 0
-                            
-                            if not has_keyword:
-                                short_title = (title[:40] + '..') if len(title) > 40 else title
-                                console.print(f"[dim]Overgeslagen (geen match): {short_title}[/dim]")
-                                continue
-                            else:
-                                console.print(f"[green]Match gevonden ({', '.join(matches[:3])}): {title}[/green]")
+                    action = check_post_filters(post_data_summary, filter_date, start_ts, end_ts, keywords)
+                    if action == 'stop':
+                        pending_ids = {c['data'].get('id') for c in new_posts[i:]}
+                        keep_going = False
+                        covered = True
+                        break
+                    if action == 'skip':
+                        continue
                     
                     if not permalink:
                         continue
@@ -1155,19 +1241,34 @@ def scrape_single_subreddit(base_url, limit, filter_date, start_ts, end_ts, keyw
                     
                     try:
                         full_post_data = get_reddit_data(full_url, status_callback=status_callback, reddit_cookie=reddit_cookie)
-                        if full_post_data:
-                            process_post_data(full_post_data, auto_export=True)
+                        if full_post_data and process_post_data(full_post_data, auto_export=True):
                             processed_count += 1
                             
                             database.mark_post_processed(post_id, sub_name, title)
+                        else:
+                            failed_ids.add(post_id)
                     except Exception as e:
+                        failed_ids.add(post_id)
                         console.print(f"[red]Fout bij verwerken bericht '{title}': {e}[/red]")
                         if status_callback: status_callback(f"Fout bij bericht: {e}")
-                    
-                    time.sleep(random.uniform(2.0, 5.0))
             
-            if not after:
+            if incremental:
+                safe_mark = advance_safe_mark(children, failed_ids, pending_ids, safe_mark)
+            
+            # Alleen een volledig bekeken pagina telt: anders is de oude mark niet zonder gaten bereikt
+            page_done = not pending_ids
+            if reached_mark:
+                msg = "High-water mark bereikt: geen nieuwere berichten meer."
+                console.print(f"[green]{msg}[/green]")
+                if status_callback: status_callback(f"[{sub_name}] {msg}")
+                if page_done:
+                    covered = True
+                keep_going = False
+            
+            elif not after:
                 console.print(f"[yellow]Einde van lijst bereikt.[/yellow]")
+                if page_done:
+                    covered = True
                 
                 if filter_date and limit > 0 and processed_count < limit:
                     console.print(f"[bold cyan]Limiet nog niet bereikt ({processed_count}/{limit}). Starten Tijdreis-modus...[/bold cyan]")
@@ -1182,6 +1283,8 @@ def scrape_single_subreddit(base_url, limit, filter_date, start_ts, end_ts, keyw
                         current_end_ts = last_timestamp
                         target_start_ts = start_ts if start_ts > 0 else 0
                         
+                        if run_id:
+                            database.save_run_progress(run_id, sub_name, 'history', None, processed_count, current_end_ts)
                         extra_count = scrape_remaining_history(base_url, limit - processed_count, target_start_ts, current_end_ts, keywords, status_callback, reddit_cookie)
                         processed_count += extra_count
                 
@@ -1190,6 +1293,10 @@ def scrape_single_subreddit(base_url, limit, filter_date, start_ts, end_ts, keyw
             if limit > 0 and processed_count >= limit:
                 console.print(f"[green]Limiet bereikt ({processed_count}/{limit}). Proces gestopt.[/green]")
                 keep_going = False
+            
+            # Checkpoint: cursor van de volgende pagina, alleen als deze pagina volledig is afgehandeld
+            if run_id and keep_going and not stop_requested():
+                database.save_run_progress(run_id, sub_name, 'listing', after, processed_count)
                 
         elif isinstance(data, list):
             process_post_data(data, auto_export=True)
@@ -1197,10 +1304,23 @@ def scrape_single_subreddit(base_url, limit, filter_date, start_ts, end_ts, keyw
         else:
             console.print(f"[red]Onbekende datastructuur: {type(data)}[/red]")
             keep_going = False
-            
-    pass
+    
+    if incremental:
+        finish_incremental(sub_name, mark, safe_mark, covered)
+    
+    if run_id and not stop_requested() and not fetch_failed:
+        database.save_run_progress(run_id, sub_name, 'done', None, processed_count)
 
 def main():
+    """Interactieve CLI; gebufferde regels en exportbestanden worden altijd afgesloten."""
+    try:
+        _main()
+    finally:
+        database.flush()
+        csv_exporter.flush_all()
+        close_parquet_writers()
+
+def _main():
     console.print("[bold blue]Reddit Scraper[/bold blue]")
     
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -1310,8 +1430,7 @@ def main():
                             continue
                     
                     if keywords:
-                            content_to_check = (title + " " + selftext).lower()
-                            matches = [k for k in keywords if k in content_to_check]
+                            matches = get_matcher(keywords).find_all(title + " " + selftext)
                             has_keyword = len(matches) > 0
                             
                             if not has_keyword:
@@ -1345,6 +1464,12 @@ def main():
             console.print("[dim]Pauze voor volgende subreddit...[/dim]")
             time.sleep(3)
 
+    # Openstaande mediadownloads afronden voordat het script stopt
+    media_status = media_queue.get_status()
+    if media_status.get('pending') or media_status.get('running'):
+        console.print("[yellow]Wachten op openstaande mediadownloads...[/yellow]")
+        media_queue.wait_until_idle()
+
     console.print("\n[bold green]Gereed.[/bold green]")
 
 if __name__ == "__main__":
@@ -0,0 +1,75 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Aantal gelijktijdige verbindingen per host binnen één sessie
+POOL_SIZE = 10
+
+# Eén sessie per proxy-identiteit (None = directe verbinding)
+_sessions = {}
+_lock = threading.Lock()
+
+def _build_session(proxy):
+    """Bouw een nieuwe sessie met retry-strategie en connection pool."""
+    session = requests.Session()
+
+    # 429 wordt handmatig afgehandeld in de scraper
+    retry = Retry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=["GET"]
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    if proxy:
+        session.proxies = {
+            'http': proxy,
+            'https': proxy
+        }
+    return session
+
+def get_session(proxy=None):
+    """
+    Retourneer de gedeelde sessie voor deze proxy-identiteit.
+    De sessie wordt hergebruikt zodat TCP/TLS-verbindingen openblijven.
+    """
+    with _lock:
+        session = _sessions.get(proxy)
+        if session is None:
+            session = _build_session(proxy)
+            _sessions[proxy] = session
+        return session
+
+def reset_session(proxy=None):
+    """
+    Sluit de sessie voor deze identiteit af (bijv. na een 429 en IP-wissel).
+    De volgende aanroep van get_session bouwt een nieuwe sessie op.
+    """
+    with _lock:
+        session = _sessions.pop(proxy, None)
+    if session:
+        try:
+            session.close()
+        except Exception:
+            pass
+
+def set_pool_size(size):
+    """Wijzig de poolgrootte; bestaande sessies worden opnieuw opgebouwd."""
+    global POOL_SIZE
+    POOL_SIZE = max(1, int(size))
+    close_all()
+
+def close_all():
+    """Sluit alle gedeelde sessies."""
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        try:
+            session.close()
+        except Exception:
+            pass
@@ -0,0 +1,68 @@
+"""
+Videodownloads via yt-dlp (met audio, samengevoegd door ffmpeg).
+
+Deze module draait ook in de videoprocessen van media_queue (spawn) en heeft
+daarom geen bijwerkingen bij het importeren: geen database-initialisatie,
+geen Tor en geen ffmpeg-installatie tot er daadwerkelijk een video wordt opgehaald.
+"""
+import os
+import shutil
+import threading
+
+import yt_dlp
+import static_ffmpeg
+
+import media_store
+import output_sink
+
+console = output_sink.console
+
+_ffmpeg_lock = threading.Lock()
+_ffmpeg_ready = False
+
+def ensure_ffmpeg():
+    """Zet ffmpeg (static_ffmpeg) eenmalig per proces op het PATH."""
+    global _ffmpeg_ready
+    with _ffmpeg_lock:
+        if _ffmpeg_ready:
+            return
+        try:
+            static_ffmpeg.add_paths()
+        except Exception as e:
+            console.print(f"[yellow]Waarschuwing: Kon videobewerkingstool niet starten: {e}[/yellow]")
+        _ffmpeg_ready = True
+
+def download_video_with_ytdlp(url, folder, prefix=""):
+    """
+    Download video inclusief audio via 'yt-dlp' en sla deze op in de gedeelde mediaopslag.
+    """
+    try:
+        if media_store.link_known(url, folder, prefix, name="video"):
+            return True
+
+        ensure_ffmpeg()
+        tmp_dir = media_store.new_temp_dir()
+        try:
+            ydl_opts = {
+                'outtmpl': os.path.join(tmp_dir, 'video.%(ext)s'),
+                'format': 'bestvideo+bestaudio/best',
+                'quiet': True,
+                'no_warnings': True,
+                'ignoreerrors': True,
+                'merge_output_format': 'mp4',
+                'postprocessor_args': {'merger': ['-c:a', 'aac']},
+            }
+
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                ydl.download([url])
+
+            files = sorted(f for f in os.listdir(tmp_dir) if not f.endswith(('.part', '.ytdl')))
+            if not files:
+                return False
+            media_store.ingest_file(os.path.join(tmp_dir, files[0]), url, folder, prefix, name="video")
+            return True
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except Exception as e:
+        console.print(f"[red]Fout bij downloaden video: {e}[/red]")
+        return False
@@ -0,0 +1,89 @@
+import os
+import zipfile
+
+# Bestanden worden in blokken van deze grootte (bytes) ingelezen en doorgestuurd
+CHUNK_SIZE = 1024 * 1024
+# Al gecomprimeerde formaten worden ongewijzigd opgeslagen (ZIP_STORED): deflate levert
+# daar niets op en kost alleen CPU-tijd
+COMPRESSED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp4', '.webm', '.mkv', '.mov',
+    '.mp3', '.m4a', '.aac', '.ogg', '.zip', '.gz', '.parquet'
+}
+VIDEO_EXTENSIONS = {'.mp4', '.webm', '.mkv', '.mov', '.avi'}
+JSON_EXTENSIONS = {'.json', '.jsonl'}
+
+# Beschikbare filters voor downloads
+#   'all'      - alle bestanden
+#   'json'     - alleen JSON-bestanden (bericht-JSON en all_data.jsonl)
+#   'no_video' - alles behalve video's
+FILTERS = ('all', 'json', 'no_video')
+
+class _StreamBuffer:
+    """
+    Niet-doorzoekbaar schrijfdoel voor ZipFile: zipfile schrijft dan data descriptors
+    in plaats van terug te springen, zodat het archief direct kan worden doorgestuurd.
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def _included(filename, file_filter):
+    ext = os.path.splitext(filename)[1].lower()
+    if file_filter == 'json':
+        return ext in JSON_EXTENSIONS
+    if file_filter == 'no_video':
+        return ext not in VIDEO_EXTENSIONS
+    return True
+
+def iter_files(root, file_filter='all'):
+    """Loop (pad, naam in archief) over alle bestanden onder root; verborgen mappen (zoals .media) worden overgeslagen."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        for filename in sorted(filenames):
+            if _included(filename, file_filter):
+                path = os.path.join(dirpath, filename)
+                yield path, os.path.relpath(path, root).replace(os.sep, '/')
+
+def stream_zip(root, file_filter='all'):
+    """
+    Genereer een ZIP-archief van root als reeks byte-blokken, zonder tussenbestand op schijf.
+    Media wordt opgeslagen (stored), tekstbestanden worden gecomprimeerd (deflate).
+    """
+    if file_filter not in FILTERS:
+        raise ValueError(f"Onbekend filter: {file_filter} (kies uit {', '.join(FILTERS)})")
+
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        for path, arcname in iter_files(root, file_filter):
+            try:
+                info = zipfile.ZipInfo.from_file(path, arcname)
+                ext = os.path.splitext(arcname)[1].lower()
+                info.compress_type = zipfile.ZIP_STORED if ext in COMPRESSED_EXTENSIONS else zipfile.ZIP_DEFLATED
+                with open(path, 'rb') as src, zf.open(info, 'w') as dest:
+                    while True:
+                        block = src.read(CHUNK_SIZE)
+                        if not block:
+                            break
+                        dest.write(block)
+                        data = buffer.take()
+                        if data:
+                            yield data
+            except OSError:
+                # Bestand verdwenen of onleesbaar (bijv. tijdens een lopende scrape): overslaan
+                continue
+            data = buffer.take()
+            if data:
+                yield data
+    # Centrale directory
+    yield buffer.take()
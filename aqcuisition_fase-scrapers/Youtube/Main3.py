@@ -11,6 +11,9 @@ import os
 import time
 import sys
 
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from shared.matcher import get_matcher
+
 # =====================
 # CONFIG
 # =====================
@@ -45,6 +48,10 @@ DATASET_PATH = os.path.join(OUTPUT_DIR, "yt_results.jsonl")
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# Optioneel: extra kolomgeoriënteerde uitvoer (vereist pyarrow)
+WRITE_PARQUET = False
+PARQUET_DIR = os.path.join(OUTPUT_DIR, "parquet")
+
 # =====================
 # HELPERS
 # =====================
@@ -53,13 +60,10 @@ def utc_now_iso():
     return datetime.now(timezone.utc).isoformat()
 
 def keyword_relevance(text, must_keywords, should_keywords):
-    text = text.lower()
-
-    must_hits = [kw for kw in must_keywords if kw in text]
-    should_hits = [kw for kw in should_keywords if kw in text]
-
+    must_hits = get_matcher(must_keywords).find_all(text)
     if not must_hits:
         return None
+    should_hits = get_matcher(should_keywords).find_all(text)
 
     return {
         "must_hits": must_hits,
@@ -82,6 +86,12 @@ youtube = get_youtube_client()
 seen_video_ids = set()
 written = 0
 
+parquet_writer = None
+if WRITE_PARQUET:
+    sys.path.append(os.path.join(BASE_DIR, ".."))
+    from shared.columnar import ColumnarWriter
+    parquet_writer = ColumnarWriter("youtube", PARQUET_DIR)
+
 print("[+] Start discovery & scrape")
 print("RUNNING FILE:", __file__)
 
@@ -143,6 +153,9 @@ try:
                     with open(DATASET_PATH, "a", encoding="utf-8") as f:
                         f.write(json.dumps(light_item, ensure_ascii=False) + "\n")
 
+                    if parquet_writer:
+                        parquet_writer.add(light_item)
+
                     written += 1
 
                     print(
@@ -161,4 +174,8 @@ try:
 except KeyboardInterrupt:
     print("\n[!] Handmatig gestopt door gebruiker (Ctrl+C)")
 
+finally:
+    if parquet_writer:
+        parquet_writer.close()
+
 print(f"[+] Crawler beëindigd — totaal opgeslagen: {written}")
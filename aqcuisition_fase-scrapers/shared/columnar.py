@@ -0,0 +1,260 @@
+"""
+Kolomgeoriënteerde export (Parquet) voor alle scrapers.
+
+Elke scraper kan naast de bestaande JSON-uitvoer een ColumnarWriter openen.
+Records worden gebufferd en per row group weggeschreven; elke run levert een
+eigen part-bestand op in de datasetmap, zodat bestaande bestanden nooit
+herschreven hoeven te worden. Analyses lezen met read_columns() alleen de
+kolommen die ze nodig hebben, met filters die pyarrow naar de bestanden doorduwt.
+"""
+import os
+import uuid
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+ROW_GROUP_SIZE = 10_000
+
+def _schemas():
+    """Vast schema per platform (zelfde kolommen in elk part-bestand)."""
+    string_list = pa.list_(pa.string())
+    return {
+        'reddit': pa.schema([
+            ('post_id', pa.string()),
+            ('subreddit', pa.string()),
+            ('title', pa.string()),
+            ('author', pa.string()),
+            ('text', pa.string()),
+            ('created_utc', pa.float64()),
+            ('media_type', pa.string()),
+            ('media_urls', string_list),
+            ('permalink', pa.string()),
+            ('num_comments', pa.int32()),
+            ('scraped_at', pa.string()),
+        ]),
+        'reddit_comments': pa.schema([
+            ('comment_id', pa.string()),
+            ('post_id', pa.string()),
+            ('parent_id', pa.string()),
+            ('subreddit', pa.string()),
+            ('author', pa.string()),
+            ('body', pa.string()),
+            ('created_utc', pa.float64()),
+            ('depth', pa.int16()),
+        ]),
+        'youtube': pa.schema([
+            ('video_id', pa.string()),
+            ('video_url', pa.string()),
+            ('scraped_at', pa.string()),
+            ('title', pa.string()),
+            ('description', pa.string()),
+            ('channel_title', pa.string()),
+            ('published_at', pa.string()),
+            ('views', pa.int64()),
+            ('likes', pa.int64()),
+            ('dislikes', pa.int64()),
+            ('comment_count', pa.int64()),
+            ('duration_seconds', pa.int64()),
+            ('keyword_score', pa.int32()),
+            ('must_hits', string_list),
+            ('should_hits', string_list),
+        ]),
+        'bluesky': pa.schema([
+            ('uri', pa.string()),
+            ('account', pa.string()),
+            ('text', pa.string()),
+            ('posted_at', pa.string()),
+            ('likes', pa.int64()),
+            ('replies', pa.int64()),
+            ('reposts', pa.int64()),
+            ('quotes', pa.int64()),
+            ('scraped_at_local_time', pa.string()),
+        ]),
+        'debatepolitics': pa.schema([
+            ('post_id', pa.int64()),
+            ('author', pa.string()),
+            ('created_at', pa.string()),
+            ('thread_id', pa.int64()),
+            ('thread_url', pa.string()),
+            ('thread_title', pa.string()),
+            ('forum_url', pa.string()),
+            ('page_url', pa.string()),
+            ('page_num', pa.int32()),
+            ('text', pa.string()),
+            ('links', string_list),
+            ('media_urls', string_list),
+            ('keywords_hit', string_list),
+            ('scraped_at', pa.string()),
+        ]),
+    }
+
+# --- Omzetting van de bestaande recordvormen naar een platte rij ---
+
+def _count_comments(comments):
+    count = 0
+    stack = list(comments or [])
+    while stack:
+        comment = stack.pop()
+        count += 1
+        stack.extend(comment.get('replies') or [])
+    return count
+
+def reddit_row(entry):
+    """Rij uit een archiefregel {'post': ..., 'comments': ..., 'scraped_at': ...}."""
+    post = entry.get('post', {})
+    media_url = post.get('media_url')
+    if isinstance(media_url, list):
+        media_urls = media_url
+    else:
+        media_urls = [media_url] if media_url else []
+    return {
+        'post_id': post.get('id'),
+        'subreddit': post.get('subreddit'),
+        'title': post.get('title'),
+        'author': post.get('author'),
+        'text': post.get('text'),
+        'created_utc': post.get('created_utc'),
+        'media_type': post.get('media_type'),
+        'media_urls': media_urls,
+        'permalink': post.get('original_url'),
+        'num_comments': _count_comments(entry.get('comments')),
+        'scraped_at': entry.get('scraped_at'),
+    }
+
+def reddit_comment_row(post, comment, depth):
+    """Rij voor één reactie; comment mag genest ('replies') of plat (uit de reactiespool) zijn."""
+    return {
+        'comment_id': comment.get('id'),
+        'post_id': post.get('id'),
+        'parent_id': comment.get('parent_id'),
+        'subreddit': post.get('subreddit'),
+        'author': comment.get('author'),
+        'body': comment.get('body'),
+        'created_utc': comment.get('created_utc'),
+        'depth': depth,
+    }
+
+def reddit_comment_rows(entry):
+    """Eén rij per reactie (alle niveaus) uit een archiefregel."""
+    post = entry.get('post', {})
+    stack = [(comment, 0) for comment in reversed(entry.get('comments') or [])]
+    while stack:
+        comment, depth = stack.pop()
+        yield reddit_comment_row(post, comment, depth)
+        stack.extend((reply, depth + 1) for reply in reversed(comment.get('replies') or []))
+
+def youtube_row(item):
+    relevance = item.get('keyword_relevance') or {}
+    return {
+        'video_id': item.get('video_id'),
+        'video_url': item.get('video_url'),
+        'scraped_at': item.get('scraped_at'),
+        'title': item.get('title'),
+        'description': item.get('description'),
+        'channel_title': item.get('channel_title'),
+        'published_at': item.get('published_at'),
+        'views': item.get('views'),
+        'likes': item.get('likes'),
+        'dislikes': item.get('dislikes'),
+        'comment_count': item.get('comment_count'),
+        'duration_seconds': item.get('duration_seconds'),
+        'keyword_score': relevance.get('score'),
+        'must_hits': relevance.get('must_hits', []),
+        'should_hits': relevance.get('should_hits', []),
+    }
+
+def bluesky_row(record):
+    return {name: record.get(name) for name in _schemas()['bluesky'].names}
+
+def debatepolitics_row(record):
+    thread = record.get('thread', {})
+    post = record.get('post', {})
+    entities = record.get('entities', {})
+    return {
+        'post_id': post.get('id'),
+        'author': post.get('author'),
+        'created_at': post.get('created_at'),
+        'thread_id': thread.get('id'),
+        'thread_url': thread.get('url'),
+        'thread_title': thread.get('title'),
+        'forum_url': thread.get('forum_url'),
+        'page_url': thread.get('page_url'),
+        'page_num': thread.get('page_num'),
+        'text': record.get('content', {}).get('text'),
+        'links': [link.get('url') for link in entities.get('links', [])],
+        'media_urls': [m.get('url') for m in record.get('media', [])],
+        'keywords_hit': record.get('keywords_hit', []),
+        'scraped_at': record.get('scraped_at'),
+    }
+
+ROW_BUILDERS = {
+    'reddit': reddit_row,
+    'youtube': youtube_row,
+    'bluesky': bluesky_row,
+    'debatepolitics': debatepolitics_row,
+}
+
+class ColumnarWriter:
+    """
+    Schrijft records van één platform naar een nieuw part-bestand in dataset_dir.
+    Gebruik add() met het record zoals de scraper het al opbouwt (zie ROW_BUILDERS),
+    of add_row() met een rij die direct aan het schema voldoet.
+    """
+    def __init__(self, platform, dataset_dir, row_group_size=ROW_GROUP_SIZE):
+        if pa is None:
+            raise ImportError("pyarrow is niet geïnstalleerd (pip install pyarrow)")
+        self.platform = platform
+        self.schema = _schemas()[platform]
+        self.row_group_size = row_group_size
+        os.makedirs(dataset_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        self.path = os.path.join(dataset_dir, f"{platform}-{stamp}-{uuid.uuid4().hex[:8]}.parquet")
+        self._writer = None
+        self._rows = []
+        self.rows_written = 0
+
+    def add(self, record):
+        self.add_row(ROW_BUILDERS[self.platform](record))
+
+    def add_row(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        """Schrijf de gebufferde rijen weg als één row group."""
+        if not self._rows:
+            return
+        table = pa.Table.from_pylist(self._rows, schema=self.schema)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, self.schema, compression='zstd')
+        self._writer.write_table(table)
+        self.rows_written += len(self._rows)
+        self._rows = []
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_columns(dataset_dir, columns=None, filter=None):
+    """
+    Lees alleen de opgegeven kolommen uit alle part-bestanden als pandas DataFrame.
+    filter is een pyarrow-expressie, bijv. ds.field('created_utc') >= 1737331200.
+    """
+    if pa is None:
+        raise ImportError("pyarrow is niet geïnstalleerd (pip install pyarrow)")
+    dataset = ds.dataset(dataset_dir, format='parquet')
+    return dataset.to_table(columns=columns, filter=filter).to_pandas()
@@ -0,0 +1,104 @@
+"""
+Zoeken naar veel termen tegelijk (trefwoorden, zinsdelen) voor alle scrapers.
+
+Alle termen worden samengevoegd tot één reguliere expressie in de vorm van een
+trie, zodat een tekst in één doorgang wordt doorzocht in plaats van met één
+zoekactie per term. Overlappende treffers ('ice' en 'ice raid', 'raid' binnen
+'ice raid') worden allemaal gevonden.
+"""
+import re
+from functools import lru_cache
+
+_WORD_CHAR = re.compile(r'\w')
+
+def _trie_pattern(keys):
+    trie = {}
+    for key in keys:
+        node = trie
+        for ch in key:
+            node = node.setdefault(ch, {})
+        node[''] = True
+    return _node_pattern(trie)
+
+def _node_pattern(node):
+    # Langere voortzettingen gaan vóór het einde van een term (greedy '?'),
+    # zodat per positie de langste passende term wordt gevonden
+    branches = [re.escape(ch) + _node_pattern(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ''
+    body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if '' in node:
+        return f'(?:{body})?'
+    return body
+
+class Matcher:
+    """
+    Zoekt een vaste lijst termen in teksten.
+    whole_words: alleen treffers die niet midden in een woord beginnen of eindigen.
+    ignore_case: hoofdletterongevoelig zoeken.
+    """
+    def __init__(self, terms, whole_words=False, ignore_case=True):
+        self.terms = list(dict.fromkeys(t for t in terms if t))
+        self.whole_words = whole_words
+        self.ignore_case = ignore_case
+        # Sleutel -> positie van de (eerste) term, voor de volgorde van treffers
+        self._order = {}
+        for i, term in enumerate(self.terms):
+            self._order.setdefault(self._key(term), i)
+        # Termen die een beginstuk zijn van een andere term: de regex vindt per
+        # positie alleen de langste, de kortere komen dan ook voor
+        self._prefixes = {key: self._prefixes_of(key) for key in self._order}
+        self._regex = None
+        if self._order:
+            pattern = _trie_pattern(self._order)
+            if whole_words:
+                pattern = rf'(?<!\w)({pattern})(?!\w)'
+            else:
+                pattern = f'({pattern})'
+            # Lookahead: treffers overlappen elkaar, elke startpositie wordt bekeken
+            self._regex = re.compile(f'(?={pattern})', re.IGNORECASE if ignore_case else 0)
+
+    def _key(self, text):
+        return text.lower() if self.ignore_case else text
+
+    def _prefixes_of(self, key):
+        prefixes = []
+        for length in range(1, len(key)):
+            prefix = key[:length]
+            if prefix not in self._order:
+                continue
+            if self.whole_words and _WORD_CHAR.match(key, length):
+                # Binnen de langere term eindigt de kortere midden in een woord
+                continue
+            prefixes.append(prefix)
+        return prefixes
+
+    def __len__(self):
+        return len(self.terms)
+
+    def search(self, text):
+        """True als minstens één term in de tekst voorkomt."""
+        return bool(text) and self._regex is not None and self._regex.search(text) is not None
+
+    def find_all(self, text):
+        """Alle termen die in de tekst voorkomen, in de volgorde van de termenlijst."""
+        if not text or self._regex is None:
+            return []
+        found = set()
+        for m in self._regex.finditer(text):
+            key = self._key(m.group(1))
+            if key in found or key not in self._order:
+                continue
+            found.add(key)
+            found.update(self._prefixes[key])
+            if len(found) == len(self._order):
+                break
+        return [self.terms[i] for i in sorted(self._order[key] for key in found)]
+
+@lru_cache(maxsize=32)
+def _cached_matcher(terms, whole_words, ignore_case):
+    return Matcher(terms, whole_words, ignore_case)
+
+def get_matcher(terms, whole_words=False, ignore_case=True):
+    """Gedeelde Matcher voor deze termen; wordt per combinatie één keer opgebouwd."""
+    return _cached_matcher(tuple(terms), whole_words, ignore_case)